@@ -7,15 +7,27 @@ from aiogram.filters import Command
 
 from app.config import BotConfig, logger
 from app.database import WhitelistRepo, UsageRepo, SystemRepo
+from app.file_manager import format_size
 
 router = Router(name="admin")
 
 
 class AdminService:
-    def __init__(self, whitelist, usage, system):
+    def __init__(self, whitelist, usage, system, fm=None, access=None):
         self.whitelist = whitelist
         self.usage = usage
         self.system = system
+        self.fm = fm
+        self.access = access
+
+    def invalidate(self, user_id=None):
+        if self.access:
+            self.access.invalidate(user_id)
+
+    async def set_maintenance(self, on):
+        await self.system.set_stat("maintenance_mode", "1" if on else "0")
+        if self.access:
+            self.access.invalidate_maintenance()
 
     async def record_start(self):
         now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
@@ -25,6 +37,7 @@ class AdminService:
         return await self.system.get_stat("maintenance_mode", "0") == "1"
 
     async def global_stats(self):
+        await self.usage.flush()
         total = await self.usage.total_processed()
         today = await self.usage.today_processed()
         sf = await self.usage.success_failure()
@@ -53,6 +66,7 @@ class AdminService:
         )
 
     async def user_stats(self, user_id):
+        await self.usage.flush()
         user = await self.whitelist.get_user(user_id)
         if not user:
             return f"User {user_id} not found."
@@ -72,11 +86,12 @@ class AdminService:
         )
 
     async def system_health(self):
+        await self.usage.flush()
         maintenance = await self.is_maintenance()
         users = await self.whitelist.list_users()
         total = await self.usage.total_processed()
         errors = await self.usage.error_count()
-        return (
+        text = (
             f"System Health\n"
             f"Maintenance: {'ON' if maintenance else 'OFF'}\n"
             f"Users: {len(users)}\n"
@@ -84,6 +99,21 @@ class AdminService:
             f"Errors: {errors}\n"
             f"PID: {os.getpid()}"
         )
+        q = self.usage.queue_stats()
+        text += (
+            f"\n\nUsage log\n"
+            f"Queued: {q['queued']} | Flushes: {q['flushes']} ({q['rows']} rows, {q['dropped']} dropped)\n"
+            f"Flush time: {q['last_ms']}ms last, {q['max_ms']}ms max"
+        )
+        if self.fm:
+            c = self.fm.cache_stats()
+            text += (
+                f"\n\nDownload cache\n"
+                f"Hits: {c['hits']} | Misses: {c['misses']} ({c['hit_ratio']}%)\n"
+                f"Saved: {format_size(c['bytes_saved'])}\n"
+                f"Stored: {c['entries']} files, {format_size(c['bytes'])}"
+            )
+        return text
 
 
 def _is_admin(message, config):
@@ -101,6 +131,7 @@ def register_admin_handlers(rt, config, service, bot):
             await message.reply("Usage: /add_user <id>")
             return
         ok = await service.whitelist.add_user(int(args[1]))
+        service.invalidate(int(args[1]))
         text = f"User {args[1]} added." if ok else f"User {args[1]} already exists."
         await message.reply(text)
 
@@ -113,6 +144,7 @@ def register_admin_handlers(rt, config, service, bot):
             await message.reply("Usage: /remove_user <id>")
             return
         ok = await service.whitelist.remove_user(int(args[1]))
+        service.invalidate(int(args[1]))
         text = f"User {args[1]} removed." if ok else f"User {args[1]} not found."
         await message.reply(text)
 
@@ -139,6 +171,7 @@ def register_admin_handlers(rt, config, service, bot):
             await message.reply("Usage: /suspend_user <id>")
             return
         ok = await service.whitelist.suspend_user(int(args[1]))
+        service.invalidate(int(args[1]))
         text = f"User {args[1]} suspended." if ok else "Not found."
         await message.reply(text)
 
@@ -151,6 +184,7 @@ def register_admin_handlers(rt, config, service, bot):
             await message.reply("Usage: /unsuspend_user <id>")
             return
         ok = await service.whitelist.unsuspend_user(int(args[1]))
+        service.invalidate(int(args[1]))
         text = f"User {args[1]} unsuspended." if ok else "Not found."
         await message.reply(text)
 
@@ -167,6 +201,7 @@ def register_admin_handlers(rt, config, service, bot):
             await message.reply("Limit must be >= 1.")
             return
         ok = await service.whitelist.set_daily_limit(int(args[1]), limit)
+        service.invalidate(int(args[1]))
         text = f"Limit for {args[1]} set to {limit}/day" if ok else "Not found."
         await message.reply(text)
 
@@ -212,14 +247,14 @@ def register_admin_handlers(rt, config, service, bot):
     async def cmd_maint_on(message: Message):
         if not _is_admin(message, config):
             return
-        await service.system.set_stat("maintenance_mode", "1")
+        await service.set_maintenance(True)
         await message.reply("Maintenance mode ON")
 
     @rt.message(Command("maintenance_off"))
     async def cmd_maint_off(message: Message):
         if not _is_admin(message, config):
             return
-        await service.system.set_stat("maintenance_mode", "0")
+        await service.set_maintenance(False)
         await message.reply("Maintenance mode OFF")
 
     @rt.message(Command("system_health"))
@@ -2,11 +2,13 @@ from aiogram import Bot, Dispatcher, Router
 from aiogram.types import Message, BotCommand, BotCommandScopeChat, BotCommandScopeDefault
 from aiogram.filters import Command
 from app.config import BotConfig, logger
-from app.database import Database, WhitelistRepo, UsageRepo, SystemRepo
-from app.middleware import AccessMiddleware
+from app.database import Database, WhitelistRepo, UsageRepo, SystemRepo, ResultCacheRepo
+from app.middleware import AccessMiddleware, AccessCache
 from app.admin import AdminService, register_admin_handlers
 from app.file_router import register_file_handlers
 from app.file_manager import FileManager
+from app.worker_pool import WorkerPool
+from app.office_pool import OfficePool
 
 async def set_bot_commands(bot, admin_id):
     user_cmds = [
@@ -27,13 +29,23 @@ async def set_bot_commands(bot, admin_id):
 async def setup_bot(config):
     db = Database(config.turso_url, config.turso_token)
     await db.connect()
-    whitelist = WhitelistRepo(db); usage = UsageRepo(db); system = SystemRepo(db)
-    admin_svc = AdminService(whitelist, usage, system); fm = FileManager(config.temp_dir)
+    whitelist = WhitelistRepo(db); usage = UsageRepo(db, config.usage_batch_size, config.usage_flush_ms / 1000); system = SystemRepo(db)
+    usage.start()
+    results = ResultCacheRepo(db, config.result_cache_ttl, config.result_cache_bypass)
+    await results.purge()
+    fm = FileManager(config.temp_dir, config.cache_max_mb * 1024 * 1024, config.cache_ttl,
+                     config.max_file_size_bytes)
+    access = AccessCache(whitelist, system, config.access_cache_ttl)
+    admin_svc = AdminService(whitelist, usage, system, fm, access)
     await admin_svc.record_start()
+    pool = WorkerPool(config.workers, config.job_timeout, config.worker_max_jobs)
+    await pool.start()
+    office = OfficePool(config.office_instances, f"{config.temp_dir}/office", config.office_timeout)
+    await office.start()
     bot = Bot(token=config.token); dp = Dispatcher()
     await set_bot_commands(bot, config.admin_id)
-    dp.message.middleware(AccessMiddleware(config, whitelist, system))
-    dp.callback_query.middleware(AccessMiddleware(config, whitelist, system))
+    dp.message.middleware(AccessMiddleware(config, whitelist, system, access))
+    dp.callback_query.middleware(AccessMiddleware(config, whitelist, system, access))
 
     main_rt = Router(name="main")
     @main_rt.message(Command("start"))
@@ -66,9 +78,9 @@ async def setup_bot(config):
     register_admin_handlers(admin_rt, config, admin_svc, bot)
     
     file_rt = Router(name="files")
-    register_file_handlers(file_rt, config, fm, usage, bot)
+    register_file_handlers(file_rt, config, fm, usage, results, bot, pool, office)
     
     dp.include_router(main_rt)
     dp.include_router(admin_rt)
     dp.include_router(file_rt)
-    return bot, dp, db, fm
+    return bot, dp, db, usage, fm, pool, office
@@ -38,6 +38,20 @@ class BotConfig:
     temp_dir: str = "tmp"
     port: int = 8000
     max_concurrent: int = 2
+    workers: int = 2
+    job_timeout: int = 300
+    worker_max_jobs: int = 50
+    office_instances: int = 1
+    office_timeout: int = 120
+    cache_max_mb: int = 512
+    cache_ttl: int = 3600
+    result_cache_ttl: int = 604800
+    result_cache_bypass: tuple = ()
+    access_cache_ttl: int = 60
+    usage_batch_size: int = 100
+    usage_flush_ms: int = 1000
+    memory_threshold_kb: int = 2048
+    job_memory_mb: int = 512
 
     @property
     def max_file_size_bytes(self):
@@ -66,6 +80,23 @@ def load_config():
         max_file_size_mb=int(os.getenv("MAX_FILE_SIZE_MB", "20").strip()),
         temp_dir=os.getenv("TEMP_DIR", "tmp").strip(),
         port=int(os.getenv("PORT", "8000").strip()),
+        max_concurrent=int(os.getenv("MAX_CONCURRENT", str(os.cpu_count() or 2)).strip()),
+        workers=int(os.getenv("WORKERS", str(os.cpu_count() or 2)).strip()),
+        job_timeout=int(os.getenv("JOB_TIMEOUT", "300").strip()),
+        worker_max_jobs=int(os.getenv("WORKER_MAX_JOBS", "50").strip()),
+        office_instances=int(os.getenv("OFFICE_INSTANCES", "1").strip()),
+        office_timeout=int(os.getenv("OFFICE_TIMEOUT", "120").strip()),
+        cache_max_mb=int(os.getenv("CACHE_MAX_MB", "512").strip()),
+        cache_ttl=int(os.getenv("CACHE_TTL", "3600").strip()),
+        result_cache_ttl=int(os.getenv("RESULT_CACHE_TTL", "604800").strip()),
+        result_cache_bypass=tuple(
+            t.strip() for t in os.getenv("RESULT_CACHE_BYPASS", "").split(",") if t.strip()
+        ),
+        access_cache_ttl=int(os.getenv("ACCESS_CACHE_TTL", "60").strip()),
+        usage_batch_size=int(os.getenv("USAGE_BATCH_SIZE", "100").strip()),
+        usage_flush_ms=int(os.getenv("USAGE_FLUSH_MS", "1000").strip()),
+        memory_threshold_kb=int(os.getenv("MEMORY_THRESHOLD_KB", "2048").strip()),
+        job_memory_mb=int(os.getenv("JOB_MEMORY_MB", "512").strip()),
     )
 
     Path(config.temp_dir).mkdir(parents=True, exist_ok=True)
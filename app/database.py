@@ -1,6 +1,10 @@
+import json
+import time
+import asyncio
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Optional
-from datetime import date
 
 try:
     import libsql
@@ -36,16 +40,94 @@ SCHEMA = [
         value TEXT NOT NULL,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )""",
+    """CREATE TABLE IF NOT EXISTS daily_usage (
+        user_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day)
+    )""",
+    # Seed today's counters from the log the first time the table is used.
+    """INSERT OR IGNORE INTO daily_usage (user_id, day, count)
+        SELECT user_id, DATE(timestamp), COUNT(*) FROM usage_logs
+        WHERE DATE(timestamp) = DATE('now') AND NOT EXISTS (SELECT 1 FROM daily_usage)
+        GROUP BY user_id""",
+    """CREATE TABLE IF NOT EXISTS usage_daily (
+        day TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        file_type TEXT NOT NULL,
+        tool_used TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        total_ms INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, user_id, file_type, tool_used, status)
+    )""",
+    # Backfill the rollup from existing history the first time it is created.
+    """INSERT OR IGNORE INTO usage_daily
+        SELECT DATE(timestamp), user_id, file_type, tool_used, status, COUNT(*),
+            COALESCE(SUM(processing_time_ms), 0)
+        FROM usage_logs WHERE NOT EXISTS (SELECT 1 FROM usage_daily)
+        GROUP BY 1, 2, 3, 4, 5""",
+    """CREATE TABLE IF NOT EXISTS result_cache (
+        input_id TEXT NOT NULL,
+        tool TEXT NOT NULL,
+        params TEXT NOT NULL DEFAULT '',
+        outputs TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (input_id, tool, params)
+    )""",
+]
+
+# Each entry upgrades the schema by one version. SCHEMA is version 1 and is
+# safe to re-run on databases created before versioning existed. Never edit
+# an entry that has shipped; append a new one.
+MIGRATIONS = [
+    SCHEMA,
+    [
+        # Reports read usage_daily and quotas read daily_usage, so the raw
+        # usage log stays unindexed and cheap to append to.
+        """CREATE INDEX IF NOT EXISTS idx_usage_daily_user
+            ON usage_daily (user_id, status, file_type, count)""",
+        "CREATE INDEX IF NOT EXISTS idx_usage_daily_status ON usage_daily (status, count, total_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_whitelist_active ON whitelist (is_active, is_suspended)",
+        "CREATE INDEX IF NOT EXISTS idx_whitelist_created ON whitelist (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_result_cache_expires ON result_cache (expires_at)",
+    ],
+    [
+        "ALTER TABLE usage_logs ADD COLUMN delivered INTEGER",
+        "ALTER TABLE usage_logs ADD COLUMN failed INTEGER",
+    ],
 ]
 
 
 class Database:
+    """SQLite/libsql connection owned by one dedicated thread.
+
+    Every statement runs on that thread, so the event loop never waits on
+    disk or on a Turso sync, and writes are naturally serialized.
+    """
+
+    PRAGMAS = [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-16000",
+    ]
+
     def __init__(self, url, token):
         self.url = url
         self.token = token
         self.conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
 
     async def connect(self):
+        await self._run(self._connect)
+
+    def _connect(self):
         # Ensure data directory exists if needed
         if "/" in self.url or "\\" in self.url:
             Path(self.url).parent.mkdir(parents=True, exist_ok=True)
@@ -60,18 +142,58 @@ class Database:
                 logger.info("Database ready (Turso synced)")
             except Exception as e:
                 logger.error(f"Turso connection failed: {e}. Falling back to local SQLite.")
-                self.conn = sqlite3.connect("local.db")
+                self.conn = self._open_local("local.db")
         else:
             # If no Turso URL, use the provided url as a local path
             db_path = self.url if self.url else "local.db"
-            self.conn = sqlite3.connect(db_path)
+            self.conn = self._open_local(db_path)
             logger.info(f"Database ready (Local SQLite3: {db_path})")
 
-        for stmt in SCHEMA:
-            self.conn.execute(stmt)
-        self.conn.commit()
+        self._migrate()
+
+    def _migrate(self):
+        # Kept in a table rather than PRAGMA user_version, which a Turso
+        # embedded replica does not sync.
+        self.conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+        r = self.conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        current = r[0] or 0 if r else 0
+        for version, statements in enumerate(MIGRATIONS[current:], start=current + 1):
+            # One transaction per version: SQLite DDL is transactional, so a
+            # failing statement also undoes the ALTERs before it.
+            self.conn.execute("BEGIN")
+            try:
+                for stmt in statements:
+                    self.conn.execute(stmt)
+                self.conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+            except Exception:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+            logger.info(f"Database migrated to version {version}")
+
+    def _open_local(self, path):
+        conn = sqlite3.connect(path, cached_statements=256)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    async def fetch_one(self, query, params=()):
+        return await self._run(self._fetch_one, query, params)
+
+    async def fetch_all(self, query, params=()):
+        return await self._run(self._fetch_all, query, params)
+
+    async def execute(self, query, params=()):
+        return await self._run(self._execute, query, params)
+
+    async def execute_many(self, query, rows):
+        await self._run(self._execute_many, query, rows)
 
-    def fetch_one(self, query, params=()):
+    async def execute_batch(self, batches):
+        """Run [(query, rows), ...] with executemany in one transaction."""
+        await self._run(self._execute_batch, batches)
+
+    def _fetch_one(self, query, params):
         cursor = self.conn.execute(query, params)
         columns = [desc[0] for desc in cursor.description] if cursor.description else []
         row = cursor.fetchone()
@@ -79,15 +201,35 @@ class Database:
             return None
         return dict(zip(columns, row))
 
-    def fetch_all(self, query, params=()):
+    def _fetch_all(self, query, params):
         cursor = self.conn.execute(query, params)
         columns = [desc[0] for desc in cursor.description] if cursor.description else []
         rows = cursor.fetchall()
         return [dict(zip(columns, row)) for row in rows]
 
-    def execute(self, query, params=()):
-        self.conn.execute(query, params)
+    def _execute(self, query, params):
+        cursor = self.conn.execute(query, params)
+        rowcount = cursor.rowcount
+        self.conn.commit()
+        self._sync()
+        return rowcount
+
+    def _execute_many(self, query, rows):
+        self.conn.executemany(query, rows)
         self.conn.commit()
+        self._sync()
+
+    def _execute_batch(self, batches):
+        try:
+            for query, rows in batches:
+                self.conn.executemany(query, rows)
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        self._sync()
+
+    def _sync(self):
         # Only sync if using libsql
         if HAS_LIBSQL and hasattr(self.conn, "sync"):
             try:
@@ -95,14 +237,18 @@ class Database:
             except Exception:
                 pass
 
+    def _close(self):
+        if self.conn:
+            if HAS_LIBSQL and hasattr(self.conn, "sync"):
+                self.conn.sync()
+            self.conn.close()
+
     async def disconnect(self):
         try:
-            if self.conn:
-                if HAS_LIBSQL and hasattr(self.conn, "sync"):
-                    self.conn.sync()
-                self.conn.close()
+            await self._run(self._close)
         except Exception:
             pass
+        self._executor.shutdown(wait=False)
         logger.info("Database disconnected")
 
 
@@ -113,7 +259,7 @@ class WhitelistRepo:
     async def add_user(self, user_id, username=""):
         if await self.get_user(user_id):
             return False
-        self.db.execute(
+        await self.db.execute(
             "INSERT INTO whitelist (user_id, username) VALUES (?, ?)",
             (user_id, username),
         )
@@ -123,12 +269,12 @@ class WhitelistRepo:
     async def remove_user(self, user_id):
         if not await self.get_user(user_id):
             return False
-        self.db.execute("DELETE FROM whitelist WHERE user_id=?", (user_id,))
+        await self.db.execute("DELETE FROM whitelist WHERE user_id=?", (user_id,))
         logger.info(f"User removed: {user_id}")
         return True
 
     async def get_user(self, user_id):
-        return self.db.fetch_one("SELECT * FROM whitelist WHERE user_id=?", (user_id,))
+        return await self.db.fetch_one("SELECT * FROM whitelist WHERE user_id=?", (user_id,))
 
     async def is_whitelisted(self, user_id):
         user = await self.get_user(user_id)
@@ -141,7 +287,7 @@ class WhitelistRepo:
     async def suspend_user(self, user_id):
         if not await self.get_user(user_id):
             return False
-        self.db.execute(
+        await self.db.execute(
             "UPDATE whitelist SET is_suspended=1, updated_at=CURRENT_TIMESTAMP WHERE user_id=?",
             (user_id,),
         )
@@ -150,7 +296,7 @@ class WhitelistRepo:
     async def unsuspend_user(self, user_id):
         if not await self.get_user(user_id):
             return False
-        self.db.execute(
+        await self.db.execute(
             "UPDATE whitelist SET is_suspended=0, updated_at=CURRENT_TIMESTAMP WHERE user_id=?",
             (user_id,),
         )
@@ -159,28 +305,26 @@ class WhitelistRepo:
     async def set_daily_limit(self, user_id, limit):
         if not await self.get_user(user_id):
             return False
-        self.db.execute(
+        await self.db.execute(
             "UPDATE whitelist SET daily_limit=?, updated_at=CURRENT_TIMESTAMP WHERE user_id=?",
             (limit, user_id),
         )
         return True
 
     async def list_users(self):
-        return self.db.fetch_all("SELECT * FROM whitelist ORDER BY created_at DESC")
+        return await self.db.fetch_all("SELECT * FROM whitelist ORDER BY created_at DESC")
 
     async def get_active_user_ids(self):
-        rows = self.db.fetch_all(
+        rows = await self.db.fetch_all(
             "SELECT user_id FROM whitelist WHERE is_active=1 AND is_suspended=0"
         )
         return [r["user_id"] for r in rows]
 
     async def get_daily_usage(self, user_id):
-        today = date.today().isoformat()
-        r = self.db.fetch_one(
-            "SELECT COUNT(*) as c FROM usage_logs WHERE user_id=? AND DATE(timestamp)=?",
-            (user_id, today),
+        r = await self.db.fetch_one(
+            "SELECT count FROM daily_usage WHERE user_id=? AND day=DATE('now')", (user_id,)
         )
-        return r["c"] if r else 0
+        return r["count"] if r else 0
 
     async def check_daily_limit(self, user_id):
         user = await self.get_user(user_id)
@@ -191,33 +335,159 @@ class WhitelistRepo:
 
 
 class UsageRepo:
-    def __init__(self, db):
+    """Usage log with write-behind batching.
+
+    `log` only appends to an in-memory buffer; a background task writes the
+    buffer in one transaction every `flush_interval` seconds or as soon as
+    `batch_size` rows are waiting. When the buffer reaches `max_queue` the
+    caller flushes inline, so a stalled database slows jobs down instead of
+    growing memory without bound; if the write keeps failing, the oldest
+    rows beyond `max_queue` are dropped and counted.
+
+    Rows carry the time they were logged, so a late flush still counts them
+    on the right day.
+    """
+
+    INSERT = """INSERT INTO usage_logs
+        (user_id, file_type, tool_used, file_size, status, error_message, processing_time_ms,
+         delivered, failed, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+    ROLLUP = """INSERT INTO usage_daily
+        (day, user_id, file_type, tool_used, status, count, total_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(day, user_id, file_type, tool_used, status) DO UPDATE SET
+        count=count+excluded.count, total_ms=total_ms+excluded.total_ms"""
+
+    def __init__(self, db, batch_size=100, flush_interval=1.0, max_queue=5000):
         self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._closing = False
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            rows, self._queue = self._queue, []
+            if not rows:
+                return
+            start = time.perf_counter()
+            rollup = {}
+            for user_id, file_type, tool, _, status, _, ms, _, _, ts in rows:
+                key = (ts[:10], user_id, file_type, tool, status)
+                count, total = rollup.get(key, (0, 0))
+                rollup[key] = (count + 1, total + (ms or 0))
+            try:
+                await self.db.execute_batch([
+                    (self.INSERT, rows),
+                    (self.ROLLUP, [key + value for key, value in rollup.items()]),
+                ])
+            except Exception as e:
+                logger.error(f"Usage flush of {len(rows)} rows failed: {e}")
+                self._queue[:0] = rows
+                overflow = len(self._queue) - self.max_queue
+                if overflow > 0:
+                    del self._queue[:overflow]
+                    self.rows_dropped += overflow
+                    logger.warning(f"Usage queue full, dropped {overflow} oldest rows")
+                return
+            ms = (time.perf_counter() - start) * 1000
+            self.flushes += 1
+            self.rows_written += len(rows)
+            self.last_flush_ms = ms
+            self.max_flush_ms = max(self.max_flush_ms, ms)
+
+    async def shutdown(self):
+        # Let the loop finish a flush in progress rather than cancelling it
+        # between taking the queue and writing it.
+        if self._task:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def queue_stats(self):
+        return {
+            "queued": len(self._queue),
+            "flushes": self.flushes,
+            "rows": self.rows_written,
+            "dropped": self.rows_dropped,
+            "last_ms": round(self.last_flush_ms, 1),
+            "max_ms": round(self.max_flush_ms, 1),
+        }
+
+    async def reserve(self, user_id):
+        """Take one job from today's quota. Returns the day it was counted
+        on, for `release`, or None if the limit is reached."""
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        reserved = await self.db.execute(
+            """INSERT INTO daily_usage (user_id, day, count)
+            SELECT user_id, ?, 1 FROM whitelist WHERE user_id=? AND daily_limit > 0
+            ON CONFLICT(user_id, day) DO UPDATE SET count=count+1
+            WHERE daily_usage.count < (SELECT daily_limit FROM whitelist WHERE user_id=excluded.user_id)""",
+            (day, user_id),
+        )
+        return day if reserved > 0 else None
+
+    async def release(self, user_id, day):
+        """Refund a job reserved on `day`, even if that is no longer today."""
+        await self.db.execute(
+            "UPDATE daily_usage SET count=MAX(count-1, 0) WHERE user_id=? AND day=? AND count > 0",
+            (user_id, day),
+        )
 
     async def log(self, user_id, file_type, tool_used,
                   file_size=0, status="success",
-                  error_message="", processing_time_ms=0):
-        self.db.execute(
-            """INSERT INTO usage_logs
-            (user_id, file_type, tool_used, file_size, status, error_message, processing_time_ms)
-            VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (user_id, file_type, tool_used, file_size, status, error_message, processing_time_ms),
+                  error_message="", processing_time_ms=0, delivered=None, failed=None):
+        """Queue one job record. `delivered`/`failed` count output files
+        for jobs that send several."""
+        now = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        self._queue.append(
+            (user_id, file_type, tool_used, file_size, status, error_message, processing_time_ms,
+             delivered, failed, now)
         )
+        if len(self._queue) >= self.max_queue:
+            await self.flush()
+        elif len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    # Reports below read the usage_daily rollup, never the raw log.
 
     async def total_processed(self):
-        r = self.db.fetch_one("SELECT COUNT(*) as c FROM usage_logs")
-        return r["c"] if r else 0
+        r = await self.db.fetch_one("SELECT SUM(count) as c FROM usage_daily")
+        return r["c"] or 0 if r else 0
 
     async def today_processed(self):
-        today = date.today().isoformat()
-        r = self.db.fetch_one(
-            "SELECT COUNT(*) as c FROM usage_logs WHERE DATE(timestamp)=?", (today,)
+        r = await self.db.fetch_one(
+            "SELECT SUM(count) as c FROM usage_daily WHERE day=DATE('now')"
         )
-        return r["c"] if r else 0
+        return r["c"] or 0 if r else 0
 
     async def success_failure(self):
-        rows = self.db.fetch_all(
-            "SELECT status, COUNT(*) as c FROM usage_logs GROUP BY status"
+        rows = await self.db.fetch_all(
+            "SELECT status, SUM(count) as c FROM usage_daily GROUP BY status"
         )
         result = {"success": 0, "failure": 0}
         for row in rows:
@@ -228,61 +498,57 @@ class UsageRepo:
         return result
 
     async def file_type_dist(self):
-        return self.db.fetch_all(
-            "SELECT file_type, COUNT(*) as c FROM usage_logs GROUP BY file_type ORDER BY c DESC"
+        return await self.db.fetch_all(
+            "SELECT file_type, SUM(count) as c FROM usage_daily GROUP BY file_type ORDER BY c DESC"
         )
 
     async def top_users(self, limit=5):
-        return self.db.fetch_all(
-            "SELECT user_id, COUNT(*) as c FROM usage_logs GROUP BY user_id ORDER BY c DESC LIMIT ?",
+        return await self.db.fetch_all(
+            "SELECT user_id, SUM(count) as c FROM usage_daily GROUP BY user_id ORDER BY c DESC LIMIT ?",
             (limit,),
         )
 
     async def avg_time(self):
-        r = self.db.fetch_one(
-            "SELECT AVG(processing_time_ms) as a FROM usage_logs WHERE status='success'"
+        r = await self.db.fetch_one(
+            "SELECT SUM(total_ms) * 1.0 / SUM(count) as a FROM usage_daily WHERE status='success'"
         )
         return round(r["a"] or 0, 2) if r and r["a"] else 0.0
 
     async def error_count(self):
-        r = self.db.fetch_one("SELECT COUNT(*) as c FROM usage_logs WHERE status!='success'")
-        return r["c"] if r else 0
+        r = await self.db.fetch_one("SELECT SUM(count) as c FROM usage_daily WHERE status!='success'")
+        return r["c"] or 0 if r else 0
 
     async def active_today(self):
-        today = date.today().isoformat()
-        r = self.db.fetch_one(
-            "SELECT COUNT(DISTINCT user_id) as c FROM usage_logs WHERE DATE(timestamp)=?",
-            (today,),
+        r = await self.db.fetch_one(
+            "SELECT COUNT(DISTINCT user_id) as c FROM usage_daily WHERE day=DATE('now')"
         )
         return r["c"] if r else 0
 
     async def user_total(self, user_id):
-        r = self.db.fetch_one(
-            "SELECT COUNT(*) as c FROM usage_logs WHERE user_id=?", (user_id,)
+        r = await self.db.fetch_one(
+            "SELECT SUM(count) as c FROM usage_daily WHERE user_id=?", (user_id,)
         )
-        return r["c"] if r else 0
+        return r["c"] or 0 if r else 0
 
     async def user_today(self, user_id):
-        today = date.today().isoformat()
-        r = self.db.fetch_one(
-            "SELECT COUNT(*) as c FROM usage_logs WHERE user_id=? AND DATE(timestamp)=?",
-            (user_id, today),
+        r = await self.db.fetch_one(
+            "SELECT count FROM daily_usage WHERE user_id=? AND day=DATE('now')", (user_id,)
         )
-        return r["c"] if r else 0
+        return r["count"] if r else 0
 
     async def user_fail_rate(self, user_id):
         total = await self.user_total(user_id)
         if total == 0:
             return 0.0
-        r = self.db.fetch_one(
-            "SELECT COUNT(*) as c FROM usage_logs WHERE user_id=? AND status!='success'",
+        r = await self.db.fetch_one(
+            "SELECT SUM(count) as c FROM usage_daily WHERE user_id=? AND status!='success'",
             (user_id,),
         )
-        return round(((r["c"] if r else 0) / total) * 100, 2)
+        return round(((r["c"] or 0 if r else 0) / total) * 100, 2)
 
     async def user_fav_type(self, user_id):
-        r = self.db.fetch_one(
-            "SELECT file_type FROM usage_logs WHERE user_id=? GROUP BY file_type ORDER BY COUNT(*) DESC LIMIT 1",
+        r = await self.db.fetch_one(
+            "SELECT file_type FROM usage_daily WHERE user_id=? GROUP BY file_type ORDER BY SUM(count) DESC LIMIT 1",
             (user_id,),
         )
         return r["file_type"] if r else "N/A"
@@ -293,7 +559,7 @@ class SystemRepo:
         self.db = db
 
     async def set_stat(self, key, value):
-        self.db.execute(
+        await self.db.execute(
             """INSERT INTO system_stats (key, value, updated_at)
             VALUES (?, ?, CURRENT_TIMESTAMP)
             ON CONFLICT(key) DO UPDATE SET value=?, updated_at=CURRENT_TIMESTAMP""",
@@ -301,5 +567,37 @@ class SystemRepo:
         )
 
     async def get_stat(self, key, default=""):
-        r = self.db.fetch_one("SELECT value FROM system_stats WHERE key=?", (key,))
+        r = await self.db.fetch_one("SELECT value FROM system_stats WHERE key=?", (key,))
         return r["value"] if r else default
+
+
+class ResultCacheRepo:
+    """Telegram file_ids of outputs already sent, keyed by input and tool."""
+
+    def __init__(self, db, ttl=604800, bypass=()):
+        self.db = db
+        self.ttl = ttl
+        self.bypass = set(bypass)
+
+    def enabled(self, tool):
+        return self.ttl > 0 and tool not in self.bypass
+
+    async def get(self, input_id, tool, params=""):
+        r = await self.db.fetch_one(
+            """SELECT outputs FROM result_cache
+            WHERE input_id=? AND tool=? AND params=? AND expires_at > CURRENT_TIMESTAMP""",
+            (input_id, tool, params),
+        )
+        return json.loads(r["outputs"]) if r else None
+
+    async def put(self, input_id, tool, params, outputs):
+        await self.db.execute(
+            """INSERT INTO result_cache (input_id, tool, params, outputs, expires_at)
+            VALUES (?, ?, ?, ?, datetime('now', ?))
+            ON CONFLICT(input_id, tool, params) DO UPDATE SET
+            outputs=excluded.outputs, created_at=CURRENT_TIMESTAMP, expires_at=excluded.expires_at""",
+            (input_id, tool, params, json.dumps(outputs), f"+{int(self.ttl)} seconds"),
+        )
+
+    async def purge(self):
+        await self.db.execute("DELETE FROM result_cache WHERE expires_at <= CURRENT_TIMESTAMP")
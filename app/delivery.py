@@ -0,0 +1,113 @@
+import time
+import asyncio
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramNetworkError,
+    TelegramServerError,
+)
+from aiogram.types import FSInputFile, BufferedInputFile, InputMediaDocument
+
+from app.config import logger
+
+# sendMediaGroup takes 2-10 items.
+GROUP_SIZE = 10
+
+
+def as_document(item):
+    """Telegram input for a produced output: a path, (name, bytes) or file_id."""
+    if isinstance(item, Path):
+        return FSInputFile(path=str(item), filename=item.name)
+    if isinstance(item, tuple):
+        name, data = item
+        return BufferedInputFile(data, filename=name)
+    return item
+
+
+@dataclass
+class DeliveryReport:
+    messages: list = field(default_factory=list)
+    failed: int = 0
+
+    @property
+    def delivered(self):
+        return len(self.messages)
+
+
+class Delivery:
+    """Sends job outputs to chats, up to GROUP_SIZE documents per request.
+
+    Requests to one chat are spaced `chat_interval` apart and all requests
+    share a global `rate` per second, which keeps the bot under Telegram's
+    flood limits. `RetryAfter` pauses the whole chat for the time Telegram
+    asks for; network and server errors are retried with exponential
+    backoff. A group that still fails is re-sent document by document, so
+    the report counts exactly what arrived.
+    """
+
+    def __init__(self, bot, chat_interval=1.0, rate=25, attempts=4, backoff=1.0):
+        self.bot = bot
+        self.chat_interval = chat_interval
+        self.rate = rate
+        self.attempts = attempts
+        self.backoff = backoff
+        self._next = {}
+        self._global_next = 0.0
+
+    async def send(self, chat_id, docs):
+        """Deliver [(document, caption), ...] in order and report the outcome."""
+        report = DeliveryReport()
+        for i in range(0, len(docs), GROUP_SIZE):
+            group = docs[i:i + GROUP_SIZE]
+            if len(group) > 1:
+                try:
+                    report.messages.extend(await self._call(chat_id, lambda: self.bot.send_media_group(
+                        chat_id=chat_id,
+                        media=[InputMediaDocument(media=d, caption=c) for d, c in group])))
+                    continue
+                except Exception as e:
+                    logger.warning(f"Media group to {chat_id} failed, sending singly: {e}")
+            for d, c in group:
+                try:
+                    report.messages.append(await self._call(chat_id, lambda: self.bot.send_document(
+                        chat_id=chat_id, document=d, caption=c)))
+                except Exception as e:
+                    logger.warning(f"Send to {chat_id} failed: {e}")
+                    report.failed += 1
+        return report
+
+    async def send_one(self, chat_id, document, caption=None):
+        """Deliver a single document with the same pacing and retries."""
+        return await self._call(chat_id, lambda: self.bot.send_document(
+            chat_id=chat_id, document=document, caption=caption))
+
+    async def _call(self, chat_id, request):
+        for attempt in range(self.attempts):
+            await self._pace(chat_id)
+            last = attempt == self.attempts - 1
+            try:
+                return await request()
+            except TelegramRetryAfter as e:
+                if last:
+                    raise
+                logger.warning(f"Flood limit for {chat_id}, retrying in {e.retry_after}s")
+                self._next[chat_id] = max(self._next.get(chat_id, 0.0), time.monotonic() + e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if last:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"Send to {chat_id} failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def _pace(self, chat_id):
+        now = time.monotonic()
+        if len(self._next) > 1000:
+            self._next = {k: v for k, v in self._next.items() if v > now}
+        slot = max(now, self._global_next)
+        self._global_next = slot + 1 / self.rate
+        at = max(slot, self._next.get(chat_id, 0.0))
+        self._next[chat_id] = at + self.chat_interval
+        if at > now:
+            await asyncio.sleep(at - now)
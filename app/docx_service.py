@@ -1,5 +1,5 @@
-import subprocess
-import shutil
+import io
+import csv
 from pathlib import Path
 from docx import Document
 from app.config import logger
@@ -8,7 +8,7 @@ from app.config import logger
 class DOCXService:
 
     @staticmethod
-    async def remove_metadata(input_path, output_path):
+    def remove_metadata(input_path, output_path):
         doc = Document(str(input_path))
         core = doc.core_properties
         core.author = ""
@@ -24,7 +24,7 @@ class DOCXService:
         return output_path
 
     @staticmethod
-    async def remove_comments(input_path, output_path):
+    def remove_comments(input_path, output_path):
         doc = Document(str(input_path))
         body = doc.element.body
         comment_tags = ("commentRangeStart", "commentRangeEnd", "commentReference")
@@ -42,7 +42,7 @@ class DOCXService:
         return output_path
 
     @staticmethod
-    async def extract_text(input_path):
+    def extract_text(input_path):
         doc = Document(str(input_path))
         parts = []
         for para in doc.paragraphs:
@@ -60,50 +60,7 @@ class DOCXService:
         return result
 
     @staticmethod
-    async def to_pdf(input_path, output_path):
-        input_path = Path(input_path)
-        output_path = Path(output_path)
-
-        # LibreOffice outputs to a directory, not a specific file
-        out_dir = output_path.parent
-
-        try:
-            result = subprocess.run(
-                [
-                    "libreoffice",
-                    "--headless",
-                    "--norestore",
-                    "--convert-to", "pdf",
-                    "--outdir", str(out_dir),
-                    str(input_path),
-                ],
-                capture_output=True,
-                text=True,
-                timeout=120,
-            )
-
-            if result.returncode != 0:
-                logger.error(f"LibreOffice error: {result.stderr}")
-                raise Exception(f"Conversion failed: {result.stderr[:200]}")
-
-            # LibreOffice creates file with same name but .pdf extension
-            generated_pdf = out_dir / f"{input_path.stem}.pdf"
-
-            if not generated_pdf.exists():
-                raise Exception("PDF file was not generated")
-
-            # Move to expected output path
-            if generated_pdf != output_path:
-                shutil.move(str(generated_pdf), str(output_path))
-
-            logger.info("DOCX converted to PDF via LibreOffice")
-            return output_path
-
-        except subprocess.TimeoutExpired:
-            raise Exception("Conversion timed out (120s limit)")
-
-    @staticmethod
-    async def get_info(input_path):
+    def get_info(input_path):
         doc = Document(str(input_path))
         core = doc.core_properties
 
@@ -141,7 +98,7 @@ class DOCXService:
         return info
 
     @staticmethod
-    async def word_count(input_path):
+    def word_count(input_path):
         doc = Document(str(input_path))
         total_text = ""
         for para in doc.paragraphs:
@@ -165,10 +122,11 @@ class DOCXService:
         }
 
     @staticmethod
-    async def extract_images(input_path, output_dir):
-        output_dir.mkdir(parents=True, exist_ok=True)
+    def extract_images(input_path, output_dir=None):
+        """Write embedded images to `output_dir`, or return them as
+        [(name, bytes), ...] when no directory is given."""
         doc = Document(str(input_path))
-        paths = []
+        results = []
         img_count = 0
 
         for rel in doc.part.rels.values():
@@ -178,28 +136,40 @@ class DOCXService:
                 ext = image.content_type.split("/")[-1]
                 if ext == "jpeg":
                     ext = "jpg"
-                img_path = output_dir / f"image_{img_count}.{ext}"
+                name = f"image_{img_count}.{ext}"
+                if output_dir is None:
+                    results.append((name, image.blob))
+                    continue
+                output_dir.mkdir(parents=True, exist_ok=True)
+                img_path = output_dir / name
                 with open(img_path, "wb") as f:
                     f.write(image.blob)
-                paths.append(img_path)
+                results.append(img_path)
 
-        logger.info(f"DOCX images extracted: {len(paths)}")
-        return paths
+        logger.info(f"DOCX images extracted: {len(results)}")
+        return results
 
     @staticmethod
-    async def extract_tables_csv(input_path, output_dir):
-        import csv
-        output_dir.mkdir(parents=True, exist_ok=True)
+    def extract_tables_csv(input_path, output_dir=None):
+        """Write each table as CSV to `output_dir`, or return them as
+        [(name, bytes), ...] when no directory is given."""
         doc = Document(str(input_path))
-        paths = []
+        results = []
 
         for idx, table in enumerate(doc.tables):
-            csv_path = output_dir / f"table_{idx + 1}.csv"
+            name = f"table_{idx + 1}.csv"
+            buf = io.StringIO(newline="")
+            writer = csv.writer(buf)
+            for row in table.rows:
+                writer.writerow([cell.text.strip() for cell in row.cells])
+            if output_dir is None:
+                results.append((name, buf.getvalue().encode("utf-8")))
+                continue
+            output_dir.mkdir(parents=True, exist_ok=True)
+            csv_path = output_dir / name
             with open(csv_path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                for row in table.rows:
-                    writer.writerow([cell.text.strip() for cell in row.cells])
-            paths.append(csv_path)
+                f.write(buf.getvalue())
+            results.append(csv_path)
 
-        logger.info(f"DOCX tables extracted: {len(paths)} CSV files")
-        return paths
+        logger.info(f"DOCX tables extracted: {len(results)} CSV files")
+        return results
@@ -1,6 +1,11 @@
+import io
+import os
 import uuid
 import time
+import hashlib
 import shutil
+import asyncio
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional
 
@@ -10,24 +15,231 @@ from aiogram.types import Document, FSInputFile
 from app.config import logger
 
 
+class FileTooLargeError(Exception):
+    pass
+
+
+def _sha256_file(path, chunk_size):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 class FileManager:
-    def __init__(self, temp_dir="tmp"):
+    # Telegram keeps a file_path downloadable for at least an hour.
+    FILE_PATH_TTL = 3000
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, temp_dir="tmp", cache_max_bytes=512 * 1024 * 1024, cache_ttl=3600,
+                 max_bytes=0, download_timeout=60):
         self.temp_dir = Path(temp_dir)
         self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_dir = self.temp_dir / "cache"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._inflight = {}
+        self._file_paths = {}
+        self._digests = {}
+        self.max_bytes = max_bytes
+        self.download_timeout = download_timeout
+        self.stats = {"hits": 0, "misses": 0, "bytes_saved": 0}
+        self._load_cache()
 
     def temp_path(self, extension=""):
         return self.temp_dir / f"{uuid.uuid4().hex}{extension}"
 
-    async def download(self, bot, document):
-        ext = ""
-        if document.file_name:
-            ext = Path(document.file_name).suffix
-        path = self.temp_path(ext)
-        tg_file = await bot.get_file(document.file_id)
-        await bot.download_file(tg_file.file_path, destination=str(path))
-        logger.info(f"Downloaded: {path.name}")
+    def _load_cache(self):
+        entries = sorted(self.cache_dir.iterdir(), key=lambda p: p.stat().st_mtime)
+        for item in entries:
+            if item.suffix == ".part":
+                self.cleanup(item)
+            elif item.is_file():
+                size = item.stat().st_size
+                self._cache[item.name] = (item, size, item.stat().st_mtime)
+                self._cache_bytes += size
+        self._evict()
+
+    async def download(self, bot, file_id, unique_id=None, extension="", progress=None):
+        """Download a Telegram file into a fresh temp path.
+
+        Files with a `unique_id` go through a disk cache, and the caller gets
+        a hard link to the cached copy, so deleting the temp path afterwards
+        never touches the cache.
+        """
+        path = self.temp_path(extension)
+        try:
+            if not unique_id:
+                await self._stream(bot, file_id, path, progress)
+            else:
+                self._link(await self._cached(bot, file_id, unique_id, progress), path)
+        except Exception:
+            self.cleanup(path)
+            raise
         return path
 
+    async def download_bytes(self, bot, file_id, unique_id=None, progress=None):
+        """Download a small Telegram file into memory.
+
+        Files with a `unique_id` go through the disk cache like `download`,
+        so repeated tools and concurrent requests fetch them from Telegram
+        once; others are streamed straight into a buffer.
+        """
+        if not unique_id:
+            buf = io.BytesIO()
+            await self._stream(bot, file_id, buf, progress)
+            return buf.getvalue()
+        path = await self._cached(bot, file_id, unique_id, progress)
+        # Opened before yielding, so an eviction meanwhile cannot unlink it.
+        with open(path, "rb") as f:
+            return await asyncio.to_thread(f.read)
+
+    async def content_hash(self, path, unique_id=None):
+        """SHA-256 of a downloaded file: the one taken while streaming it
+        if known, otherwise hashed from disk off the event loop."""
+        digest = self._digests.get(unique_id)
+        if not digest:
+            digest = await asyncio.to_thread(_sha256_file, path, self.CHUNK_SIZE)
+            if unique_id and unique_id in self._cache:
+                self._digests[unique_id] = digest
+        return digest
+
+    async def _file_path(self, bot, file_id):
+        hit = self._file_paths.get(file_id)
+        if hit and hit[1] > time.time():
+            return hit[0]
+        tg_file = await bot.get_file(file_id)
+        if len(self._file_paths) > 1000:
+            now = time.time()
+            self._file_paths = {k: v for k, v in self._file_paths.items() if v[1] > now}
+        self._file_paths[file_id] = (tg_file.file_path, time.time() + self.FILE_PATH_TTL)
+        return tg_file.file_path
+
+    async def _stream(self, bot, file_id, dest, progress=None):
+        """Stream a Telegram file into `dest`, a path or a binary buffer.
+
+        The size limit is enforced on the bytes actually received, since
+        Telegram does not always report `file_size`. `progress`, if given,
+        is awaited with the running byte count after every chunk. Returns
+        (size, sha256 hex digest).
+        """
+        file_path = await self._file_path(bot, file_id)
+        api = bot.session.api
+        if api.is_local:
+            stream = self._read_local(api.wrap_local_file.to_local(file_path))
+        else:
+            stream = bot.session.stream_content(
+                url=api.file_url(bot.token, file_path), timeout=self.download_timeout,
+                chunk_size=self.CHUNK_SIZE, raise_for_status=True,
+            )
+        out = open(dest, "wb") if isinstance(dest, (str, Path)) else dest
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async for chunk in stream:
+                size += len(chunk)
+                if self.max_bytes and size > self.max_bytes:
+                    raise FileTooLargeError(f"File is larger than {format_size(self.max_bytes)}")
+                digest.update(chunk)
+                out.write(chunk)
+                if progress:
+                    await progress(size)
+        finally:
+            if out is not dest:
+                out.close()
+            await stream.aclose()
+        logger.info(f"Downloaded {format_size(size)}")
+        return size, digest.hexdigest()
+
+    async def _read_local(self, path):
+        with open(path, "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, self.CHUNK_SIZE):
+                yield chunk
+
+    def _lookup(self, unique_id):
+        entry = self._cache.get(unique_id) if unique_id else None
+        if entry and time.time() - entry[2] < self.cache_ttl and entry[0].exists():
+            self._cache.move_to_end(unique_id)
+            self._hit(entry[1])
+            return entry[0]
+        return None
+
+    async def _cached(self, bot, file_id, unique_id, progress=None):
+        path = self._lookup(unique_id)
+        if path:
+            return path
+        task = self._inflight.get(unique_id)
+        if task:
+            # Someone is already downloading this file: share their result.
+            path = await asyncio.shield(task)
+            self._hit(path.stat().st_size)
+            return path
+        task = asyncio.ensure_future(self._fill(bot, file_id, unique_id, progress))
+        self._inflight[unique_id] = task
+        return await asyncio.shield(task)
+
+    async def _fill(self, bot, file_id, unique_id, progress=None):
+        self.stats["misses"] += 1
+        self._drop(unique_id)
+        path = self.cache_dir / unique_id
+        part = self.cache_dir / f"{unique_id}.part"
+        try:
+            _, self._digests[unique_id] = await self._stream(bot, file_id, part, progress)
+            part.replace(path)
+        except Exception:
+            self.cleanup(part)
+            raise
+        finally:
+            self._inflight.pop(unique_id, None)
+        size = path.stat().st_size
+        self._cache[unique_id] = (path, size, time.time())
+        self._cache_bytes += size
+        self._evict()
+        return path
+
+    def _hit(self, size):
+        self.stats["hits"] += 1
+        self.stats["bytes_saved"] += size
+
+    def _drop(self, unique_id):
+        self._digests.pop(unique_id, None)
+        entry = self._cache.pop(unique_id, None)
+        if entry:
+            self._cache_bytes -= entry[1]
+            self.cleanup(entry[0])
+
+    def _evict(self):
+        cutoff = time.time() - self.cache_ttl
+        for unique_id, (_, _, added) in list(self._cache.items()):
+            if added < cutoff:
+                self._drop(unique_id)
+        # The newest entry always stays, even if it alone exceeds the budget.
+        while len(self._cache) > 1 and self._cache_bytes > self.cache_max_bytes:
+            self._drop(next(iter(self._cache)))
+
+    @staticmethod
+    def _link(src, dst):
+        # A link shares the cached file's inode, so its mtime is left alone:
+        # cache age and LRU order after a restart are read from it. Linking
+        # bumps st_ctime, which the temp auto-cleanup goes by instead.
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+    def cache_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / lookups * 100, 1) if lookups else 0.0,
+            "entries": len(self._cache),
+            "bytes": self._cache_bytes,
+        }
+
     def cleanup(self, *paths):
         for p in paths:
             try:
@@ -44,6 +256,8 @@ class FileManager:
             return 0
         count = 0
         for item in self.temp_dir.iterdir():
+            if item == self.cache_dir:
+                continue
             try:
                 if item.is_dir():
                     shutil.rmtree(item, ignore_errors=True)
@@ -1,5 +1,7 @@
+import time
 import asyncio
-import zipfile
+from itertools import islice
+from collections import OrderedDict, deque
 from pathlib import Path
 
 from aiogram import Router, Bot, F
@@ -9,6 +11,7 @@ from aiogram.types import (
     InlineKeyboardMarkup,
     InlineKeyboardButton,
     FSInputFile,
+    BufferedInputFile,
 )
 
 from app.config import BotConfig, logger
@@ -17,16 +20,66 @@ from app.file_manager import FileManager, Timer, format_size, detect_category
 from app.image_service import ImageService
 from app.pdf_service import PDFService
 from app.docx_service import DOCXService
+from app.scheduler import JobScheduler
+from app.zip_packager import ZipPackager
+from app.delivery import Delivery, as_document
 
 router = Router(name="files")
 
 _pending = {}
-_semaphore = asyncio.Semaphore(2)
 _waiting_resize = {}
 _waiting_password = {}
 _waiting_unlock = {}
 _waiting_pages = {}
+_waiting_merge_plan = {}
+_waiting_target = {}
 _merge_queue = {}
+_pool = None
+_office = None
+_results = None
+_usage = None
+_admin_id = 0
+_memory_max = 0
+
+PROGRESS_MIN_BYTES = 5 * 1024 * 1024
+# More than 10 outputs are zipped, in parts of this many files.
+ZIP_PART_FILES = 25
+# Pages per text-extraction shard; fewer for the slow layout engine.
+TEXT_SHARD_PAGES = {"fast": 50, "layout": 5}
+_scheduler = None
+_delivery = None
+# PDFService.probe() results by content hash, most recently used last.
+_probes = OrderedDict()
+PROBE_CACHE_SIZE = 256
+
+
+def _render_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="PNG 150dpi", callback_data="pdf_img:png:150:0"),
+            InlineKeyboardButton(text="JPEG 150dpi", callback_data="pdf_img:jpeg:150:0"),
+            InlineKeyboardButton(text="WebP 150dpi", callback_data="pdf_img:webp:150:0"),
+        ],
+        [
+            InlineKeyboardButton(text="JPEG 72dpi", callback_data="pdf_img:jpeg:72:0"),
+            InlineKeyboardButton(text="JPEG 300dpi", callback_data="pdf_img:jpeg:300:0"),
+            InlineKeyboardButton(text="PNG 300dpi", callback_data="pdf_img:png:300:0"),
+        ],
+        [InlineKeyboardButton(text="⬛ Grayscale JPEG 150dpi", callback_data="pdf_img:jpeg:150:1")],
+        [InlineKeyboardButton(text="❌ Cancel", callback_data="cancel")],
+    ])
+
+
+def _compress_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="⚡ Fast", callback_data="pdf_comp:fast:0"),
+            InlineKeyboardButton(text="⚖️ Balanced", callback_data="pdf_comp:balanced:0"),
+            InlineKeyboardButton(text="🗜 Max", callback_data="pdf_comp:max:0"),
+        ],
+        [InlineKeyboardButton(text="🌐 Balanced + fast web view", callback_data="pdf_comp:balanced:1")],
+        [InlineKeyboardButton(text="❌ Cancel", callback_data="cancel")],
+    ])
 
 
 def _keyboard(category):
@@ -48,6 +101,7 @@ def _keyboard(category):
                 InlineKeyboardButton(text="📷 Med", callback_data="img_comp_med"),
                 InlineKeyboardButton(text="📷 High", callback_data="img_comp_high"),
             ],
+            [InlineKeyboardButton(text="🎯 Compress to size", callback_data="img_comp_target")],
             [
                 InlineKeyboardButton(text="⬛ Grayscale", callback_data="img_gray"),
                 InlineKeyboardButton(text="📏 Info", callback_data="img_info"),
@@ -74,7 +128,10 @@ def _keyboard(category):
         ],
         "pdf": [
             [InlineKeyboardButton(text="🧹 Remove Metadata", callback_data="pdf_meta")],
-            [InlineKeyboardButton(text="📝 Extract Text", callback_data="pdf_text")],
+            [
+                InlineKeyboardButton(text="📝 Extract Text", callback_data="pdf_text"),
+                InlineKeyboardButton(text="📐 Text (layout)", callback_data="pdf_text_layout"),
+            ],
             [InlineKeyboardButton(text="🖼 Extract Images", callback_data="pdf_imgs")],
             [InlineKeyboardButton(text="✂️ Split Pages", callback_data="pdf_split")],
             [InlineKeyboardButton(text="📊 PDF Info", callback_data="pdf_info")],
@@ -109,7 +166,16 @@ def _keyboard(category):
     )
 
 
-def register_file_handlers(rt, config, fm, usage, bot):
+def register_file_handlers(rt, config, fm, usage, results, bot, pool, office):
+    global _pool, _office, _results, _usage, _admin_id, _memory_max, _scheduler, _delivery
+    _pool = pool
+    _usage = usage
+    _admin_id = config.admin_id
+    _memory_max = config.memory_threshold_kb * 1024
+    _office = office
+    _results = results
+    _scheduler = JobScheduler(config.max_concurrent)
+    _delivery = Delivery(bot)
     img = ImageService()
     pdf = PDFService()
     docx = DOCXService()
@@ -119,7 +185,7 @@ def register_file_handlers(rt, config, fm, usage, bot):
     @rt.message(F.photo)
     async def on_photo(message: Message):
         user_id = message.from_user.id
-        if user_id in _waiting_resize or user_id in _waiting_password or user_id in _waiting_unlock or user_id in _waiting_pages:
+        if user_id in _waiting_resize or user_id in _waiting_password or user_id in _waiting_unlock or user_id in _waiting_pages or user_id in _waiting_merge_plan or user_id in _waiting_target:
             return
         photo = message.photo[-1]
         if photo.file_size and photo.file_size > config.max_file_size_bytes:
@@ -127,6 +193,7 @@ def register_file_handlers(rt, config, fm, usage, bot):
             return
         _pending[user_id] = {
             "file_id": photo.file_id,
+            "file_unique_id": photo.file_unique_id,
             "file_name": "photo.jpg",
             "file_size": photo.file_size or 0,
             "mime_type": "image/jpeg",
@@ -147,17 +214,11 @@ def register_file_handlers(rt, config, fm, usage, bot):
 
         if user_id in _merge_queue:
             if doc.mime_type == "application/pdf":
-                path = fm.temp_path(".pdf")
-                tg_file = await bot.get_file(doc.file_id)
-                await bot.download_file(tg_file.file_path, destination=str(path))
-                _merge_queue[user_id]["files"].append(path)
-                count = len(_merge_queue[user_id]["files"])
+                path = await fm.download(bot, doc.file_id, doc.file_unique_id, ".pdf")
+                count = _queue_merge(user_id, path, doc.file_name or "file.pdf", message.reply)
                 await message.reply(
                     f"📎 PDF #{count} added!\n\nSend more or click Done:",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text=f"✅ Merge {count} PDFs", callback_data="pdf_merge_done")],
-                        [InlineKeyboardButton(text="❌ Cancel", callback_data="pdf_merge_cancel")],
-                    ]),
+                    reply_markup=_merge_keyboard(count),
                 )
             else:
                 await message.reply("❌ Only PDF files for merge.")
@@ -172,6 +233,7 @@ def register_file_handlers(rt, config, fm, usage, bot):
             return
         _pending[user_id] = {
             "file_id": doc.file_id,
+            "file_unique_id": doc.file_unique_id,
             "file_name": doc.file_name or "file",
             "file_size": doc.file_size or 0,
             "mime_type": doc.mime_type,
@@ -216,6 +278,16 @@ def register_file_handlers(rt, config, fm, usage, bot):
                 await message.reply("❌ Invalid. Use '50' or '800x600'")
             return
 
+        if user_id in _waiting_target:
+            data = _waiting_target.pop(user_id)
+            target = _parse_size(text)
+            if not target or not 5 * 1024 <= target <= config.max_file_size_bytes:
+                _waiting_target[user_id] = data
+                await message.reply(f"❌ Send a size from 5KB to {config.max_file_size_mb}MB, e.g. '200KB' or '1.5MB'")
+                return
+            await _do_compress_target(message, bot, fm, usage, data, target)
+            return
+
         if user_id in _waiting_password:
             data = _waiting_password.pop(user_id)
             if len(text) < 1:
@@ -229,6 +301,23 @@ def register_file_handlers(rt, config, fm, usage, bot):
             await _do_unlock(message, bot, fm, usage, data, text)
             return
 
+        if user_id in _waiting_merge_plan:
+            _waiting_merge_plan.pop(user_id)
+            merge = _merge_queue.get(user_id)
+            if not merge:
+                return
+            try:
+                merge["plan"] = await _parse_merge_plan(merge["files"], text)
+            except ValueError as e:
+                _waiting_merge_plan[user_id] = True
+                await message.reply(f"❌ {e}\nTry again, e.g. '2 1:1-3 3'")
+                return
+            await message.reply(
+                f"📎 Merge plan\n━━━━━━━━━━━━━━━━━━━━━\n{_describe_merge_plan(merge)}",
+                reply_markup=_merge_keyboard(len(merge["files"])),
+            )
+            return
+
         if user_id in _waiting_pages:
             data = _waiting_pages.pop(user_id)
             try:
@@ -254,10 +343,8 @@ def register_file_handlers(rt, config, fm, usage, bot):
         _waiting_password.pop(uid, None)
         _waiting_unlock.pop(uid, None)
         _waiting_pages.pop(uid, None)
-        if uid in _merge_queue:
-            for f in _merge_queue[uid].get("files", []):
-                fm.cleanup(f)
-            _merge_queue.pop(uid, None)
+        _waiting_target.pop(uid, None)
+        _drop_merge(fm, uid)
         await cb.message.edit_text("❌ Cancelled.")
         await cb.answer()
 
@@ -266,17 +353,17 @@ def register_file_handlers(rt, config, fm, usage, bot):
     # ══════════════════════════════════════
 
     @rt.callback_query(F.data == "img_meta")
-    async def h1(cb): await _do(cb, bot, config, fm, usage, "image", "remove_metadata", lambda i, o: img.remove_metadata(i, o))
+    async def h1(cb): await _do(cb, bot, config, fm, usage, "image", "remove_metadata", img.remove_metadata)
     @rt.callback_query(F.data == "img_r50")
-    async def h2(cb): await _do(cb, bot, config, fm, usage, "image", "resize_50", lambda i, o: img.resize(i, o, 50))
+    async def h2(cb): await _do(cb, bot, config, fm, usage, "image", "resize_50", img.resize, 50)
     @rt.callback_query(F.data == "img_r25")
-    async def h3(cb): await _do(cb, bot, config, fm, usage, "image", "resize_25", lambda i, o: img.resize(i, o, 25))
+    async def h3(cb): await _do(cb, bot, config, fm, usage, "image", "resize_25", img.resize, 25)
     @rt.callback_query(F.data == "img_png")
-    async def h4(cb): await _do(cb, bot, config, fm, usage, "image", "to_png", lambda i, o: img.convert(i, o, "PNG"), out_ext=".png")
+    async def h4(cb): await _do(cb, bot, config, fm, usage, "image", "to_png", img.convert, "PNG", out_ext=".png")
     @rt.callback_query(F.data == "img_jpg")
-    async def h5(cb): await _do(cb, bot, config, fm, usage, "image", "to_jpg", lambda i, o: img.convert(i, o, "JPEG"), out_ext=".jpg")
+    async def h5(cb): await _do(cb, bot, config, fm, usage, "image", "to_jpg", img.convert, "JPEG", out_ext=".jpg")
     @rt.callback_query(F.data == "img_webp")
-    async def h6(cb): await _do(cb, bot, config, fm, usage, "image", "to_webp", lambda i, o: img.convert(i, o, "WEBP"), out_ext=".webp")
+    async def h6(cb): await _do(cb, bot, config, fm, usage, "image", "to_webp", img.convert, "WEBP", out_ext=".webp")
 
     @rt.callback_query(F.data == "img_rcustom")
     async def h_rc(cb: CallbackQuery):
@@ -296,43 +383,56 @@ def register_file_handlers(rt, config, fm, usage, bot):
     @rt.callback_query(F.data == "img_comp_high")
     async def hch(cb): await _do_compress(cb, bot, config, fm, usage, img, "high")
 
+    @rt.callback_query(F.data == "img_comp_target")
+    async def hct(cb: CallbackQuery):
+        uid = cb.from_user.id
+        data = _pending.get(uid)
+        if not data:
+            await cb.answer("❌ No file pending.", show_alert=True)
+            return
+        _waiting_target[uid] = data
+        await cb.message.edit_text("🎯 Send the target size:\n\n• 200KB\n• 1.5MB")
+        await cb.answer()
+
     @rt.callback_query(F.data == "img_gray")
-    async def hg(cb): await _do(cb, bot, config, fm, usage, "image", "grayscale", lambda i, o: img.grayscale(i, o))
+    async def hg(cb): await _do(cb, bot, config, fm, usage, "image", "grayscale", img.grayscale)
     @rt.callback_query(F.data == "img_info")
     async def hi(cb): await _do_img_info(cb, bot, fm, usage, img)
 
     @rt.callback_query(F.data == "img_blur_light")
-    async def hbl(cb): await _do(cb, bot, config, fm, usage, "image", "blur_light", lambda i, o: img.blur(i, o, "light"))
+    async def hbl(cb): await _do(cb, bot, config, fm, usage, "image", "blur_light", img.blur, "light", config.job_memory_mb)
     @rt.callback_query(F.data == "img_blur_med")
-    async def hbm(cb): await _do(cb, bot, config, fm, usage, "image", "blur_medium", lambda i, o: img.blur(i, o, "medium"))
+    async def hbm(cb): await _do(cb, bot, config, fm, usage, "image", "blur_medium", img.blur, "medium", config.job_memory_mb)
     @rt.callback_query(F.data == "img_blur_heavy")
-    async def hbh(cb): await _do(cb, bot, config, fm, usage, "image", "blur_heavy", lambda i, o: img.blur(i, o, "heavy"))
+    async def hbh(cb): await _do(cb, bot, config, fm, usage, "image", "blur_heavy", img.blur, "heavy", config.job_memory_mb)
 
     @rt.callback_query(F.data == "img_up2")
-    async def hu2(cb): await _do(cb, bot, config, fm, usage, "image", "upscale_2x", lambda i, o: img.upscale(i, o, 2))
+    async def hu2(cb): await _do(cb, bot, config, fm, usage, "image", "upscale_2x", img.upscale, 2, config.job_memory_mb)
     @rt.callback_query(F.data == "img_up4")
-    async def hu4(cb): await _do(cb, bot, config, fm, usage, "image", "upscale_4x", lambda i, o: img.upscale(i, o, 4))
+    async def hu4(cb): await _do(cb, bot, config, fm, usage, "image", "upscale_4x", img.upscale, 4, config.job_memory_mb)
 
     @rt.callback_query(F.data == "img_pdf")
-    async def hipdf(cb): await _do(cb, bot, config, fm, usage, "image", "to_pdf", lambda i, o: img.to_pdf(i, o), out_ext=".pdf")
+    async def hipdf(cb): await _do(cb, bot, config, fm, usage, "image", "to_pdf", img.to_pdf, out_ext=".pdf")
     @rt.callback_query(F.data == "img_screenshot")
-    async def hss(cb): await _do(cb, bot, config, fm, usage, "image", "clean_screenshot", lambda i, o: img.clean_screenshot(i, o))
+    async def hss(cb): await _do(cb, bot, config, fm, usage, "image", "clean_screenshot", img.clean_screenshot)
 
     @rt.callback_query(F.data == "img_id_passport")
-    async def hidp(cb): await _do(cb, bot, config, fm, usage, "image", "id_passport", lambda i, o: img.id_photo(i, o, "passport"), out_ext=".jpg")
+    async def hidp(cb): await _do(cb, bot, config, fm, usage, "image", "id_passport", img.id_photo, "passport", out_ext=".jpg")
     @rt.callback_query(F.data == "img_id_visa")
-    async def hidv(cb): await _do(cb, bot, config, fm, usage, "image", "id_visa", lambda i, o: img.id_photo(i, o, "visa"), out_ext=".jpg")
+    async def hidv(cb): await _do(cb, bot, config, fm, usage, "image", "id_visa", img.id_photo, "visa", out_ext=".jpg")
     @rt.callback_query(F.data == "img_id_stamp")
-    async def hids(cb): await _do(cb, bot, config, fm, usage, "image", "id_stamp", lambda i, o: img.id_photo(i, o, "stamp"), out_ext=".jpg")
+    async def hids(cb): await _do(cb, bot, config, fm, usage, "image", "id_stamp", img.id_photo, "stamp", out_ext=".jpg")
 
     # ══════════════════════════════════════
     # PDF HANDLERS
     # ══════════════════════════════════════
 
     @rt.callback_query(F.data == "pdf_meta")
-    async def p1(cb): await _do(cb, bot, config, fm, usage, "pdf", "remove_metadata", lambda i, o: pdf.remove_metadata(i, o), out_ext=".pdf")
+    async def p1(cb): await _do(cb, bot, config, fm, usage, "pdf", "remove_metadata", pdf.remove_metadata, out_ext=".pdf")
     @rt.callback_query(F.data == "pdf_text")
-    async def p2(cb): await _do_text(cb, bot, fm, usage, "pdf", "extract_text", lambda i: pdf.extract_text(i), in_ext=".pdf")
+    async def p2(cb): await _do_pdf_text(cb, bot, fm, usage, pdf, "fast")
+    @rt.callback_query(F.data == "pdf_text_layout")
+    async def p2l(cb): await _do_pdf_text(cb, bot, fm, usage, pdf, "layout")
     @rt.callback_query(F.data == "pdf_imgs")
     async def p3(cb): await _do_multi(cb, bot, fm, usage, pdf)
     @rt.callback_query(F.data == "pdf_split")
@@ -340,13 +440,35 @@ def register_file_handlers(rt, config, fm, usage, bot):
     @rt.callback_query(F.data == "pdf_info")
     async def p5(cb): await _do_pdf_info(cb, bot, fm, usage, pdf)
     @rt.callback_query(F.data == "pdf_compress")
-    async def p6(cb): await _do_pdf_compress(cb, bot, fm, usage, pdf)
+    async def p6(cb: CallbackQuery):
+        if not _pending.get(cb.from_user.id):
+            await cb.answer("❌ No file pending.", show_alert=True)
+            return
+        await cb.message.edit_text(
+            "🗜 Compress PDF\n\n⚡ Fast — images to 150 DPI, light JPEG\n"
+            "⚖️ Balanced — images to 150 DPI, smaller JPEG\n"
+            "🗜 Max — images to 100 DPI, JPEG 2000 (slowest)",
+            reply_markup=_compress_keyboard())
+        await cb.answer()
+    @rt.callback_query(F.data.startswith("pdf_comp:"))
+    async def p6_go(cb: CallbackQuery):
+        _, profile, linear = cb.data.split(":")
+        await _do_pdf_compress(cb, bot, fm, usage, pdf, profile, linear == "1")
     @rt.callback_query(F.data == "pdf_to_img")
-    async def p7(cb): await _do_pdf_to_images(cb, bot, fm, usage, pdf)
+    async def p7(cb: CallbackQuery):
+        if not _pending.get(cb.from_user.id):
+            await cb.answer("❌ No file pending.", show_alert=True)
+            return
+        await cb.message.edit_text("🖼 PDF → Images\n\nChoose format and quality:", reply_markup=_render_keyboard())
+        await cb.answer()
+    @rt.callback_query(F.data.startswith("pdf_img:"))
+    async def p7_go(cb: CallbackQuery):
+        _, fmt, dpi, gray = cb.data.split(":")
+        await _do_pdf_to_images(cb, bot, fm, usage, pdf, fmt, int(dpi), gray == "1")
     @rt.callback_query(F.data == "pdf_rot90")
-    async def p8a(cb): await _do(cb, bot, config, fm, usage, "pdf", "rotate_90", lambda i, o: pdf.rotate_pages(i, o, 90), out_ext=".pdf")
+    async def p8a(cb): await _do(cb, bot, config, fm, usage, "pdf", "rotate_90", pdf.rotate_pages, 90, out_ext=".pdf")
     @rt.callback_query(F.data == "pdf_rot180")
-    async def p8b(cb): await _do(cb, bot, config, fm, usage, "pdf", "rotate_180", lambda i, o: pdf.rotate_pages(i, o, 180), out_ext=".pdf")
+    async def p8b(cb): await _do(cb, bot, config, fm, usage, "pdf", "rotate_180", pdf.rotate_pages, 180, out_ext=".pdf")
 
     @rt.callback_query(F.data == "pdf_extract_pages")
     async def p9(cb: CallbackQuery):
@@ -388,57 +510,85 @@ def register_file_handlers(rt, config, fm, usage, bot):
         if not data:
             await cb.answer("❌ No file pending.", show_alert=True)
             return
-        path = fm.temp_path(".pdf")
-        tg_file = await bot.get_file(data["file_id"])
-        await bot.download_file(tg_file.file_path, destination=str(path))
-        _merge_queue[uid] = {"files": [path]}
+        path = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".pdf")
+        _drop_merge(fm, uid)
+        _merge_queue[uid] = {"files": [], "plan": None}
+        _queue_merge(uid, path, data["file_name"], cb.message.answer)
         _pending.pop(uid, None)
         await cb.message.edit_text(
             "📎 Merge PDFs\n━━━━━━━━━━━━━━━━━━━━━\nPDF #1 added!\n\nSend more PDFs, click Done when ready.",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="✅ Merge 1 PDF", callback_data="pdf_merge_done")],
-                [InlineKeyboardButton(text="❌ Cancel", callback_data="pdf_merge_cancel")],
-            ]),
+            reply_markup=_merge_keyboard(1),
         )
         await cb.answer()
 
+    @rt.callback_query(F.data == "pdf_merge_plan")
+    async def p12_plan(cb: CallbackQuery):
+        uid = cb.from_user.id
+        merge = _merge_queue.get(uid)
+        if not merge:
+            await cb.answer("❌ No merge in progress.", show_alert=True)
+            return
+        await asyncio.gather(*(e["task"] for e in merge["files"]))
+        lines = "\n".join(
+            f"{i}. {e['name']} — " + (f"⚠️ {e['error']}" if e.get("error") else f"{e['pages']} pages")
+            for i, e in enumerate(merge["files"], 1))
+        _waiting_merge_plan[uid] = True
+        await cb.message.edit_text(
+            f"🔀 Order & pages\n━━━━━━━━━━━━━━━━━━━━━\n{lines}\n\n"
+            "Send the files in the order you want, with optional pages:\n"
+            "'2 1:1-3 3' → all of #2, pages 1-3 of #1, all of #3\n"
+            "'1:1-2,5 2' → pages 1-2 and 5 of #1, then #2")
+        await cb.answer()
+
     @rt.callback_query(F.data == "pdf_merge_done")
     async def p12_done(cb: CallbackQuery):
         uid = cb.from_user.id
-        if uid not in _merge_queue:
+        merge = _merge_queue.get(uid)
+        if not merge:
             await cb.answer("❌ No merge in progress.", show_alert=True)
             return
-        files = _merge_queue[uid]["files"]
-        if len(files) < 2:
+        if not merge["plan"] and len(merge["files"]) < 2:
             await cb.answer("❌ Need at least 2 PDFs.", show_alert=True)
             return
-        await cb.answer("⏳ Merging...")
-        await cb.message.edit_text(f"⏳ Merging {len(files)} PDFs...")
+        if not (day := await _admit(uid)):
+            await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+            return
+        _merge_queue.pop(uid, None)
+        _waiting_merge_plan.pop(uid, None)
+        entries = merge["files"]
         out = None
         try:
-            async with _semaphore:
-                timer = Timer()
-                out = fm.temp_path(".pdf")
-                with timer: await pdf.merge(files, out)
-                result = FSInputFile(path=str(out), filename="merged.pdf")
-                await bot.send_document(chat_id=cb.message.chat.id, document=result,
-                    caption=f"✅ Merged {len(files)} PDFs ({timer.elapsed_ms}ms)")
-                await usage.log(uid, "pdf", "merge", 0, "success", "", timer.elapsed_ms)
-                await cb.message.edit_text(f"✅ Merged {len(files)} PDFs! ({timer.elapsed_ms}ms)")
+            await cb.answer("⏳ Merging...")
+            timer = Timer()
+            # Usually finished long ago; Done only waits for stragglers.
+            await asyncio.gather(*(e["task"] for e in entries))
+            plan = merge["plan"] or [(i, None) for i, e in enumerate(entries) if not e.get("error")]
+            bad = [entries[i]["name"] for i, _ in plan if entries[i].get("error")]
+            if bad:
+                raise Exception(f"Can't merge {', '.join(bad)}")
+            if not merge["plan"] and len(plan) < 2:
+                raise Exception("Need at least 2 valid PDFs")
+            await cb.message.edit_text(f"⏳ Merging {len(plan)} PDFs...")
+            paths = [entries[i]["path"] for i, _ in plan]
+            out = fm.temp_path(".pdf")
+            async with _scheduler.slot("pdf", "merge", sum(p.stat().st_size for p in set(paths))):
+                with timer: await _pool.run(pdf.merge, paths, out, [r for _, r in plan])
+            result = FSInputFile(path=str(out), filename="merged.pdf")
+            await bot.send_document(chat_id=cb.message.chat.id, document=result,
+                caption=f"✅ Merged {len(plan)} PDFs ({timer.elapsed_ms}ms)")
+            await usage.log(uid, "pdf", "merge", 0, "success", "", timer.elapsed_ms)
+            await cb.message.edit_text(f"✅ Merged {len(plan)} PDFs! ({timer.elapsed_ms}ms)")
         except Exception as e:
+            await _release(uid, day)
             logger.error(f"Merge error: {e}", exc_info=True)
             await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
         finally:
-            for f in files: fm.cleanup(f)
+            for e in entries: fm.cleanup(e["path"])
             if out: fm.cleanup(out)
-            _merge_queue.pop(uid, None)
 
     @rt.callback_query(F.data == "pdf_merge_cancel")
     async def p12_cancel(cb: CallbackQuery):
-        uid = cb.from_user.id
-        if uid in _merge_queue:
-            for f in _merge_queue[uid].get("files", []): fm.cleanup(f)
-            _merge_queue.pop(uid, None)
+        _drop_merge(fm, cb.from_user.id)
         await cb.message.edit_text("❌ Merge cancelled.")
         await cb.answer()
 
@@ -447,13 +597,13 @@ def register_file_handlers(rt, config, fm, usage, bot):
     # ══════════════════════════════════════
 
     @rt.callback_query(F.data == "docx_meta")
-    async def d1(cb): await _do(cb, bot, config, fm, usage, "docx", "remove_metadata", lambda i, o: docx.remove_metadata(i, o), out_ext=".docx")
+    async def d1(cb): await _do(cb, bot, config, fm, usage, "docx", "remove_metadata", docx.remove_metadata, out_ext=".docx")
     @rt.callback_query(F.data == "docx_comments")
-    async def d2(cb): await _do(cb, bot, config, fm, usage, "docx", "remove_comments", lambda i, o: docx.remove_comments(i, o), out_ext=".docx")
+    async def d2(cb): await _do(cb, bot, config, fm, usage, "docx", "remove_comments", docx.remove_comments, out_ext=".docx")
     @rt.callback_query(F.data == "docx_text")
-    async def d3(cb): await _do_text(cb, bot, fm, usage, "docx", "extract_text", lambda i: docx.extract_text(i), in_ext=".docx")
+    async def d3(cb): await _do_text(cb, bot, fm, usage, "docx", "extract_text", docx.extract_text, in_ext=".docx")
     @rt.callback_query(F.data == "docx_to_pdf")
-    async def d4(cb): await _do(cb, bot, config, fm, usage, "docx", "to_pdf", lambda i, o: docx.to_pdf(i, o), out_ext=".pdf")
+    async def d4(cb): await _do(cb, bot, config, fm, usage, "docx", "to_pdf", _office.convert, out_ext=".pdf")
     @rt.callback_query(F.data == "docx_info")
     async def d5(cb): await _do_docx_info(cb, bot, fm, usage, docx)
     @rt.callback_query(F.data == "docx_wordcount")
@@ -468,31 +618,346 @@ def register_file_handlers(rt, config, fm, usage, bot):
 # CORE PROCESSING FUNCTIONS
 # ══════════════════════════════════════════════
 
-async def _do(cb, bot, config, fm, usage, ftype, tool, process_fn, out_ext=""):
+def _in_memory(data):
+    return data.get("category") == "image" and 0 < data["file_size"] <= _memory_max
+
+
+def _progress(message, total):
+    """Download progress shown by editing `message`; None for small files."""
+    if not total or total < PROGRESS_MIN_BYTES:
+        return None
+    last = 0.0
+
+    async def update(done):
+        nonlocal last
+        if time.monotonic() - last < 2:
+            return
+        last = time.monotonic()
+        try:
+            await message.edit_text(f"⬇️ Downloading... {min(100, done * 100 // total)}%")
+        except Exception:
+            pass
+    return update
+
+
+async def _fetch_input(fm, bot, data, ext, progress=None):
+    """Small images come back as bytes, everything else as a temp path.
+
+    The second value is the temp path to clean up, or None for bytes.
+    """
+    if _in_memory(data):
+        return await fm.download_bytes(bot, data["file_id"], data.get("file_unique_id"), progress), None
+    path = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ext, progress)
+    return path, path
+
+
+def _document(result, out, filename):
+    if out is None:
+        return BufferedInputFile(result, filename=filename)
+    return FSInputFile(path=str(out), filename=filename)
+
+
+async def _shards(fn, inp, out_dir, pages, category, tool, file_size, *args):
+    """Run `fn(inp, out_dir, first, last, *args)` over page shards in the pool.
+
+    Yields output paths in page order as soon as each shard is done. At
+    most `_pool.size` shards of a job are in flight, each holding a
+    scheduler slot only while it runs, so uploading early pages overlaps
+    with rendering later ones without one job flooding the scheduler. The
+    first shard is a single page to get something to the user quickly.
+    """
+    step = max(1, min(8, pages // (_pool.size * 4)))
+    bounds = [(0, min(1, pages))] + [(a, min(a + step, pages)) for a in range(1, pages, step)]
+    bounds = iter([(a, b) for a, b in bounds if b > a])
+
+    async def run(first, last):
+        async with _scheduler.slot(category, tool, file_size):
+            return await _pool.run(fn, inp, out_dir, first, last, *args)
+
+    jobs = deque(asyncio.ensure_future(run(a, b)) for a, b in islice(bounds, _pool.size))
+    try:
+        while jobs:
+            paths = await jobs.popleft()
+            for a, b in islice(bounds, 1):
+                jobs.append(asyncio.ensure_future(run(a, b)))
+            for path in paths:
+                yield path
+    finally:
+        for job in jobs:
+            job.cancel()
+
+
+async def _probe(fm, data, inp):
+    """PDFService.probe() of a downloaded PDF, shared by every tool that
+    needs page counts or structure and cached by content hash.
+
+    A miss takes its own scheduler slot, so callers must not hold one.
+    """
+    key = await fm.content_hash(inp, data.get("file_unique_id"))
+    info = _probes.get(key)
+    if info is None:
+        async with _scheduler.slot("pdf", "info", data["file_size"]):
+            info = await _pool.run(PDFService.probe, inp)
+        _probes[key] = info
+        if len(_probes) > PROBE_CACHE_SIZE:
+            _probes.popitem(last=False)
+    else:
+        _probes.move_to_end(key)
+    return info
+
+
+def _merge_keyboard(count):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"✅ Merge {count} PDF{'s' if count > 1 else ''}",
+                              callback_data="pdf_merge_done")],
+        [InlineKeyboardButton(text="🔀 Order & pages", callback_data="pdf_merge_plan")],
+        [InlineKeyboardButton(text="❌ Cancel", callback_data="pdf_merge_cancel")],
+    ])
+
+
+def _queue_merge(uid, path, name, notify):
+    """Add a downloaded PDF to the user's merge and start validating and
+    pre-parsing it in the pool, so Done only pays for the final write."""
+    entry = {"path": path, "name": name, "pages": 0}
+    _merge_queue[uid]["files"].append(entry)
+    _merge_queue[uid]["plan"] = None
+    entry["task"] = asyncio.create_task(_prepare_merge(entry, len(_merge_queue[uid]["files"]), notify))
+    return len(_merge_queue[uid]["files"])
+
+
+async def _prepare_merge(entry, number, notify):
+    try:
+        async with _scheduler.slot("pdf", "merge_prepare", entry["path"].stat().st_size):
+            entry["pages"] = await _pool.run(PDFService.prepare_merge, entry["path"])
+    except Exception as e:
+        entry["error"] = str(e)[:100]
+        try:
+            await notify(f"⚠️ PDF #{number} ({entry['name']}) will be skipped: {entry['error']}")
+        except Exception:
+            pass
+
+
+def _drop_merge(fm, uid):
+    _waiting_merge_plan.pop(uid, None)
+    merge = _merge_queue.pop(uid, None)
+    for e in merge["files"] if merge else []:
+        e["task"].cancel()
+        fm.cleanup(e["path"])
+
+
+async def _parse_merge_plan(entries, text):
+    """Parse '2 1:1-3,5 3' into [(file index, [(first, last), ...] or None)]
+    with 0-based inclusive page ranges."""
+    await asyncio.gather(*(e["task"] for e in entries))
+    plan = []
+    for item in text.split():
+        num, _, spec = item.partition(":")
+        if not num.isdigit() or not 1 <= int(num) <= len(entries):
+            raise ValueError(f"'{num}' is not a file number (1-{len(entries)})")
+        entry = entries[int(num) - 1]
+        if entry.get("error"):
+            raise ValueError(f"PDF #{num} can't be merged: {entry['error']}")
+        ranges = None
+        if spec:
+            ranges = []
+            for part in spec.split(","):
+                a, _, b = part.partition("-")
+                if not a.isdigit() or (b and not b.isdigit()):
+                    raise ValueError(f"Bad pages '{part}' for PDF #{num}")
+                first, last = int(a), int(b or a)
+                if not 1 <= first <= last <= entry["pages"]:
+                    raise ValueError(f"PDF #{num} has pages 1-{entry['pages']}")
+                ranges.append((first - 1, last - 1))
+        plan.append((int(num) - 1, ranges))
+    if not plan:
+        raise ValueError("Nothing to merge")
+    return plan
+
+
+def _describe_merge_plan(merge):
+    lines = []
+    for i, ranges in merge["plan"]:
+        pages = ", ".join(f"{a + 1}-{b + 1}" if b > a else f"{a + 1}" for a, b in ranges) if ranges else "all"
+        lines.append(f"#{i + 1} {merge['files'][i]['name']} — pages {pages}")
+    return "\n".join(lines)
+
+
+def _member(item):
+    """(name, source) for a produced output: a path or (name, bytes)."""
+    return item if isinstance(item, tuple) else (item.name, item)
+
+
+def _failed(failed):
+    return f", {failed} failed" if failed else ""
+
+
+async def _iterate(items):
+    for item in items:
+        yield item
+
+
+async def _send_stream(bot, chat_id, fm, items, total, zip_stem, outputs):
+    """Send outputs from the async iterator `items` while more are produced.
+
+    Items are paths or (name, bytes). Up to 10 go out as documents: the
+    first as soon as it is produced, then each time a send returns, the
+    ones that arrived meanwhile as one media group. More are streamed into
+    ZIP parts of at most ZIP_PART_FILES members, each sent as soon as it
+    is full or would pass the upload limit. Returns (delivered, failed)
+    file counts.
+    """
+    if total <= 10:
+        sent, failed = await _send_grouped(chat_id, items, outputs)
+    else:
+        sent, failed = await _send_zipped(chat_id, fm, items, total, zip_stem, outputs)
+    if failed and not sent:
+        raise Exception(f"None of {failed} file(s) could be delivered")
+    return sent, failed
+
+
+async def _send_grouped(chat_id, items, outputs):
+    ready = []
+    arrived = asyncio.Event()
+
+    async def collect():
+        try:
+            async for item in items:
+                ready.append((as_document(item), None))
+                arrived.set()
+        finally:
+            arrived.set()
+
+    collector = asyncio.ensure_future(collect())
+    sent = failed = 0
+    try:
+        while ready or not collector.done():
+            if not ready:
+                await arrived.wait()
+                arrived.clear()
+                continue
+            batch = ready[:1] if not sent + failed else ready[:]
+            del ready[:len(batch)]
+            report = await _delivery.send(chat_id, batch)
+            outputs.extend(report.messages)
+            sent, failed = sent + report.delivered, failed + report.failed
+        await collector
+    finally:
+        collector.cancel()
+    return sent, failed
+
+
+async def _send_zipped(chat_id, fm, items, total, zip_stem, outputs):
+    packer = ZipPackager(fm)
+    sent = failed = 0
+
+    async def send_part(done):
+        nonlocal sent, failed
+        zip_path, count = done
+        try:
+            whole = packer.parts == 1 and sent + failed + count == total
+            name = f"{zip_stem}.zip" if whole else f"{zip_stem}_part{packer.parts}.zip"
+            caption = f"📦 {count} files" + ("" if whole else f" (part {packer.parts})")
+            outputs.append(await _delivery.send_one(chat_id,
+                FSInputFile(path=str(zip_path), filename=name), caption))
+            sent += count
+        except Exception as e:
+            logger.warning(f"ZIP part {packer.parts} to {chat_id} failed: {e}")
+            failed += count
+        finally:
+            fm.cleanup(zip_path)
+
+    try:
+        async for item in items:
+            name, src = _member(item)
+            try:
+                done = await packer.add(name, src)
+            finally:
+                if isinstance(src, Path): fm.cleanup(src)
+            if done:
+                await send_part(done)
+            if packer.count == ZIP_PART_FILES:
+                await send_part(await packer.close())
+        done = await packer.close()
+        if done:
+            await send_part(done)
+    finally:
+        packer.discard()
+    return sent, failed
+
+
+async def _admit(uid):
+    """Reserve one job of the user's daily quota before any work starts.
+
+    Returns the day the job was counted on, which `_release` refunds, or
+    None if the limit is reached.
+    """
+    return True if uid == _admin_id else await _usage.reserve(uid)
+
+
+async def _release(uid, day):
+    if uid != _admin_id:
+        await _usage.release(uid, day)
+
+
+async def _replay(bot, usage, chat_id, uid, ftype, tool, data, params=""):
+    """Re-send the outputs of an identical earlier job, if they are cached."""
+    if not _results.enabled(tool) or not data.get("file_unique_id"):
+        return False
+    outputs = await _results.get(data["file_unique_id"], tool, params)
+    if not outputs:
+        return False
+    report = await _delivery.send(chat_id, [(o["file_id"], o.get("caption")) for o in outputs])
+    if not report.delivered:
+        # Stale file_ids: run the job again instead.
+        return False
+    await usage.log(uid, ftype, tool, data["file_size"], "success",
+                    delivered=report.delivered, failed=report.failed)
+    return True
+
+
+async def _remember(data, tool, sent, params=""):
+    if not _results.enabled(tool) or not data.get("file_unique_id"):
+        return
+    outputs = [{"file_id": m.document.file_id, "caption": m.caption} for m in sent if m and m.document]
+    if outputs:
+        await _results.put(data["file_unique_id"], tool, params, outputs)
+
+
+async def _do(cb, bot, config, fm, usage, ftype, tool, process_fn, *args, out_ext=""):
     uid = cb.from_user.id
     data = _pending.get(uid)
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("⏳")
-    await cb.message.edit_text(f"⏳ {tool}...")
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
     inp = out = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            name = data["file_name"]
-            in_ext = Path(name).suffix if name else ".jpg"
-            if not out_ext: out_ext = in_ext
-            inp = fm.temp_path(in_ext)
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out = fm.temp_path(out_ext)
-            with timer: await process_fn(inp, out)
-            doc = FSInputFile(path=str(out), filename=f"{Path(name).stem}_{tool}{out_ext}")
-            await bot.send_document(chat_id=cb.message.chat.id, document=doc, caption=f"✅ {tool} ({timer.elapsed_ms}ms)")
-            await usage.log(uid, ftype, tool, data["file_size"], "success", "", timer.elapsed_ms)
-            await cb.message.edit_text(f"✅ {tool} done! ({timer.elapsed_ms}ms)")
+        await cb.answer("⏳")
+        await cb.message.edit_text(f"⏳ {tool}...")
+        if await _replay(bot, usage, cb.message.chat.id, uid, ftype, tool, data, ",".join(map(str, args))):
+            await cb.message.edit_text(f"✅ {tool} done! (cached)")
+            return
+        outputs = []
+        timer = Timer()
+        name = data["file_name"]
+        in_ext = Path(name).suffix if name else ".jpg"
+        if not out_ext: out_ext = in_ext
+        src, inp = await _fetch_input(fm, bot, data, in_ext,
+            _progress(cb.message, data["file_size"]))
+        out = fm.temp_path(out_ext) if inp else None
+        async with _scheduler.slot(ftype, tool, data["file_size"]):
+            with timer:
+                if asyncio.iscoroutinefunction(process_fn): result = await process_fn(src, out, *args)
+                else: result = await _pool.run(process_fn, src, out, *args)
+        doc = _document(result, out, f"{Path(name).stem}_{tool}{out_ext}")
+        outputs.append(await bot.send_document(chat_id=cb.message.chat.id, document=doc, caption=f"✅ {tool} ({timer.elapsed_ms}ms)"))
+        await _remember(data, tool, outputs, ",".join(map(str, args)))
+        await usage.log(uid, ftype, tool, data["file_size"], "success", "", timer.elapsed_ms)
+        await cb.message.edit_text(f"✅ {tool} done! ({timer.elapsed_ms}ms)")
     except Exception as e:
+        await _release(uid, day)
         logger.error(f"Error ({tool}): {e}", exc_info=True)
         await usage.log(uid, ftype, tool, data.get("file_size", 0), "failure", str(e)[:200])
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
@@ -508,24 +973,32 @@ async def _do_compress(cb, bot, config, fm, usage, img_svc, level):
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("⏳")
-    await cb.message.edit_text(f"⏳ Compressing ({level})...")
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
     inp = out = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            name = data["file_name"]
-            inp = fm.temp_path(Path(name).suffix if name else ".jpg")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out = fm.temp_path(".jpg")
-            with timer: _, orig, new, saved = await img_svc.compress(inp, out, level)
-            doc = FSInputFile(path=str(out), filename=f"{Path(name).stem}_compressed.jpg")
-            await bot.send_document(chat_id=cb.message.chat.id, document=doc,
-                caption=f"✅ Compressed ({level})\n📦 {format_size(orig)} → {format_size(new)}\n💾 Saved: {saved}%")
-            await usage.log(uid, "image", f"compress_{level}", data["file_size"], "success", "", timer.elapsed_ms)
-            await cb.message.edit_text(f"✅ Compressed! Saved {saved}%")
+        await cb.answer("⏳")
+        await cb.message.edit_text(f"⏳ Compressing ({level})...")
+        if await _replay(bot, usage, cb.message.chat.id, uid, "image", f"compress_{level}", data, ""):
+            await cb.message.edit_text("✅ Compressed! (cached)")
+            return
+        outputs = []
+        timer = Timer()
+        name = data["file_name"]
+        src, inp = await _fetch_input(fm, bot, data, Path(name).suffix if name else ".jpg",
+            _progress(cb.message, data["file_size"]))
+        out = fm.temp_path(".jpg") if inp else None
+        async with _scheduler.slot("image", f"compress_{level}", data["file_size"]):
+            with timer: result, orig, new, saved = await _pool.run(img_svc.compress, src, out, level)
+        doc = _document(result, out, f"{Path(name).stem}_compressed.jpg")
+        outputs.append(await bot.send_document(chat_id=cb.message.chat.id, document=doc,
+            caption=f"✅ Compressed ({level})\n📦 {format_size(orig)} → {format_size(new)}\n💾 Saved: {saved}%"))
+        await _remember(data, f"compress_{level}", outputs, "")
+        await usage.log(uid, "image", f"compress_{level}", data["file_size"], "success", "", timer.elapsed_ms)
+        await cb.message.edit_text(f"✅ Compressed! Saved {saved}%")
     except Exception as e:
+        await _release(uid, day)
         logger.error(f"Compress error: {e}", exc_info=True)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
@@ -534,30 +1007,82 @@ async def _do_compress(cb, bot, config, fm, usage, img_svc, level):
         _pending.pop(uid, None)
 
 
+def _parse_size(text):
+    """Bytes for '200', '200KB' or '1.5 MB' (KB when no unit), or None."""
+    text = text.strip().upper().replace(" ", "")
+    unit = 1024
+    for suffix, mult in (("MB", 1024 * 1024), ("M", 1024 * 1024), ("KB", 1024), ("K", 1024)):
+        if text.endswith(suffix):
+            text, unit = text[:-len(suffix)], mult
+            break
+    try:
+        return int(float(text) * unit)
+    except ValueError:
+        return None
+
+
+async def _do_compress_target(message, bot, fm, usage, data, target):
+    uid = message.from_user.id
+    if not (day := await _admit(uid)):
+        await message.reply("Daily limit reached. Try tomorrow.")
+        return
+    inp = out = None
+    try:
+        if await _replay(bot, usage, message.chat.id, uid, "image", "compress_to", data, str(target)):
+            return
+        outputs = []
+        timer = Timer()
+        img_svc = ImageService()
+        name = data["file_name"]
+        src, inp = await _fetch_input(fm, bot, data, Path(name).suffix if name else ".jpg")
+        out = fm.temp_path(".jpg") if inp else None
+        async with _scheduler.slot("image", "compress_to", data["file_size"]):
+            with timer:
+                result, orig, new, saved, stats = await _pool.run(img_svc.compress_to_size, src, out, target)
+        doc = _document(result, out, f"{Path(name).stem}_{target // 1024}kb.jpg")
+        outputs.append(await bot.send_document(chat_id=message.chat.id, document=doc,
+            caption=f"✅ Compressed to ≤ {format_size(target)}\n📦 {format_size(orig)} → {format_size(new)}\n"
+                    f"🎚 Quality {stats['quality']}, {stats['width']}x{stats['height']}\n"
+                    f"🔁 {stats['proxy_encodes']} proxy + {stats['full_encodes']} full encodes, {stats['ms']}ms"))
+        await _remember(data, "compress_to", outputs, str(target))
+        await usage.log(uid, "image", "compress_to", data["file_size"], "success", "", timer.elapsed_ms)
+    except Exception as e:
+        await _release(uid, day)
+        logger.error(f"Target compress error: {e}", exc_info=True)
+        await message.reply(f"❌ Error: {str(e)[:200]}")
+    finally:
+        if inp: fm.cleanup(inp)
+        if out: fm.cleanup(out)
+        _pending.pop(uid, None)
+
+
 async def _do_img_info(cb, bot, fm, usage, img_svc):
     uid = cb.from_user.id
     data = _pending.get(uid)
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("🔍")
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
     inp = None
     try:
-        async with _semaphore:
-            name = data["file_name"]
-            inp = fm.temp_path(Path(name).suffix if name else ".jpg")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            info = await img_svc.get_info(inp)
-            gps = "⚠️ YES!" if info["has_gps"] else "✅ No"
-            await cb.message.edit_text(
-                f"📏 Image Info\n━━━━━━━━━━━━━━━━━━━━━\n"
-                f"📄 {name}\n🖼 {info['format']}\n📐 {info['width']}x{info['height']}\n"
-                f"📊 {info['megapixels']}MP\n📦 {format_size(info['size_bytes'])}\n"
-                f"🎨 {info['mode']}\n📏 DPI: {info['dpi']}\n📷 {info['camera']}\n"
-                f"🏷 EXIF: {info['exif_fields']} fields\n📍 GPS: {gps}")
-            await usage.log(uid, "image", "info", data["file_size"], "success")
+        await cb.answer("🔍")
+        name = data["file_name"]
+        src, inp = await _fetch_input(fm, bot, data, Path(name).suffix if name else ".jpg",
+            _progress(cb.message, data["file_size"]))
+        async with _scheduler.slot("image", "info", data["file_size"]):
+            info = await _pool.run(img_svc.get_info, src)
+        gps = "⚠️ YES!" if info["has_gps"] else "✅ No"
+        await cb.message.edit_text(
+            f"📏 Image Info\n━━━━━━━━━━━━━━━━━━━━━\n"
+            f"📄 {name}\n🖼 {info['format']}\n📐 {info['width']}x{info['height']}\n"
+            f"📊 {info['megapixels']}MP\n📦 {format_size(info['size_bytes'])}\n"
+            f"🎨 {info['mode']}\n📏 DPI: {info['dpi']}\n📷 {info['camera']}\n"
+            f"🏷 EXIF: {info['exif_fields']} fields\n📍 GPS: {gps}")
+        await usage.log(uid, "image", "info", data["file_size"], "success")
     except Exception as e:
+        await _release(uid, day)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
@@ -570,26 +1095,34 @@ async def _do_text(cb, bot, fm, usage, ftype, tool, extract_fn, in_ext=""):
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("⏳")
-    await cb.message.edit_text("⏳ Extracting text...")
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
     inp = txt_out = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            inp = fm.temp_path(in_ext)
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            with timer: text = await extract_fn(inp)
-            if len(text) <= 4000:
-                await bot.send_message(chat_id=cb.message.chat.id, text=f"📝 Extracted:\n\n{text[:3900]}")
-            else:
-                txt_out = fm.temp_path(".txt")
-                with open(txt_out, "w", encoding="utf-8") as f: f.write(text)
-                result = FSInputFile(path=str(txt_out), filename=f"{Path(data['file_name']).stem}_text.txt")
-                await bot.send_document(chat_id=cb.message.chat.id, document=result, caption=f"📝 {len(text)} chars")
-            await usage.log(uid, ftype, tool, data["file_size"], "success", "", timer.elapsed_ms)
-            await cb.message.edit_text(f"✅ Extracted ({timer.elapsed_ms}ms)")
+        await cb.answer("⏳")
+        await cb.message.edit_text("⏳ Extracting text...")
+        if await _replay(bot, usage, cb.message.chat.id, uid, ftype, tool, data, ""):
+            await cb.message.edit_text("✅ Extracted (cached)")
+            return
+        outputs = []
+        timer = Timer()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), in_ext,
+            _progress(cb.message, data["file_size"]))
+        async with _scheduler.slot(ftype, tool, data["file_size"]):
+            with timer: text = await _pool.run(extract_fn, inp)
+        if len(text) <= 4000:
+            await bot.send_message(chat_id=cb.message.chat.id, text=f"📝 Extracted:\n\n{text[:3900]}")
+        else:
+            txt_out = fm.temp_path(".txt")
+            with open(txt_out, "w", encoding="utf-8") as f: f.write(text)
+            result = FSInputFile(path=str(txt_out), filename=f"{Path(data['file_name']).stem}_text.txt")
+            outputs.append(await bot.send_document(chat_id=cb.message.chat.id, document=result, caption=f"📝 {len(text)} chars"))
+        await _remember(data, tool, outputs, "")
+        await usage.log(uid, ftype, tool, data["file_size"], "success", "", timer.elapsed_ms)
+        await cb.message.edit_text(f"✅ Extracted ({timer.elapsed_ms}ms)")
     except Exception as e:
+        await _release(uid, day)
         logger.error(f"Extract error: {e}", exc_info=True)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
@@ -598,51 +1131,123 @@ async def _do_text(cb, bot, fm, usage, ftype, tool, extract_fn, in_ext=""):
         _pending.pop(uid, None)
 
 
+async def _do_pdf_text(cb, bot, fm, usage, pdf_svc, engine):
+    uid = cb.from_user.id
+    data = _pending.get(uid)
+    if not data:
+        await cb.answer("❌ No file pending.", show_alert=True)
+        return
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
+    inp = txt_out = None
+    jobs = []
+    try:
+        await cb.answer("⏳")
+        await cb.message.edit_text("⏳ Extracting text...")
+        if await _replay(bot, usage, cb.message.chat.id, uid, "pdf", "extract_text", data, engine):
+            await cb.message.edit_text("✅ Extracted (cached)")
+            return
+        outputs = []
+        timer = Timer()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".pdf",
+            _progress(cb.message, data["file_size"]))
+        probe = await _probe(fm, data, inp)
+        pages = probe["pages"]
+        step = max(TEXT_SHARD_PAGES[engine], -(-pages // (_pool.size * 4)))
+
+        async def run(first, last):
+            async with _scheduler.slot("pdf", "extract_text", data["file_size"]):
+                return await _pool.run(pdf_svc.extract_text_range, inp, first, last, engine)
+
+        # Up to _pool.size shards run in parallel; their text is appended
+        # in page order as each finishes, so the whole document is never
+        # held in memory.
+        txt_out = fm.temp_path(".txt")
+        chars = 0
+        with timer:
+            starts = iter(range(0, pages, step))
+            jobs = deque(asyncio.ensure_future(run(a, min(a + step, pages))) for a in islice(starts, _pool.size))
+            with open(txt_out, "w", encoding="utf-8") as f:
+                while jobs:
+                    text = await jobs.popleft()
+                    for a in islice(starts, 1):
+                        jobs.append(asyncio.ensure_future(run(a, min(a + step, pages))))
+                    if not text:
+                        continue
+                    if chars:
+                        f.write("\n\n")
+                        chars += 2
+                    f.write(text)
+                    chars += len(text)
+        if not chars:
+            hint = " It looks scanned; there is no text layer." if probe["scanned"] else ""
+            await bot.send_message(chat_id=cb.message.chat.id, text=f"📝 No extractable text found.{hint}")
+        elif chars <= 4000:
+            text = txt_out.read_text(encoding="utf-8")
+            await bot.send_message(chat_id=cb.message.chat.id, text=f"📝 Extracted:\n\n{text[:3900]}")
+        else:
+            result = FSInputFile(path=str(txt_out), filename=f"{Path(data['file_name']).stem}_text.txt")
+            outputs.append(await bot.send_document(chat_id=cb.message.chat.id, document=result,
+                caption=f"📝 {pages} pages, {chars} chars"))
+        await _remember(data, "extract_text", outputs, engine)
+        await usage.log(uid, "pdf", "extract_text", data["file_size"], "success", "", timer.elapsed_ms)
+        await cb.message.edit_text(f"✅ Extracted ({timer.elapsed_ms}ms)")
+    except Exception as e:
+        await _release(uid, day)
+        logger.error(f"Extract error: {e}", exc_info=True)
+        await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
+    finally:
+        for job in jobs: job.cancel()
+        if inp: fm.cleanup(inp)
+        if txt_out: fm.cleanup(txt_out)
+        _pending.pop(uid, None)
+
+
 async def _do_multi(cb, bot, fm, usage, pdf_svc):
     uid = cb.from_user.id
     data = _pending.get(uid)
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("⏳")
-    await cb.message.edit_text("⏳ Extracting images...")
-    inp = out_dir = zip_path = None
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
+    inp = out_dir = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            inp = fm.temp_path(".pdf")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out_dir = fm.temp_path("_imgs")
-            out_dir.mkdir(parents=True, exist_ok=True)
-            with timer: paths = await pdf_svc.extract_images(inp, out_dir)
-            if not paths:
-                await cb.message.edit_text("ℹ️ No images found.")
-            elif len(paths) <= 10:
-                sent = 0
-                for p in paths:
-                    try:
-                        f = FSInputFile(path=str(p), filename=p.name)
-                        await bot.send_document(chat_id=cb.message.chat.id, document=f)
-                        sent += 1
-                    except: pass
-                await cb.message.edit_text(f"✅ {sent} image(s) ({timer.elapsed_ms}ms)")
-            else:
-                zip_path = fm.temp_path(".zip")
-                with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-                    for p in paths: zf.write(p, p.name)
-                f = FSInputFile(path=str(zip_path), filename=f"{Path(data['file_name']).stem}_images.zip")
-                await bot.send_document(chat_id=cb.message.chat.id, document=f,
-                    caption=f"✅ {len(paths)} images (zipped) ({timer.elapsed_ms}ms)")
-                await cb.message.edit_text(f"✅ {len(paths)} images → ZIP ({timer.elapsed_ms}ms)")
-            await usage.log(uid, "pdf", "extract_images", data["file_size"], "success", "", timer.elapsed_ms)
+        await cb.answer("⏳")
+        await cb.message.edit_text("⏳ Extracting images...")
+        if await _replay(bot, usage, cb.message.chat.id, uid, "pdf", "extract_images", data, ""):
+            await cb.message.edit_text("✅ Images sent (cached)")
+            return
+        outputs = []
+        sent = failed = 0
+        timer = Timer()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".pdf",
+            _progress(cb.message, data["file_size"]))
+        out_dir = fm.temp_path("_imgs")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        probe = await _probe(fm, data, inp)
+        pages, total = probe["pages"], probe["images"]
+        if not total:
+            await cb.message.edit_text("ℹ️ No images found.")
+        else:
+            with timer:
+                items = _shards(pdf_svc.extract_images_range, inp, out_dir, pages,
+                                "pdf", "extract_images", data["file_size"])
+                sent, failed = await _send_stream(bot, cb.message.chat.id, fm, items, total,
+                                          f"{Path(data['file_name']).stem}_images", outputs)
+            await cb.message.edit_text(f"✅ {sent} image(s){_failed(failed)} ({timer.elapsed_ms}ms)")
+        await _remember(data, "extract_images", outputs, "")
+        await usage.log(uid, "pdf", "extract_images", data["file_size"], "success", "", timer.elapsed_ms,
+                        sent, failed)
     except Exception as e:
+        await _release(uid, day)
         logger.error(f"Extract error: {e}", exc_info=True)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
         if out_dir: fm.cleanup(out_dir)
-        if zip_path: fm.cleanup(zip_path)
         _pending.pop(uid, None)
 
 
@@ -652,43 +1257,39 @@ async def _do_split(cb, bot, fm, usage, pdf_svc):
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("⏳")
-    await cb.message.edit_text("⏳ Splitting...")
-    inp = out_dir = zip_path = None
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
+    inp = out_dir = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            inp = fm.temp_path(".pdf")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out_dir = fm.temp_path("_pages")
-            out_dir.mkdir(parents=True, exist_ok=True)
-            with timer: pages = await pdf_svc.split_pages(inp, out_dir)
-            if len(pages) <= 10:
-                sent = 0
-                for p in pages:
-                    try:
-                        f = FSInputFile(path=str(p), filename=p.name)
-                        await bot.send_document(chat_id=cb.message.chat.id, document=f)
-                        sent += 1
-                    except: pass
-                await cb.message.edit_text(f"✅ {sent} pages ({timer.elapsed_ms}ms)")
-            else:
-                zip_path = fm.temp_path(".zip")
-                with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-                    for p in pages: zf.write(p, p.name)
-                f = FSInputFile(path=str(zip_path), filename=f"{Path(data['file_name']).stem}_split.zip")
-                await bot.send_document(chat_id=cb.message.chat.id, document=f,
-                    caption=f"✅ {len(pages)} pages (zipped) ({timer.elapsed_ms}ms)")
-                await cb.message.edit_text(f"✅ {len(pages)} pages → ZIP ({timer.elapsed_ms}ms)")
-            await usage.log(uid, "pdf", "split", data["file_size"], "success", "", timer.elapsed_ms)
+        await cb.answer("⏳")
+        await cb.message.edit_text("⏳ Splitting...")
+        if await _replay(bot, usage, cb.message.chat.id, uid, "pdf", "split", data, ""):
+            await cb.message.edit_text("✅ Pages sent (cached)")
+            return
+        outputs = []
+        sent = failed = 0
+        timer = Timer()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".pdf",
+            _progress(cb.message, data["file_size"]))
+        out_dir = fm.temp_path("_pages")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        pages = (await _probe(fm, data, inp))["pages"]
+        with timer:
+            items = _shards(pdf_svc.split_range, inp, out_dir, pages, "pdf", "split", data["file_size"])
+            sent, failed = await _send_stream(bot, cb.message.chat.id, fm, items, pages,
+                                      f"{Path(data['file_name']).stem}_split", outputs)
+        await cb.message.edit_text(f"✅ {sent} pages{_failed(failed)} ({timer.elapsed_ms}ms)")
+        await _remember(data, "split", outputs, "")
+        await usage.log(uid, "pdf", "split", data["file_size"], "success", "", timer.elapsed_ms,
+                        sent, failed)
     except Exception as e:
+        await _release(uid, day)
         logger.error(f"Split error: {e}", exc_info=True)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
         if out_dir: fm.cleanup(out_dir)
-        if zip_path: fm.cleanup(zip_path)
         _pending.pop(uid, None)
 
 
@@ -698,52 +1299,89 @@ async def _do_pdf_info(cb, bot, fm, usage, pdf_svc):
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("🔍")
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
     inp = None
     try:
-        async with _semaphore:
-            inp = fm.temp_path(".pdf")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            info = await pdf_svc.get_info(inp)
-            meta_str = "\n".join([f"  {k}: {v}" for k, v in info.get("metadata", {}).items()]) or "  None"
-            encrypted = "🔒 Yes" if info.get("encrypted") else "🔓 No"
-            await cb.message.edit_text(
-                f"📊 PDF Info\n━━━━━━━━━━━━━━━━━━━━━\n"
-                f"📄 {data['file_name']}\n📦 {format_size(info['size_bytes'])}\n"
-                f"📑 Pages: {info['pages']}\n📐 {info.get('width', 0)}x{info.get('height', 0)} mm\n"
-                f"🔐 Encrypted: {encrypted}\n\n📋 Metadata:\n{meta_str}")
-            await usage.log(uid, "pdf", "info", data["file_size"], "success")
+        await cb.answer("🔍")
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".pdf",
+            _progress(cb.message, data["file_size"]))
+        info = await _probe(fm, data, inp)
+        meta_str = "\n".join([f"  {k}: {v}" for k, v in info["metadata"].items()]) or "  None"
+        encrypted = "🔒 Yes" if info["encrypted"] else "🔓 No"
+        sizes = set(info["page_sizes"])
+        if len(sizes) == 1:
+            w, h = sizes.pop()
+            size_str = f"{round(w * 25.4 / 72, 1)}x{round(h * 25.4 / 72, 1)} mm"
+        else:
+            size_str = f"{len(sizes)} page sizes" if sizes else "unknown"
+        kind = "🖨 Scanned" if info["scanned"] else f"📝 Text ({info['text_pages']}/{info['pages']} pages)"
+        await cb.message.edit_text(
+            f"📊 PDF Info\n━━━━━━━━━━━━━━━━━━━━━\n"
+            f"📄 {data['file_name']}\n📦 {format_size(info['size_bytes'])}\n"
+            f"📑 Pages: {info['pages']}\n📐 {size_str}\n"
+            f"🖼 Images: {info['images']}\n🔤 Fonts: {info['fonts']}\n{kind}\n"
+            f"🔐 Encrypted: {encrypted}\n\n📋 Metadata:\n{meta_str}")
+        await usage.log(uid, "pdf", "info", data["file_size"], "success")
     except Exception as e:
+        await _release(uid, day)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
         _pending.pop(uid, None)
 
 
-async def _do_pdf_compress(cb, bot, fm, usage, pdf_svc):
+async def _do_pdf_compress(cb, bot, fm, usage, pdf_svc, profile="balanced", linear=False):
     uid = cb.from_user.id
     data = _pending.get(uid)
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("⏳")
-    await cb.message.edit_text("⏳ Compressing PDF...")
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
+    params = f"{profile}:{int(linear)}"
     inp = out = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            inp = fm.temp_path(".pdf")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out = fm.temp_path(".pdf")
-            with timer: _, orig, new, saved = await pdf_svc.compress(inp, out)
-            doc = FSInputFile(path=str(out), filename=f"{Path(data['file_name']).stem}_compressed.pdf")
-            await bot.send_document(chat_id=cb.message.chat.id, document=doc,
-                caption=f"✅ PDF Compressed\n📦 {format_size(orig)} → {format_size(new)}\n💾 Saved: {saved}%")
-            await usage.log(uid, "pdf", "compress", data["file_size"], "success", "", timer.elapsed_ms)
-            await cb.message.edit_text(f"✅ Compressed! Saved {saved}%")
+        await cb.answer("⏳")
+        await cb.message.edit_text(f"⏳ Compressing PDF ({profile})...")
+        if await _replay(bot, usage, cb.message.chat.id, uid, "pdf", "compress", data, params):
+            await cb.message.edit_text("✅ Compressed! (cached)")
+            return
+        outputs = []
+        timer = Timer()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".pdf",
+            _progress(cb.message, data["file_size"]))
+        out = fm.temp_path(".pdf")
+        with timer:
+            async with _scheduler.slot("pdf", "compress", data["file_size"]):
+                plan = await _pool.run(pdf_svc.compress_plan, inp, profile)
+            # Largest images first, each to the least loaded shard.
+            shards = [[] for _ in range(min(len(plan), _pool.size))]
+            loads = [0] * len(shards)
+            for job in plan:
+                i = loads.index(min(loads))
+                shards[i].append(job)
+                loads[i] += job[2]
+
+            async def run(jobs, size):
+                async with _scheduler.slot("pdf", "compress", size):
+                    return await _pool.run(pdf_svc.recompress_images, inp, jobs, profile)
+
+            parts = await asyncio.gather(*(run(jobs, size) for jobs, size in zip(shards, loads)))
+            images = [img for part in parts for img in part]
+            async with _scheduler.slot("pdf", "compress", data["file_size"]):
+                _, orig, new, saved = await _pool.run(pdf_svc.compress, inp, out, profile, images, linear)
+        doc = FSInputFile(path=str(out), filename=f"{Path(data['file_name']).stem}_compressed.pdf")
+        outputs.append(await bot.send_document(chat_id=cb.message.chat.id, document=doc,
+            caption=f"✅ PDF Compressed ({profile})\n📦 {format_size(orig)} → {format_size(new)}\n"
+                    f"🖼 {len(images)}/{len(plan)} images re-encoded\n💾 Saved: {saved}%"))
+        await _remember(data, "compress", outputs, params)
+        await usage.log(uid, "pdf", "compress", data["file_size"], "success", "", timer.elapsed_ms)
+        await cb.message.edit_text(f"✅ Compressed! Saved {saved}% ({timer.elapsed_ms}ms)")
     except Exception as e:
+        await _release(uid, day)
         logger.error(f"PDF compress error: {e}", exc_info=True)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
@@ -752,72 +1390,72 @@ async def _do_pdf_compress(cb, bot, fm, usage, pdf_svc):
         _pending.pop(uid, None)
 
 
-async def _do_pdf_to_images(cb, bot, fm, usage, pdf_svc):
+async def _do_pdf_to_images(cb, bot, fm, usage, pdf_svc, fmt="png", dpi=150, gray=False):
     uid = cb.from_user.id
     data = _pending.get(uid)
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("⏳")
-    await cb.message.edit_text("⏳ Converting to images...")
-    inp = out_dir = zip_path = None
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
+    params = f"{fmt}:{dpi}:{int(gray)}"
+    inp = out_dir = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            inp = fm.temp_path(".pdf")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out_dir = fm.temp_path("_pdfimg")
-            out_dir.mkdir(parents=True, exist_ok=True)
-            with timer: paths = await pdf_svc.to_images(inp, out_dir)
-            if not paths:
-                await cb.message.edit_text("ℹ️ No pages found.")
-            elif len(paths) <= 10:
-                sent = 0
-                for p in paths:
-                    try:
-                        f = FSInputFile(path=str(p), filename=p.name)
-                        await bot.send_document(chat_id=cb.message.chat.id, document=f)
-                        sent += 1
-                    except Exception as e:
-                        logger.warning(f"Send failed: {e}")
-                await cb.message.edit_text(f"✅ {sent} page(s) as images ({timer.elapsed_ms}ms)")
-            else:
-                zip_path = fm.temp_path(".zip")
-                with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-                    for p in paths: zf.write(p, p.name)
-                f = FSInputFile(path=str(zip_path), filename=f"{Path(data['file_name']).stem}_pages.zip")
-                await bot.send_document(chat_id=cb.message.chat.id, document=f,
-                    caption=f"✅ {len(paths)} pages as images (zipped)\n⏱ {timer.elapsed_ms}ms")
-                await cb.message.edit_text(f"✅ {len(paths)} pages → ZIP ({timer.elapsed_ms}ms)")
-            await usage.log(uid, "pdf", "to_images", data["file_size"], "success", "", timer.elapsed_ms)
+        await cb.answer("⏳")
+        await cb.message.edit_text("⏳ Converting to images...")
+        if await _replay(bot, usage, cb.message.chat.id, uid, "pdf", "to_images", data, params):
+            await cb.message.edit_text("✅ Pages sent as images (cached)")
+            return
+        outputs = []
+        sent = failed = 0
+        timer = Timer()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".pdf",
+            _progress(cb.message, data["file_size"]))
+        out_dir = fm.temp_path("_pdfimg")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        total = (await _probe(fm, data, inp))["pages"]
+        if not total:
+            await cb.message.edit_text("ℹ️ No pages found.")
+        else:
+            with timer:
+                items = _shards(pdf_svc.render_pages, inp, out_dir, total, "pdf", "to_images",
+                                data["file_size"], fmt, dpi, gray)
+                sent, failed = await _send_stream(bot, cb.message.chat.id, fm, items, total,
+                                          f"{Path(data['file_name']).stem}_pages", outputs)
+            await cb.message.edit_text(f"✅ {sent} page(s) as images{_failed(failed)} ({timer.elapsed_ms}ms)")
+        await _remember(data, "to_images", outputs, params)
+        await usage.log(uid, "pdf", "to_images", data["file_size"], "success", "", timer.elapsed_ms,
+                        sent, failed)
     except Exception as e:
+        await _release(uid, day)
         logger.error(f"PDF to images error: {e}", exc_info=True)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
         if out_dir: fm.cleanup(out_dir)
-        if zip_path: fm.cleanup(zip_path)
         _pending.pop(uid, None)
 
 
 async def _do_protect(message, bot, fm, usage, data, password):
     uid = message.from_user.id
+    if not (day := await _admit(uid)):
+        await message.reply("Daily limit reached. Try tomorrow.")
+        return
     inp = out = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            pdf_svc = PDFService()
-            inp = fm.temp_path(".pdf")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out = fm.temp_path(".pdf")
-            with timer: await pdf_svc.protect(inp, out, password)
-            doc = FSInputFile(path=str(out), filename=f"{Path(data['file_name']).stem}_protected.pdf")
-            await bot.send_document(chat_id=message.chat.id, document=doc,
-                caption=f"🔒 Protected ({timer.elapsed_ms}ms)\n⚠️ Remember your password!")
-            await usage.log(uid, "pdf", "protect", data["file_size"], "success", "", timer.elapsed_ms)
+        timer = Timer()
+        pdf_svc = PDFService()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".pdf")
+        out = fm.temp_path(".pdf")
+        async with _scheduler.slot("pdf", "protect", data["file_size"]):
+            with timer: await _pool.run(pdf_svc.protect, inp, out, password)
+        doc = FSInputFile(path=str(out), filename=f"{Path(data['file_name']).stem}_protected.pdf")
+        await bot.send_document(chat_id=message.chat.id, document=doc,
+            caption=f"🔒 Protected ({timer.elapsed_ms}ms)\n⚠️ Remember your password!")
+        await usage.log(uid, "pdf", "protect", data["file_size"], "success", "", timer.elapsed_ms)
     except Exception as e:
+        await _release(uid, day)
         await message.reply(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
@@ -827,25 +1465,28 @@ async def _do_protect(message, bot, fm, usage, data, password):
 
 async def _do_unlock(message, bot, fm, usage, data, password):
     uid = message.from_user.id
+    if not (day := await _admit(uid)):
+        await message.reply("Daily limit reached. Try tomorrow.")
+        return
     inp = out = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            pdf_svc = PDFService()
-            inp = fm.temp_path(".pdf")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out = fm.temp_path(".pdf")
-            with timer: result, success = await pdf_svc.remove_password(inp, out, password)
-            if success:
-                doc = FSInputFile(path=str(out), filename=f"{Path(data['file_name']).stem}_unlocked.pdf")
-                await bot.send_document(chat_id=message.chat.id, document=doc,
-                    caption=f"🔓 Unlocked ({timer.elapsed_ms}ms)")
-                await usage.log(uid, "pdf", "unlock", data["file_size"], "success", "", timer.elapsed_ms)
-            else:
-                await message.reply("❌ Wrong password.")
-                await usage.log(uid, "pdf", "unlock", data["file_size"], "failure", "wrong password")
+        timer = Timer()
+        pdf_svc = PDFService()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".pdf")
+        out = fm.temp_path(".pdf")
+        async with _scheduler.slot("pdf", "unlock", data["file_size"]):
+            with timer: result, success = await _pool.run(pdf_svc.remove_password, inp, out, password)
+        if success:
+            doc = FSInputFile(path=str(out), filename=f"{Path(data['file_name']).stem}_unlocked.pdf")
+            await bot.send_document(chat_id=message.chat.id, document=doc,
+                caption=f"🔓 Unlocked ({timer.elapsed_ms}ms)")
+            await usage.log(uid, "pdf", "unlock", data["file_size"], "success", "", timer.elapsed_ms)
+        else:
+            await _release(uid, day)
+            await message.reply("❌ Wrong password.")
+            await usage.log(uid, "pdf", "unlock", data["file_size"], "failure", "wrong password")
     except Exception as e:
+        await _release(uid, day)
         await message.reply(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
@@ -855,21 +1496,27 @@ async def _do_unlock(message, bot, fm, usage, data, password):
 
 async def _do_extract_pages(message, bot, fm, usage, data, start, end):
     uid = message.from_user.id
+    if not (day := await _admit(uid)):
+        await message.reply("Daily limit reached. Try tomorrow.")
+        return
     inp = out = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            pdf_svc = PDFService()
-            inp = fm.temp_path(".pdf")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out = fm.temp_path(".pdf")
-            with timer: _, s, e = await pdf_svc.extract_page_range(inp, out, start, end)
-            doc = FSInputFile(path=str(out), filename=f"{Path(data['file_name']).stem}_p{s}-{e}.pdf")
-            await bot.send_document(chat_id=message.chat.id, document=doc,
-                caption=f"✅ Pages {s}-{e} extracted ({timer.elapsed_ms}ms)")
-            await usage.log(uid, "pdf", f"pages_{s}-{e}", data["file_size"], "success", "", timer.elapsed_ms)
+        if await _replay(bot, usage, message.chat.id, uid, "pdf", "extract_pages", data, f"{start}-{end}"):
+            return
+        outputs = []
+        timer = Timer()
+        pdf_svc = PDFService()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".pdf")
+        out = fm.temp_path(".pdf")
+        async with _scheduler.slot("pdf", "extract_pages", data["file_size"]):
+            with timer: _, s, e = await _pool.run(pdf_svc.extract_page_range, inp, out, start, end)
+        doc = FSInputFile(path=str(out), filename=f"{Path(data['file_name']).stem}_p{s}-{e}.pdf")
+        outputs.append(await bot.send_document(chat_id=message.chat.id, document=doc,
+            caption=f"✅ Pages {s}-{e} extracted ({timer.elapsed_ms}ms)"))
+        await _remember(data, "extract_pages", outputs, f"{start}-{end}")
+        await usage.log(uid, "pdf", f"pages_{s}-{e}", data["file_size"], "success", "", timer.elapsed_ms)
     except Exception as e:
+        await _release(uid, day)
         await message.reply(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
@@ -879,22 +1526,28 @@ async def _do_extract_pages(message, bot, fm, usage, data, start, end):
 
 async def _do_resize_pct(message, bot, config, fm, usage, data, pct):
     uid = message.from_user.id
+    if not (day := await _admit(uid)):
+        await message.reply("Daily limit reached. Try tomorrow.")
+        return
     inp = out = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            img_svc = ImageService()
-            name = data["file_name"]
-            in_ext = Path(name).suffix if name else ".jpg"
-            inp = fm.temp_path(in_ext)
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out = fm.temp_path(in_ext)
-            with timer: await img_svc.resize(inp, out, pct)
-            doc = FSInputFile(path=str(out), filename=f"{Path(name).stem}_{pct}pct{in_ext}")
-            await bot.send_document(chat_id=message.chat.id, document=doc, caption=f"✅ Resized to {pct}% ({timer.elapsed_ms}ms)")
-            await usage.log(uid, "image", f"resize_{pct}", data["file_size"], "success", "", timer.elapsed_ms)
+        if await _replay(bot, usage, message.chat.id, uid, "image", f"resize_{pct}", data, ""):
+            return
+        outputs = []
+        timer = Timer()
+        img_svc = ImageService()
+        name = data["file_name"]
+        in_ext = Path(name).suffix if name else ".jpg"
+        src, inp = await _fetch_input(fm, bot, data, in_ext)
+        out = fm.temp_path(in_ext) if inp else None
+        async with _scheduler.slot("image", "resize", data["file_size"]):
+            with timer: result = await _pool.run(img_svc.resize, src, out, pct)
+        doc = _document(result, out, f"{Path(name).stem}_{pct}pct{in_ext}")
+        outputs.append(await bot.send_document(chat_id=message.chat.id, document=doc, caption=f"✅ Resized to {pct}% ({timer.elapsed_ms}ms)"))
+        await _remember(data, f"resize_{pct}", outputs, "")
+        await usage.log(uid, "image", f"resize_{pct}", data["file_size"], "success", "", timer.elapsed_ms)
     except Exception as e:
+        await _release(uid, day)
         await message.reply(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
@@ -904,22 +1557,28 @@ async def _do_resize_pct(message, bot, config, fm, usage, data, pct):
 
 async def _do_resize_exact(message, bot, config, fm, usage, data, w, h):
     uid = message.from_user.id
+    if not (day := await _admit(uid)):
+        await message.reply("Daily limit reached. Try tomorrow.")
+        return
     inp = out = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            img_svc = ImageService()
-            name = data["file_name"]
-            in_ext = Path(name).suffix if name else ".jpg"
-            inp = fm.temp_path(in_ext)
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out = fm.temp_path(in_ext)
-            with timer: await img_svc.resize_exact(inp, out, w, h)
-            doc = FSInputFile(path=str(out), filename=f"{Path(name).stem}_{w}x{h}{in_ext}")
-            await bot.send_document(chat_id=message.chat.id, document=doc, caption=f"✅ Resized to {w}x{h} ({timer.elapsed_ms}ms)")
-            await usage.log(uid, "image", f"resize_{w}x{h}", data["file_size"], "success", "", timer.elapsed_ms)
+        if await _replay(bot, usage, message.chat.id, uid, "image", f"resize_{w}x{h}", data, ""):
+            return
+        outputs = []
+        timer = Timer()
+        img_svc = ImageService()
+        name = data["file_name"]
+        in_ext = Path(name).suffix if name else ".jpg"
+        src, inp = await _fetch_input(fm, bot, data, in_ext)
+        out = fm.temp_path(in_ext) if inp else None
+        async with _scheduler.slot("image", "resize", data["file_size"]):
+            with timer: result = await _pool.run(img_svc.resize_exact, src, out, w, h)
+        doc = _document(result, out, f"{Path(name).stem}_{w}x{h}{in_ext}")
+        outputs.append(await bot.send_document(chat_id=message.chat.id, document=doc, caption=f"✅ Resized to {w}x{h} ({timer.elapsed_ms}ms)"))
+        await _remember(data, f"resize_{w}x{h}", outputs, "")
+        await usage.log(uid, "image", f"resize_{w}x{h}", data["file_size"], "success", "", timer.elapsed_ms)
     except Exception as e:
+        await _release(uid, day)
         await message.reply(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
@@ -933,25 +1592,28 @@ async def _do_docx_info(cb, bot, fm, usage, docx_svc):
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("🔍")
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
     inp = None
     try:
-        async with _semaphore:
-            inp = fm.temp_path(".docx")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            info = await docx_svc.get_info(inp)
-            await cb.message.edit_text(
-                f"📊 DOCX Info\n━━━━━━━━━━━━━━━━━━━━━\n"
-                f"📄 {data['file_name']}\n📦 {format_size(info['size_bytes'])}\n"
-                f"📝 Paragraphs: {info['paragraphs']}\n📊 Tables: {info['tables']}\n"
-                f"📑 Sections: {info['sections']}\n🖼 Images: {info['images']}\n"
-                f"🔢 Words: {info['words']}\n🔤 Characters: {info['characters']}\n\n"
-                f"👤 Author: {info['author']}\n📌 Title: {info['title']}\n"
-                f"📅 Created: {info['created']}\n📅 Modified: {info['modified']}\n"
-                f"👤 Modified by: {info['last_modified_by']}")
-            await usage.log(uid, "docx", "info", data["file_size"], "success")
+        await cb.answer("🔍")
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".docx",
+            _progress(cb.message, data["file_size"]))
+        async with _scheduler.slot("docx", "info", data["file_size"]):
+            info = await _pool.run(docx_svc.get_info, inp)
+        await cb.message.edit_text(
+            f"📊 DOCX Info\n━━━━━━━━━━━━━━━━━━━━━\n"
+            f"📄 {data['file_name']}\n📦 {format_size(info['size_bytes'])}\n"
+            f"📝 Paragraphs: {info['paragraphs']}\n📊 Tables: {info['tables']}\n"
+            f"📑 Sections: {info['sections']}\n🖼 Images: {info['images']}\n"
+            f"🔢 Words: {info['words']}\n🔤 Characters: {info['characters']}\n\n"
+            f"👤 Author: {info['author']}\n📌 Title: {info['title']}\n"
+            f"📅 Created: {info['created']}\n📅 Modified: {info['modified']}\n"
+            f"👤 Modified by: {info['last_modified_by']}")
+        await usage.log(uid, "docx", "info", data["file_size"], "success")
     except Exception as e:
+        await _release(uid, day)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
@@ -964,22 +1626,25 @@ async def _do_word_count(cb, bot, fm, usage, docx_svc):
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("🔢")
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
     inp = None
     try:
-        async with _semaphore:
-            inp = fm.temp_path(".docx")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            wc = await docx_svc.word_count(inp)
-            await cb.message.edit_text(
-                f"🔢 Word Count\n━━━━━━━━━━━━━━━━━━━━━\n"
-                f"📄 {data['file_name']}\n\n"
-                f"📝 Words: {wc['words']}\n🔤 Characters: {wc['characters']}\n"
-                f"🔤 No spaces: {wc['characters_no_space']}\n📃 Lines: {wc['lines']}\n"
-                f"💬 Sentences: {wc['sentences']}\n📏 Avg word: {wc['avg_word_length']} chars")
-            await usage.log(uid, "docx", "word_count", data["file_size"], "success")
+        await cb.answer("🔢")
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".docx",
+            _progress(cb.message, data["file_size"]))
+        async with _scheduler.slot("docx", "word_count", data["file_size"]):
+            wc = await _pool.run(docx_svc.word_count, inp)
+        await cb.message.edit_text(
+            f"🔢 Word Count\n━━━━━━━━━━━━━━━━━━━━━\n"
+            f"📄 {data['file_name']}\n\n"
+            f"📝 Words: {wc['words']}\n🔤 Characters: {wc['characters']}\n"
+            f"🔤 No spaces: {wc['characters_no_space']}\n📃 Lines: {wc['lines']}\n"
+            f"💬 Sentences: {wc['sentences']}\n📏 Avg word: {wc['avg_word_length']} chars")
+        await usage.log(uid, "docx", "word_count", data["file_size"], "success")
     except Exception as e:
+        await _release(uid, day)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
@@ -992,45 +1657,38 @@ async def _do_docx_images(cb, bot, fm, usage, docx_svc):
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("⏳")
-    await cb.message.edit_text("⏳ Extracting images...")
-    inp = out_dir = zip_path = None
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
+    inp = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            inp = fm.temp_path(".docx")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out_dir = fm.temp_path("_docximgs")
-            out_dir.mkdir(parents=True, exist_ok=True)
-            with timer: paths = await docx_svc.extract_images(inp, out_dir)
-            if not paths:
-                await cb.message.edit_text("ℹ️ No images found.")
-            elif len(paths) <= 10:
-                sent = 0
-                for p in paths:
-                    try:
-                        f = FSInputFile(path=str(p), filename=p.name)
-                        await bot.send_document(chat_id=cb.message.chat.id, document=f)
-                        sent += 1
-                    except: pass
-                await cb.message.edit_text(f"✅ {sent} image(s) ({timer.elapsed_ms}ms)")
-            else:
-                zip_path = fm.temp_path(".zip")
-                with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-                    for p in paths: zf.write(p, p.name)
-                f = FSInputFile(path=str(zip_path), filename=f"{Path(data['file_name']).stem}_images.zip")
-                await bot.send_document(chat_id=cb.message.chat.id, document=f,
-                    caption=f"✅ {len(paths)} images (zipped) ({timer.elapsed_ms}ms)")
-                await cb.message.edit_text(f"✅ {len(paths)} images → ZIP ({timer.elapsed_ms}ms)")
-            await usage.log(uid, "docx", "extract_images", data["file_size"], "success", "", timer.elapsed_ms)
+        await cb.answer("⏳")
+        await cb.message.edit_text("⏳ Extracting images...")
+        if await _replay(bot, usage, cb.message.chat.id, uid, "docx", "extract_images", data, ""):
+            await cb.message.edit_text("✅ Images sent (cached)")
+            return
+        outputs = []
+        sent = failed = 0
+        timer = Timer()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".docx",
+            _progress(cb.message, data["file_size"]))
+        async with _scheduler.slot("docx", "extract_images", data["file_size"]):
+            with timer: members = await _pool.run(docx_svc.extract_images, inp)
+        if not members:
+            await cb.message.edit_text("ℹ️ No images found.")
+        else:
+            sent, failed = await _send_stream(bot, cb.message.chat.id, fm, _iterate(members), len(members),
+                                      f"{Path(data['file_name']).stem}_images", outputs)
+            await cb.message.edit_text(f"✅ {sent} image(s){_failed(failed)} ({timer.elapsed_ms}ms)")
+        await _remember(data, "extract_images", outputs, "")
+        await usage.log(uid, "docx", "extract_images", data["file_size"], "success", "", timer.elapsed_ms,
+                        sent, failed)
     except Exception as e:
+        await _release(uid, day)
         logger.error(f"DOCX images error: {e}", exc_info=True)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
-        if out_dir: fm.cleanup(out_dir)
-        if zip_path: fm.cleanup(zip_path)
         _pending.pop(uid, None)
 
 
@@ -1040,43 +1698,36 @@ async def _do_docx_tables(cb, bot, fm, usage, docx_svc):
     if not data:
         await cb.answer("❌ No file pending.", show_alert=True)
         return
-    await cb.answer("⏳")
-    await cb.message.edit_text("⏳ Extracting tables...")
-    inp = out_dir = zip_path = None
+    if not (day := await _admit(uid)):
+        await cb.answer("Daily limit reached. Try tomorrow.", show_alert=True)
+        return
+    inp = None
     try:
-        async with _semaphore:
-            timer = Timer()
-            inp = fm.temp_path(".docx")
-            tg_file = await bot.get_file(data["file_id"])
-            await bot.download_file(tg_file.file_path, destination=str(inp))
-            out_dir = fm.temp_path("_tables")
-            out_dir.mkdir(parents=True, exist_ok=True)
-            with timer: paths = await docx_svc.extract_tables_csv(inp, out_dir)
-            if not paths:
-                await cb.message.edit_text("ℹ️ No tables found.")
-            elif len(paths) <= 10:
-                sent = 0
-                for p in paths:
-                    try:
-                        f = FSInputFile(path=str(p), filename=p.name)
-                        await bot.send_document(chat_id=cb.message.chat.id, document=f)
-                        sent += 1
-                    except: pass
-                await cb.message.edit_text(f"✅ {sent} table(s) as CSV ({timer.elapsed_ms}ms)")
-            else:
-                zip_path = fm.temp_path(".zip")
-                with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-                    for p in paths: zf.write(p, p.name)
-                f = FSInputFile(path=str(zip_path), filename=f"{Path(data['file_name']).stem}_tables.zip")
-                await bot.send_document(chat_id=cb.message.chat.id, document=f,
-                    caption=f"✅ {len(paths)} tables (zipped) ({timer.elapsed_ms}ms)")
-                await cb.message.edit_text(f"✅ {len(paths)} tables → ZIP ({timer.elapsed_ms}ms)")
-            await usage.log(uid, "docx", "extract_tables", data["file_size"], "success", "", timer.elapsed_ms)
+        await cb.answer("⏳")
+        await cb.message.edit_text("⏳ Extracting tables...")
+        if await _replay(bot, usage, cb.message.chat.id, uid, "docx", "extract_tables", data, ""):
+            await cb.message.edit_text("✅ Tables sent (cached)")
+            return
+        outputs = []
+        sent = failed = 0
+        timer = Timer()
+        inp = await fm.download(bot, data["file_id"], data.get("file_unique_id"), ".docx",
+            _progress(cb.message, data["file_size"]))
+        async with _scheduler.slot("docx", "extract_tables", data["file_size"]):
+            with timer: members = await _pool.run(docx_svc.extract_tables_csv, inp)
+        if not members:
+            await cb.message.edit_text("ℹ️ No tables found.")
+        else:
+            sent, failed = await _send_stream(bot, cb.message.chat.id, fm, _iterate(members), len(members),
+                                      f"{Path(data['file_name']).stem}_tables", outputs)
+            await cb.message.edit_text(f"✅ {sent} table(s) as CSV{_failed(failed)} ({timer.elapsed_ms}ms)")
+        await _remember(data, "extract_tables", outputs, "")
+        await usage.log(uid, "docx", "extract_tables", data["file_size"], "success", "", timer.elapsed_ms,
+                        sent, failed)
     except Exception as e:
+        await _release(uid, day)
         logger.error(f"DOCX tables error: {e}", exc_info=True)
         await cb.message.edit_text(f"❌ Error: {str(e)[:200]}")
     finally:
         if inp: fm.cleanup(inp)
-        if out_dir: fm.cleanup(out_dir)
-        if zip_path: fm.cleanup(zip_path)
         _pending.pop(uid, None)
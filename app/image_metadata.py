@@ -0,0 +1,216 @@
+import re
+import struct
+
+# Reads are buffered in chunks this size; JPEG segments are at most 64 KB.
+CHUNK_SIZE = 256 * 1024
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Text, EXIF and timestamp chunks; colour chunks (iCCP, sRGB, gAMA...) stay.
+PNG_DROP = {b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME"}
+WEBP_DROP = {b"EXIF", b"XMP "}
+# VP8X flag bits announcing EXIF and XMP chunks.
+WEBP_META_FLAGS = 0x08 | 0x04
+# In JPEG scan data 0xFF is followed by a stuffed 0x00 or a restart
+# marker; anything else starts the next segment.
+JPEG_MARKER = re.compile(rb"\xff[^\x00\xd0-\xd7]")
+
+
+class _Stream:
+    """Buffered reader over a binary file object."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = b""
+        self.pos = 0
+
+    def _fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            raise ValueError("Truncated image")
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self, n):
+        try:
+            while len(self.buf) - self.pos < n:
+                self._fill()
+        except ValueError:
+            pass
+        return self.buf[self.pos:self.pos + n]
+
+    def read(self, n):
+        while len(self.buf) - self.pos < n:
+            self._fill()
+        self.pos += n
+        return self.buf[self.pos - n:self.pos]
+
+    def copy(self, n, dst):
+        """Copy the next `n` bytes to `dst` without holding them all."""
+        while n:
+            if self.pos == len(self.buf):
+                self._fill()
+            end = min(len(self.buf), self.pos + n)
+            dst.write(memoryview(self.buf)[self.pos:end])
+            n -= end - self.pos
+            self.pos = end
+
+    def skip(self, n):
+        self.copy(n, _Discard)
+
+    def copy_entropy(self, dst):
+        """Copy JPEG entropy-coded data up to, not including, the next marker."""
+        while True:
+            m = JPEG_MARKER.search(self.buf, self.pos)
+            if m:
+                dst.write(memoryview(self.buf)[self.pos:m.start()])
+                self.pos = m.start()
+                return
+            # A trailing 0xFF waits for the byte after it.
+            end = len(self.buf) - self.buf.endswith(b"\xff")
+            dst.write(memoryview(self.buf)[self.pos:end])
+            self.pos = end
+            self._fill()
+
+
+class _Discard:
+    @staticmethod
+    def write(data):
+        pass
+
+
+def _orientation(exif):
+    """EXIF Orientation from an APP1 payload, or None if absent or 1."""
+    tiff = exif[6:]
+    if len(tiff) < 8 or tiff[:2] not in (b"II", b"MM"):
+        return None
+    order = "<" if tiff[:2] == b"II" else ">"
+    ifd = struct.unpack(order + "I", tiff[4:8])[0]
+    if ifd + 2 > len(tiff):
+        return None
+    count = struct.unpack(order + "H", tiff[ifd:ifd + 2])[0]
+    for i in range(count):
+        entry = tiff[ifd + 2 + i * 12:ifd + 14 + i * 12]
+        if len(entry) < 12:
+            break
+        tag, kind = struct.unpack(order + "HH", entry[:4])
+        if tag == 0x0112 and kind == 3:
+            value = struct.unpack(order + "H", entry[8:10])[0]
+            return value if 2 <= value <= 8 else None
+    return None
+
+
+def _orientation_segment(value):
+    """APP1 segment holding nothing but an EXIF Orientation tag."""
+    payload = (b"Exif\0\0MM\0\x2a\0\0\0\x08\0\x01"
+               + struct.pack(">HHIHH", 0x0112, 3, 1, value, 0) + b"\0\0\0\0")
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def _keep_jpeg(marker, payload):
+    if marker == 0xE0:
+        return payload.startswith(b"JFIF\0")
+    if marker == 0xE2:
+        return payload.startswith(b"ICC_PROFILE\0")
+    if marker == 0xEE:
+        # Adobe's colour transform flag is needed to decode CMYK/YCCK.
+        return payload.startswith(b"Adobe")
+    return not (0xE1 <= marker <= 0xEF or marker == 0xFE)
+
+
+def _strip_jpeg(src, dst):
+    """Drop APPn metadata, comments and anything after EOI.
+
+    Orientation survives as a minimal EXIF segment so the image is not
+    shown rotated; ICC profiles stay so colours are unchanged.
+    """
+    dst.write(src.read(2))
+    while True:
+        head = src.read(2)
+        if head[0] != 0xFF:
+            raise ValueError("Bad JPEG marker")
+        marker = head[1]
+        while marker == 0xFF:
+            marker = src.read(1)[0]
+        if marker == 0xD9:
+            dst.write(b"\xff\xd9")
+            return
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            dst.write(bytes((0xFF, marker)))
+            continue
+        size = src.read(2)
+        length = struct.unpack(">H", size)[0]
+        if length < 2:
+            raise ValueError("Bad JPEG segment length")
+        payload = src.read(length - 2)
+        if marker == 0xE1 and payload.startswith(b"Exif\0\0"):
+            value = _orientation(payload)
+            if value:
+                dst.write(_orientation_segment(value))
+        elif _keep_jpeg(marker, payload):
+            dst.write(bytes((0xFF, marker)) + size + payload)
+        if marker == 0xDA:
+            src.copy_entropy(dst)
+
+
+def _strip_png(src, dst):
+    dst.write(src.read(8))
+    while True:
+        head = src.read(8)
+        length, kind = struct.unpack(">I", head[:4])[0], head[4:]
+        if kind in PNG_DROP:
+            src.skip(length + 4)
+            continue
+        dst.write(head)
+        src.copy(length + 4, dst)
+        if kind == b"IEND":
+            return
+
+
+def _strip_webp(src, dst):
+    head = src.read(12)
+    start = dst.tell()
+    dst.write(head)
+    remaining = struct.unpack("<I", head[4:8])[0] - 4
+    written = 4
+    while remaining >= 8:
+        chunk = src.read(8)
+        kind, length = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        padded = length + (length & 1)
+        remaining -= 8 + padded
+        if kind in WEBP_DROP:
+            src.skip(padded)
+            continue
+        dst.write(chunk)
+        if kind == b"VP8X":
+            if not length:
+                raise ValueError("Bad VP8X chunk")
+            payload = src.read(padded)
+            dst.write(bytes((payload[0] & ~WEBP_META_FLAGS,)) + payload[1:])
+        else:
+            src.copy(padded, dst)
+        written += 8 + padded
+    end = dst.tell()
+    dst.seek(start + 4)
+    dst.write(struct.pack("<I", written))
+    dst.seek(end)
+
+
+def strip(src, dst):
+    """Copy image `src` to `dst` minus its metadata, without decoding pixels.
+
+    Both are binary file objects; `dst` must be seekable. Returns the
+    format handled ("JPEG", "PNG" or "WEBP"), or None without writing
+    anything for other formats. Raises ValueError on a malformed file.
+    """
+    stream = _Stream(src)
+    magic = stream.peek(12)
+    if magic[:3] == b"\xff\xd8\xff":
+        _strip_jpeg(stream, dst)
+        return "JPEG"
+    if magic[:8] == PNG_SIGNATURE:
+        _strip_png(stream, dst)
+        return "PNG"
+    if magic[:4] == b"RIFF" and magic[8:12] == b"WEBP":
+        _strip_webp(stream, dst)
+        return "WEBP"
+    return None
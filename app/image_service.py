@@ -1,13 +1,216 @@
+import io
+import math
+import time
 import pytesseract
 from pathlib import Path
-from PIL import Image, ImageFilter, ExifTags
+from PIL import Image, ImageFilter, ExifTags, JpegImagePlugin
 from app.config import logger
+from app import image_metadata, image_tiles
+
+BUFFER_TYPES = (bytes, bytearray, memoryview)
+
+
+def _open(src):
+    """Open an image from a path or from an in-memory buffer."""
+    return Image.open(io.BytesIO(src) if isinstance(src, BUFFER_TYPES) else src)
+
+
+def _save(img, dst, **kwargs):
+    """Save to `dst`, or return the encoded bytes when `dst` is None."""
+    if dst is not None:
+        img.save(dst, **kwargs)
+        return dst
+    buf = io.BytesIO()
+    img.save(buf, **kwargs)
+    return buf.getvalue()
+
+
+def _size(src):
+    return len(src) if isinstance(src, BUFFER_TYPES) else Path(src).stat().st_size
+
+
+def _draft(img, size):
+    """Have a JPEG decode straight at 1/2, 1/4 or 1/8 scale for a downscale to `size`.
+
+    libjpeg scales inside the IDCT, so full-size pixels are never built.
+    Halving alone matches LANCZOS; deeper DCT scales alias, so they are
+    only used while twice `size` is left for the final resample. Returns
+    the source box in decoded coordinates, for `resize(box=...)`.
+    """
+    w, h = size
+    res = img.draft(None, (max(w, min(2 * w, img.width // 2)), max(h, min(2 * h, img.height // 2))))
+    return res[1] if res else None
+
+
+# Default peak-memory budget for tiled jobs (MB).
+JOB_MEMORY_MB = 512
+
+
+def _tiled(input_path, output_path, out_size, strips, budget_mb, premultiply=False):
+    """Run a strip generator over an image within a memory budget.
+
+    The budget is checked from the header before any pixels are decoded;
+    `premultiply` counts the premultiplied copy resampling keeps of alpha
+    images. PNG output is streamed strip by strip, other formats assembled.
+    """
+    with _open(input_path) as img:
+        fmt = (img.format or "PNG").upper()
+        mode = {"P": "RGBA" if "transparency" in img.info else "RGB", "1": "L"}.get(img.mode, img.mode)
+        if fmt == "JPEG" and mode in ("RGBA", "LA"): mode = "RGB"
+        size = out_size(img.size)
+        stream = fmt == "PNG" and mode in image_tiles.PNG_COLOR_TYPES
+        sources = 2 if premultiply and mode in image_tiles.PREMULTIPLIED else 1
+        image_tiles.budget(mode, img.size, size, stream, output_path is None, budget_mb, sources)
+        icc = img.info.get("icc_profile")
+        if img.mode != mode: img = img.convert(mode)
+        if stream:
+            return image_tiles.write_png(strips(img), size, mode, output_path, icc)
+        return _save(image_tiles.assemble(strips(img), size, mode, icc), output_path, format=fmt, optimize=True)
+
+
+def _bare(img):
+    """`img` with its info dict (EXIF, XMP, text) cut down to what rendering needs."""
+    img.info = {k: v for k, v in img.info.items() if k in ("transparency", "icc_profile")}
+    return img
+
+
+# Target-size search: probe encodes run on a proxy of about this many pixels.
+PROXY_PIXELS = 512 * 512
+# Below this JPEG blocking looks worse than a smaller image, so downscale,
+# encoding the smaller image at DOWNSCALE_QUALITY.
+MIN_QUALITY = 30
+MAX_QUALITY = 95
+DOWNSCALE_QUALITY = 60
+# A result this close under the target ends the search.
+TARGET_SLACK = 0.9
+
+
+def _jpeg(img, quality):
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def _search_quality(size_of, limit, lo=MIN_QUALITY, hi=MAX_QUALITY):
+    """Highest quality in [lo, hi] with size_of(quality) <= limit, or None."""
+    best = None
+    while lo <= hi:
+        q = (lo + hi) // 2
+        if size_of(q) <= limit:
+            best, lo = q, q + 1
+        else:
+            hi = q - 1
+    return best
+
+
+def _interpolate(points, x):
+    """Piecewise-linear value at `x` through {x: y} points, flat at the ends."""
+    keys = sorted(points)
+    if x <= keys[0]:
+        return points[keys[0]]
+    if x >= keys[-1]:
+        return points[keys[-1]]
+    hi = next(k for k in keys if k >= x)
+    lo = keys[keys.index(hi) - 1]
+    return points[lo] + (points[hi] - points[lo]) * (x - lo) / (hi - lo)
+
+
+class _Proxy:
+    """Memoized JPEG sizes of a small copy of the image, per quality."""
+
+    def __init__(self, img, stats):
+        self.img = img
+        pixels = img.width * img.height
+        if pixels > PROXY_PIXELS:
+            scale = math.sqrt(PROXY_PIXELS / pixels)
+            self.img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                                  Image.BILINEAR, reducing_gap=2.0)
+        # Full/proxy size ratio per measured quality; until the first
+        # full-size encode, assume bytes scale with pixels.
+        self.ratios = {}
+        self.prior = pixels / (self.img.width * self.img.height)
+        self.stats = stats
+        self._sizes = {}
+
+    def size(self, q):
+        if q not in self._sizes:
+            self.stats["proxy_encodes"] += 1
+            self._sizes[q] = len(_jpeg(self.img, q))
+        return self._sizes[q]
+
+    def predict(self, q):
+        """Full-size bytes at quality q, from the ratios measured nearby."""
+        return self.size(q) * (_interpolate(self.ratios, q) if self.ratios else self.prior)
+
+    def measure(self, q, size):
+        self.ratios[q] = size / self.size(q)
+
+
+def _fit_quality(img, proxy, target, stats, rounds=6):
+    """Highest JPEG quality for `img` within `target` bytes, as (quality, data).
+
+    Candidates are picked on the proxy's predicted sizes and confirmed
+    with full-size encodes, each of which sharpens the prediction.
+    Returns None if even MIN_QUALITY is too big.
+    """
+    best, lo, hi = None, MIN_QUALITY, MAX_QUALITY
+    for _ in range(rounds):
+        q = _search_quality(proxy.predict, target, lo, hi) or lo
+        data = _jpeg(img, q)
+        stats["full_encodes"] += 1
+        proxy.measure(q, len(data))
+        if len(data) <= target:
+            best, lo = (q, data), q + 1
+            if len(data) >= target * TARGET_SLACK:
+                break
+        else:
+            hi = q - 1
+        if lo > hi:
+            break
+    return best
+
+
+def _fit_scale(img, size, target, stats, rounds=4):
+    """Downscale `img` until it fits in `target` at DOWNSCALE_QUALITY.
+
+    `size` is the (predicted) full-size encode at that quality. Bytes
+    scale roughly with pixel count, so each encode corrects the scale by
+    the square root of how far off it was. Returns ((quality, data), img).
+    """
+    best, base, scale = None, None, 1.0
+    for _ in range(rounds):
+        scale *= math.sqrt(target * 0.95 / size)
+        w, h = round(img.width * scale), round(img.height * scale)
+        if w < 16 or h < 16:
+            break
+        if base is None:
+            # Box-filter once to 1.5x the size and resample from there.
+            bw, bh = round(w * 1.5), round(h * 1.5)
+            base = img.resize((bw, bh), Image.BOX) if bw < img.width else img
+        small = base.resize((w, h), Image.LANCZOS)
+        data = _jpeg(small, DOWNSCALE_QUALITY)
+        stats["full_encodes"] += 1
+        size = len(data)
+        if size <= target:
+            best = ((DOWNSCALE_QUALITY, data), small)
+            if size >= target * TARGET_SLACK:
+                break
+    if not best:
+        raise ValueError(f"Cannot fit the image in {target} bytes")
+    return best
+
 
 class ImageService:
+    """Image operations.
+
+    Every method takes an input path or the raw file bytes. Passing
+    `output_path=None` returns the result as bytes instead of writing it.
+    """
+
     @staticmethod
-    async def extract_text_ocr(input_path):
+    def extract_text_ocr(input_path):
         """Perform OCR on image to extract text."""
-        with Image.open(input_path) as img:
+        with _open(input_path) as img:
             # Pre-process for better OCR (grayscale + sharpen)
             img = img.convert('L').filter(ImageFilter.SHARPEN)
             text = pytesseract.image_to_string(img)
@@ -16,109 +219,152 @@ class ImageService:
         return text.strip() if text.strip() else "No text detected in image."
 
     @staticmethod
-    async def remove_metadata(input_path, output_path):
-        with Image.open(input_path) as img:
-            clean = Image.new(img.mode, img.size)
-            clean.putdata(list(img.getdata()))
+    def remove_metadata(input_path, output_path):
+        """Drop EXIF, XMP, IPTC and text metadata.
+
+        JPEG, PNG and WebP are rewritten at the container level without
+        decoding pixels, so JPEG quality is untouched; other formats are
+        re-saved from a bare copy.
+        """
+        src = io.BytesIO(input_path) if isinstance(input_path, BUFFER_TYPES) else open(input_path, "rb")
+        dst = io.BytesIO() if output_path is None else open(output_path, "wb")
+        try:
+            with src, dst:
+                fmt = image_metadata.strip(src, dst)
+                if fmt and output_path is None:
+                    return dst.getvalue()
+        except ValueError as e:
+            logger.warning(f"Metadata strip fell back to re-encoding: {e}")
+            fmt = None
+        if fmt:
+            return output_path
+        with _open(input_path) as img:
+            clean = _bare(img.copy())
             fmt = img.format or "PNG"
             if fmt.upper() == "JPEG":
-                clean.save(output_path, format=fmt, quality=95)
+                result = _save(clean, output_path, format=fmt, quality=95)
             else:
-                clean.save(output_path, format=fmt, optimize=True)
-        return output_path
+                result = _save(clean, output_path, format=fmt, optimize=True)
+        return result
 
     @staticmethod
-    async def resize(input_path, output_path, percentage):
-        with Image.open(input_path) as img:
+    def resize(input_path, output_path, percentage):
+        with _open(input_path) as img:
             new_w = max(1, int(img.width * percentage / 100))
             new_h = max(1, int(img.height * percentage / 100))
-            resized = img.resize((new_w, new_h), Image.LANCZOS)
+            box = _draft(img, (new_w, new_h))
+            resized = img.resize((new_w, new_h), Image.LANCZOS, box=box, reducing_gap=3.0)
             fmt = img.format or "PNG"
             if fmt.upper() == "JPEG":
                 if resized.mode in ("RGBA", "LA", "P"): resized = resized.convert("RGB")
-                resized.save(output_path, format=fmt, quality=85)
+                result = _save(resized, output_path, format=fmt, quality=85)
             else:
-                resized.save(output_path, format=fmt, optimize=True)
-        return output_path
+                result = _save(resized, output_path, format=fmt, optimize=True)
+        return result
 
     @staticmethod
-    async def resize_exact(input_path, output_path, width, height):
-        with Image.open(input_path) as img:
-            resized = img.resize((width, height), Image.LANCZOS)
+    def resize_exact(input_path, output_path, width, height):
+        with _open(input_path) as img:
+            box = _draft(img, (width, height))
+            resized = img.resize((width, height), Image.LANCZOS, box=box, reducing_gap=3.0)
             fmt = img.format or "PNG"
             if fmt.upper() == "JPEG":
                 if resized.mode in ("RGBA", "LA", "P"): resized = resized.convert("RGB")
-                resized.save(output_path, format=fmt, quality=85)
+                result = _save(resized, output_path, format=fmt, quality=85)
             else:
-                resized.save(output_path, format=fmt, optimize=True)
-        return output_path
+                result = _save(resized, output_path, format=fmt, optimize=True)
+        return result
 
     @staticmethod
-    async def convert(input_path, output_path, target):
+    def convert(input_path, output_path, target):
         fmt_map = {"JPG": "JPEG", "JPEG": "JPEG", "PNG": "PNG", "WEBP": "WEBP", "BMP": "BMP"}
         pil_fmt = fmt_map.get(target.upper(), "PNG")
-        with Image.open(input_path) as img:
+        with _open(input_path) as img:
             if pil_fmt == "JPEG":
                 if img.mode in ("RGBA", "LA", "P"): img = img.convert("RGB")
-                img.save(output_path, format=pil_fmt, quality=85, optimize=True)
+                result = _save(img, output_path, format=pil_fmt, quality=85, optimize=True)
             elif pil_fmt == "PNG":
-                img.save(output_path, format=pil_fmt, optimize=True, compress_level=9)
+                result = _save(img, output_path, format=pil_fmt, optimize=True, compress_level=9)
             elif pil_fmt == "WEBP":
-                img.save(output_path, format=pil_fmt, quality=85, method=6)
+                result = _save(img, output_path, format=pil_fmt, quality=85, method=6)
             else:
-                img.save(output_path, format=pil_fmt)
-        return output_path
+                result = _save(img, output_path, format=pil_fmt)
+        return result
 
     @staticmethod
-    async def compress(input_path, output_path, level="medium"):
+    def compress(input_path, output_path, level="medium"):
         q = {"low": 30, "medium": 55, "high": 80}.get(level, 55)
-        with Image.open(input_path) as img:
+        with _open(input_path) as img:
             if img.mode in ("RGBA", "LA", "P"): img = img.convert("RGB")
-            img.save(output_path, format="JPEG", quality=q, optimize=True)
-        orig = input_path.stat().st_size
-        new = output_path.stat().st_size
+            result = _save(img, output_path, format="JPEG", quality=q, optimize=True)
+        orig = _size(input_path)
+        new = _size(result)
+        saved = round((1 - new / orig) * 100, 1) if orig > 0 else 0
+        return result, orig, new, saved
+
+    @staticmethod
+    def compress_to_size(input_path, output_path, target_bytes):
+        """Re-encode as JPEG at the highest quality that fits in `target_bytes`.
+
+        Quality is searched on a small in-memory proxy and confirmed with a
+        few full-size encodes. If even MIN_QUALITY is too big, the image is
+        downscaled instead. Returns (result, orig, new, saved, stats); stats
+        has the chosen quality and size, the probe encode counts and the
+        time spent.
+        """
+        start = time.perf_counter()
+        stats = {"proxy_encodes": 0, "full_encodes": 0}
+        with _open(input_path) as src:
+            img = src if src.mode in ("RGB", "L", "CMYK") else src.convert("RGB")
+            img.load()
+        proxy = _Proxy(img, stats)
+        best = _fit_quality(img, proxy, target_bytes, stats)
+        if not best:
+            best, img = _fit_scale(img, proxy.predict(DOWNSCALE_QUALITY), target_bytes, stats)
+        quality, data = best
+        if output_path is not None:
+            Path(output_path).write_bytes(data)
+        result = data if output_path is None else output_path
+        orig = _size(input_path)
+        new = len(data)
         saved = round((1 - new / orig) * 100, 1) if orig > 0 else 0
-        return output_path, orig, new, saved
+        stats.update(quality=quality, width=img.width, height=img.height,
+                     ms=int((time.perf_counter() - start) * 1000))
+        logger.info(f"Target-size compress: q{quality} {img.width}x{img.height}, "
+                    f"{stats['proxy_encodes']}+{stats['full_encodes']} encodes, {stats['ms']}ms")
+        return result, orig, new, saved, stats
 
     @staticmethod
-    async def grayscale(input_path, output_path):
-        with Image.open(input_path) as img:
+    def grayscale(input_path, output_path):
+        with _open(input_path) as img:
             gray = img.convert("L")
             fmt = img.format or "PNG"
-            gray.save(output_path, format=fmt, optimize=True)
-        return output_path
+            result = _save(gray, output_path, format=fmt, optimize=True)
+        return result
 
     @staticmethod
-    async def blur(input_path, output_path, level="medium"):
+    def blur(input_path, output_path, level="medium", budget_mb=JOB_MEMORY_MB):
         r = {"light": 5, "medium": 15, "heavy": 30}.get(level, 15)
-        with Image.open(input_path) as img:
-            blurred = img.filter(ImageFilter.GaussianBlur(radius=r))
-            fmt = img.format or "PNG"
-            if fmt.upper() == "JPEG" and blurred.mode in ("RGBA", "LA", "P"): blurred = blurred.convert("RGB")
-            blurred.save(output_path, format=fmt, optimize=True)
-        return output_path
+        return _tiled(input_path, output_path, lambda size: size,
+                      lambda img: image_tiles.blur_strips(img, r), budget_mb)
 
     @staticmethod
-    async def upscale(input_path, output_path, factor=2):
-        with Image.open(input_path) as img:
-            upscaled = img.resize((img.width * factor, img.height * factor), Image.LANCZOS)
-            fmt = img.format or "PNG"
-            if fmt.upper() == "JPEG" and upscaled.mode in ("RGBA", "LA", "P"): upscaled = upscaled.convert("RGB")
-            upscaled.save(output_path, format=fmt, optimize=True)
-        return output_path
+    def upscale(input_path, output_path, factor=2, budget_mb=JOB_MEMORY_MB):
+        return _tiled(input_path, output_path, lambda size: (size[0] * factor, size[1] * factor),
+                      lambda img: image_tiles.upscale_strips(img, factor), budget_mb, premultiply=True)
 
     @staticmethod
-    async def to_pdf(input_path, output_path):
-        with Image.open(input_path) as img:
+    def to_pdf(input_path, output_path):
+        with _open(input_path) as img:
             if img.mode in ("RGBA", "LA", "P"): img = img.convert("RGB")
-            img.save(output_path, format="PDF", resolution=100.0)
-        return output_path
+            result = _save(img, output_path, format="PDF", resolution=100.0)
+        return result
 
     @staticmethod
-    async def get_info(input_path):
-        with Image.open(input_path) as img:
+    def get_info(input_path):
+        with _open(input_path) as img:
             info = {"format": img.format or "Unknown", "mode": img.mode, "width": img.width, "height": img.height,
-                    "megapixels": round((img.width * img.height) / 1_000_000, 2), "size_bytes": input_path.stat().st_size}
+                    "megapixels": round((img.width * img.height) / 1_000_000, 2), "size_bytes": _size(input_path)}
             ex_c = 0; has_gps = False; cam = "Unknown"
             try:
                 exif = img._getexif()
@@ -133,30 +379,40 @@ class ImageService:
             return info
 
     @staticmethod
-    async def clean_screenshot(input_path, output_path):
-        with Image.open(input_path) as img:
-            cropped = img.crop((0, int(img.height * 0.06), img.width, img.height - int(img.height * 0.04)))
-            clean = Image.new(cropped.mode, cropped.size)
-            clean.putdata(list(cropped.getdata()))
+    def clean_screenshot(input_path, output_path):
+        with _open(input_path) as img:
+            clean = _bare(img.crop((0, int(img.height * 0.06), img.width, img.height - int(img.height * 0.04))))
             fmt = img.format or "PNG"
-            if fmt.upper() == "JPEG" and clean.mode in ("RGBA", "LA", "P"): clean = clean.convert("RGB")
-            clean.save(output_path, format=fmt, optimize=True)
-        return output_path
+            kwargs = {}
+            if fmt.upper() == "JPEG":
+                if clean.mode in ("RGBA", "LA", "P"): clean = clean.convert("RGB")
+                # Re-use the source's tables so the crop keeps its quality.
+                kwargs = {"qtables": img.quantization}
+                sampling = JpegImagePlugin.get_sampling(img)
+                if sampling >= 0: kwargs["subsampling"] = sampling
+            result = _save(clean, output_path, format=fmt, optimize=True, **kwargs)
+        return result
 
     @staticmethod
-    async def id_photo(input_path, output_path, size_type="passport"):
+    def id_photo(input_path, output_path, size_type="passport"):
         sz = {"passport": (413, 531), "visa": (600, 600), "stamp": (118, 148)}.get(size_type, (413, 531))
-        with Image.open(input_path) as img:
-            if img.mode in ("RGBA", "LA", "P"): img = img.convert("RGB")
+        with _open(input_path) as img:
             tr = sz[0]/sz[1]; ir = img.width/img.height
             if ir > tr:
                 nw = int(img.height * tr); l = (img.width - nw) // 2
-                img = img.crop((l, 0, l + nw, img.height))
+                crop = (l, 0, l + nw, img.height)
             else:
                 nh = int(img.width / tr); t = (img.height - nh) // 2
-                img = img.crop((0, t, img.width, t + nh))
-            img = img.resize(sz, Image.LANCZOS)
+                crop = (0, t, img.width, t + nh)
+            # Draft the whole image at the scale the crop needs, then map
+            # the crop into decoded coordinates.
+            k = sz[0] / (crop[2] - crop[0])
+            width = img.width
+            box = _draft(img, (max(1, int(img.width * k)), max(1, int(img.height * k))))
+            f = box[2] / width if box else 1
+            if img.mode in ("RGBA", "LA", "P"): img = img.convert("RGB")
+            img = img.resize(sz, Image.LANCZOS, box=tuple(c * f for c in crop), reducing_gap=3.0)
             brd = Image.new("RGB", (sz[0] + 20, sz[1] + 20), (255, 255, 255))
             brd.paste(img, (10, 10))
-            brd.save(output_path, format="JPEG", quality=95, optimize=True)
-        return output_path
+            result = _save(brd, output_path, format="JPEG", quality=95, optimize=True)
+        return result
@@ -0,0 +1,146 @@
+import io
+import math
+import zlib
+import struct
+from PIL import Image, ImageChops, ImageFilter
+
+MB = 1024 * 1024
+# Output is produced in full-width strips of about this many bytes.
+STRIP_BYTES = 4 * MB
+# Interpreter, Pillow and encoder state on top of pixel buffers.
+OVERHEAD_BYTES = 48 * MB
+# Modes written by the streaming PNG encoder, with their PNG colour type.
+PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "LA": 4, "RGBA": 6}
+# Premultiplied modes Pillow resamples alpha images in.
+PREMULTIPLIED = {"RGBA": "RGBa", "LA": "La"}
+# Pillow's GaussianBlur is three box passes that together reach about
+# 3 * radius; the extra rows cover rounding of the box sizes.
+HALO_SIGMAS = 3
+
+
+def frame_bytes(mode, size):
+    """Bytes Pillow allocates for an image; multi-band pixels take 4 bytes."""
+    per = 1 if mode in ("1", "L", "P") else 2 if mode.startswith("I;16") else 4
+    return size[0] * size[1] * per
+
+
+def _strip_rows(mode, width):
+    return max(1, STRIP_BYTES // max(1, frame_bytes(mode, (width, 1))))
+
+
+def _chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+class PngWriter:
+    """Encode an 8-bit PNG strip by strip, so the whole frame is never held.
+
+    Rows use the Up filter, computed in C by subtracting the strip shifted
+    down a row; it compresses as well as Pillow's adaptive filtering here.
+    """
+
+    def __init__(self, f, size, mode, icc=None, level=6):
+        self.f = f
+        self.width = size[0]
+        self.mode = mode
+        self.z = zlib.compressobj(level)
+        self.last = Image.new(mode, (self.width, 1))
+        ihdr = struct.pack(">IIBBBBB", size[0], size[1], 8, PNG_COLOR_TYPES[mode], 0, 0, 0)
+        f.write(b"\x89PNG\r\n\x1a\n" + _chunk(b"IHDR", ihdr))
+        if icc:
+            f.write(_chunk(b"iCCP", b"ICC Profile\0\0" + zlib.compress(icc)))
+
+    def write(self, strip):
+        above = Image.new(self.mode, strip.size)
+        above.paste(self.last, (0, 0))
+        above.paste(strip.crop((0, 0, self.width, strip.height - 1)), (0, 1))
+        self.last = strip.crop((0, strip.height - 1, self.width, strip.height))
+        data = memoryview(ImageChops.subtract_modulo(strip, above).tobytes())
+        stride = len(data) // strip.height
+        out = []
+        for i in range(0, len(data), stride):
+            out.append(self.z.compress(b"\x02"))
+            out.append(self.z.compress(data[i:i + stride]))
+        self._idat(b"".join(out))
+
+    def close(self):
+        self._idat(self.z.flush())
+        self.f.write(_chunk(b"IEND", b""))
+
+    def _idat(self, data):
+        if data:
+            self.f.write(_chunk(b"IDAT", data))
+
+
+def budget(mode, size, out_size, stream, in_memory, limit_mb, sources=1):
+    """Raise ValueError if a job is estimated to need more than `limit_mb`.
+
+    Only header fields are used, so this runs before anything is decoded.
+    `sources` decoded copies of the input are held; the output frame is
+    held unless it is streamed, and an in-memory PNG result takes at most
+    its raw size.
+    """
+    # A strip lives in a few copies at once: crop, filtered, encoder input.
+    need = sources * frame_bytes(mode, size) + 4 * min(STRIP_BYTES, frame_bytes(mode, out_size)) + OVERHEAD_BYTES
+    if not stream:
+        # The encoder's working copy comes on top; optimized JPEG keeps
+        # every DCT coefficient.
+        need += 2 * frame_bytes(mode, out_size)
+    elif in_memory:
+        need += frame_bytes(mode, out_size)
+    if need > limit_mb * MB:
+        raise ValueError(f"Image too large: {out_size[0]}x{out_size[1]} needs about "
+                         f"{math.ceil(need / MB)} MB, the limit is {limit_mb} MB")
+
+
+def upscale_strips(img, factor):
+    """Yield (y, strip) of `img` LANCZOS-upscaled by `factor`.
+
+    Each strip resamples its own source box; Pillow still reads the filter
+    support from outside the box, so strips match a full-frame resize.
+    """
+    w, h = img.width * factor, img.height * factor
+    rows = _strip_rows(img.mode, w)
+    # resize() premultiplies alpha on every call; do it once for the frame.
+    alpha = PREMULTIPLIED.get(img.mode)
+    src = img.convert(alpha) if alpha else img
+    for y in range(0, h, rows):
+        end = min(h, y + rows)
+        strip = src.resize((w, end - y), Image.LANCZOS, box=(0, y / factor, img.width, end / factor))
+        yield y, strip.convert(img.mode) if alpha else strip
+
+
+def blur_strips(img, radius):
+    """Yield (y, strip) of `img` Gaussian-blurred with `radius`.
+
+    Strips are blurred with a halo of neighbouring rows that is cropped
+    off again, so the result matches blurring the whole frame.
+    """
+    halo = math.ceil(HALO_SIGMAS * radius) + 2
+    # Tall enough that re-blurred halo rows stay a small share of the work.
+    rows = max(_strip_rows(img.mode, img.width), 4 * halo)
+    for y in range(0, img.height, rows):
+        end = min(img.height, y + rows)
+        top, bottom = max(0, y - halo), min(img.height, end + halo)
+        part = img.crop((0, top, img.width, bottom)).filter(ImageFilter.GaussianBlur(radius=radius))
+        yield y, part.crop((0, y - top, img.width, end - top))
+
+
+def write_png(strips, size, mode, dst, icc=None):
+    """Stream strips to `dst` as PNG; returns `dst`, or the bytes when it is None."""
+    with (open(dst, "wb") if dst is not None else io.BytesIO()) as f:
+        png = PngWriter(f, size, mode, icc)
+        for _, strip in strips:
+            png.write(strip)
+        png.close()
+        return dst if dst is not None else f.getvalue()
+
+
+def assemble(strips, size, mode, icc=None):
+    """Paste strips into one frame, for encoders that need the whole image."""
+    out = Image.new(mode, size)
+    if icc:
+        out.info["icc_profile"] = icc
+    for y, strip in strips:
+        out.paste(strip, (0, y))
+    return out
@@ -25,7 +25,9 @@ async def auto_cleanup_task(temp_dir):
             t_path = Path(temp_dir)
             if t_path.exists():
                 for item in t_path.iterdir():
-                    if item.is_file() and (now - item.stat().st_mtime) > 1800:
+                    # ctime also covers hard links into the download cache,
+                    # whose mtime is the cached file's.
+                    if item.is_file() and (now - max(item.stat().st_mtime, item.stat().st_ctime)) > 1800:
                         item.unlink()
                         count += 1
             if count > 0: logger.info(f"Auto-cleanup: Removed {count} old files")
@@ -35,7 +37,7 @@ async def auto_cleanup_task(temp_dir):
 async def main():
     logger.info("Starting FileForge Bot...")
     config = load_config()
-    bot, dp, db, fm = await setup_bot(config)
+    bot, dp, db, usage, fm, pool, office = await setup_bot(config)
 
     try: await bot.delete_webhook(drop_pending_updates=True)
     except: pass
@@ -49,7 +51,10 @@ async def main():
         await dp.start_polling(bot, allowed_updates=["message", "callback_query"], drop_pending_updates=True)
     except Exception as e: logger.critical(f"Polling error: {e}")
     finally:
+        await pool.shutdown()
+        await office.shutdown()
         fm.cleanup_all()
+        await usage.shutdown()
         await db.disconnect()
         await bot.session.close()
         logger.info("Shutdown complete.")
@@ -1,3 +1,4 @@
+import time
 from typing import Callable, Dict, Any, Awaitable
 
 from aiogram import BaseMiddleware
@@ -7,11 +8,60 @@ from app.config import BotConfig, logger
 from app.database import WhitelistRepo, SystemRepo
 
 
+class AccessCache:
+    """Whitelist rows and the maintenance flag, kept in memory for `ttl` seconds.
+
+    Unknown users are cached too, so a stranger spamming the bot costs one
+    query per TTL. Admin commands that change a user or the flag call
+    `invalidate` so the change applies on the next update.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, whitelist, system, ttl=60):
+        self.whitelist = whitelist
+        self.system = system
+        self.ttl = ttl
+        self._users = {}
+        self._maintenance = None
+        self.hits = 0
+        self.misses = 0
+
+    async def user(self, user_id):
+        entry = self._users.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        user = await self.whitelist.get_user(user_id)
+        if len(self._users) > 10000:
+            self._users.clear()
+        self._users[user_id] = (time.monotonic() + self.ttl, user)
+        return user
+
+    async def maintenance(self):
+        if self._maintenance and self._maintenance[0] > time.monotonic():
+            return self._maintenance[1]
+        value = await self.system.get_stat("maintenance_mode", "0") == "1"
+        self._maintenance = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self, user_id=None):
+        if user_id is None:
+            self._users.clear()
+        else:
+            self._users.pop(user_id, None)
+
+    def invalidate_maintenance(self):
+        self._maintenance = None
+
+
 class AccessMiddleware(BaseMiddleware):
-    def __init__(self, config, whitelist, system):
+    def __init__(self, config, whitelist, system, access=None):
         self.config = config
         self.whitelist = whitelist
         self.system = system
+        self.access = access or AccessCache(whitelist, system)
         super().__init__()
 
     async def __call__(self, handler, event, data):
@@ -27,31 +77,28 @@ class AccessMiddleware(BaseMiddleware):
         if user_id == self.config.admin_id:
             return await handler(event, data)
 
-        maintenance = await self.system.get_stat("maintenance_mode", "0")
-        if maintenance == "1":
+        if await self.access.maintenance():
             if isinstance(event, Message):
                 await event.reply("Bot is under maintenance. Try again later.")
             elif isinstance(event, CallbackQuery):
                 await event.answer("Bot is under maintenance.", show_alert=True)
             return
 
-        if not await self.whitelist.is_whitelisted(user_id):
+        user = await self.access.user(user_id)
+        if user is None or not user["is_active"]:
             if isinstance(event, Message) and event.text and event.text.startswith("/start"):
                 await event.reply(
                     f"Welcome! You're not authorized yet.\nContact admin.\n\nYour ID: {user_id}"
                 )
             return
 
-        if await self.whitelist.is_suspended(user_id):
+        if user["is_suspended"]:
             if isinstance(event, Message):
                 await event.reply("Your account is suspended. Contact admin.")
             elif isinstance(event, CallbackQuery):
                 await event.answer("Account suspended.", show_alert=True)
             return
 
-        if isinstance(event, CallbackQuery) and event.data and event.data != "cancel":
-            if not await self.whitelist.check_daily_limit(user_id):
-                await event.answer("Daily limit reached. Try tomorrow.", show_alert=True)
-                return
-
+        # The daily limit is enforced by the atomic reservation each job
+        # takes before it starts, so button presses cost no query here.
         return await handler(event, data)
@@ -0,0 +1,243 @@
+import asyncio
+import shutil
+from pathlib import Path
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    HAS_UNO = True
+except ImportError:
+    HAS_UNO = False
+
+from app.config import logger
+
+SOFFICE = shutil.which("soffice") or shutil.which("libreoffice")
+
+
+def _props(**kwargs):
+    return tuple(PropertyValue(Name=k, Value=v) for k, v in kwargs.items())
+
+
+class OfficeInstance:
+    """One long-lived headless LibreOffice with its own user profile.
+
+    With the `uno` bridge available, documents are converted over a UNO
+    socket so the soffice start-up cost is paid once. Without it, each call
+    falls back to a single `--convert-to` run, which still allows several
+    instances to work in parallel because their profiles never collide.
+    """
+
+    def __init__(self, index, profile_root, port):
+        self.index = index
+        self.profile = Path(profile_root).resolve() / f"lo_{index}"
+        self.port = port
+        self.proc = None
+        self.desktop = None
+        self.busy = False
+
+    @property
+    def _profile_arg(self):
+        return f"-env:UserInstallation={self.profile.as_uri()}"
+
+    async def start(self):
+        self.profile.mkdir(parents=True, exist_ok=True)
+        if not HAS_UNO:
+            return
+        self.proc = await asyncio.create_subprocess_exec(
+            SOFFICE, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+            "--nofirststartwizard", self._profile_arg,
+            f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext",
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        )
+        for _ in range(60):
+            try:
+                self.desktop = await asyncio.to_thread(self._connect)
+                logger.info(f"LibreOffice #{self.index} ready on port {self.port}")
+                return
+            except Exception:
+                if self.proc.returncode is not None:
+                    break
+                await asyncio.sleep(0.5)
+        await self.stop()
+        raise RuntimeError(f"LibreOffice #{self.index} failed to start")
+
+    def _connect(self):
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local)
+        ctx = resolver.resolve(
+            f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext")
+        return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+
+    async def stop(self):
+        self.desktop = None
+        if self.proc and self.proc.returncode is None:
+            self.proc.kill()
+            await self.proc.wait()
+        self.proc = None
+
+    async def restart(self):
+        logger.warning(f"Restarting LibreOffice #{self.index}")
+        await self.stop()
+        await self.start()
+
+    async def healthy(self, timeout=10):
+        if not HAS_UNO:
+            return True
+        if not self.desktop or not self.proc or self.proc.returncode is not None:
+            return False
+        try:
+            await asyncio.wait_for(asyncio.to_thread(lambda: self.desktop.getFrames().getCount()), timeout)
+            return True
+        except Exception:
+            return False
+
+    async def convert(self, jobs, timeout):
+        """Convert [(input_path, output_path), ...] to PDF in one go."""
+        if HAS_UNO:
+            if not self.desktop:
+                raise Exception(f"LibreOffice #{self.index} is not running")
+            await asyncio.wait_for(asyncio.to_thread(self._convert_uno, jobs), timeout)
+        else:
+            await self._convert_cli(jobs, timeout)
+
+    def _convert_uno(self, jobs):
+        for inp, out in jobs:
+            doc = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(str(Path(inp).resolve())), "_blank", 0,
+                _props(Hidden=True, ReadOnly=True))
+            try:
+                doc.storeToURL(uno.systemPathToFileUrl(str(Path(out).resolve())),
+                               _props(FilterName="writer_pdf_Export"))
+            finally:
+                doc.close(True)
+
+    async def _convert_cli(self, jobs, timeout):
+        out_dir = self.profile / "out"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        proc = await asyncio.create_subprocess_exec(
+            SOFFICE, "--headless", "--norestore", self._profile_arg,
+            "--convert-to", "pdf", "--outdir", str(out_dir), *[str(inp) for inp, _ in jobs],
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode != 0:
+            raise Exception(f"Conversion failed: {stderr.decode(errors='replace')[:200]}")
+        for inp, out in jobs:
+            generated = out_dir / f"{Path(inp).stem}.pdf"
+            if generated.exists():
+                shutil.move(str(generated), str(out))
+
+
+class OfficePool:
+    """Queue of DOCX → PDF conversions served by warm LibreOffice instances.
+
+    Requests that pile up while every instance is busy are coalesced into
+    one batch per instance and converted back to back, each document with
+    its own timeout. A hung document fails alone and restarts its instance;
+    a periodic health check restarts any instance that stops answering.
+    """
+
+    def __init__(self, size=1, profile_root="tmp/office", timeout=120, base_port=2002, batch_max=8):
+        self.size = max(1, size)
+        self.profile_root = profile_root
+        self.timeout = timeout
+        self.base_port = base_port
+        self.batch_max = batch_max
+        self._queue = asyncio.Queue()
+        self._instances = []
+        self._tasks = []
+
+    async def start(self):
+        if not SOFFICE:
+            logger.warning("LibreOffice not found, DOCX → PDF disabled")
+            return
+        self._instances = [
+            OfficeInstance(i, self.profile_root, self.base_port + i) for i in range(self.size)
+        ]
+        results = await asyncio.gather(*(inst.start() for inst in self._instances), return_exceptions=True)
+        for inst, result in zip(self._instances, results):
+            if isinstance(result, Exception):
+                logger.error(f"LibreOffice #{inst.index}: {result}")
+        self._tasks = [asyncio.create_task(self._serve(inst)) for inst in self._instances]
+        self._tasks.append(asyncio.create_task(self._health_loop()))
+        logger.info(f"Office pool ready ({self.size} instances, {'UNO' if HAS_UNO else 'CLI'} mode)")
+
+    async def convert(self, input_path, output_path):
+        if not self._instances:
+            raise Exception("LibreOffice is not available")
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((input_path, output_path, fut))
+        await fut
+        if not Path(output_path).exists():
+            raise Exception("PDF file was not generated")
+        logger.info("DOCX converted to PDF via LibreOffice")
+        return output_path
+
+    async def _serve(self, inst):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_max and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            batch = [job for job in batch if not job[2].done()]
+            if not batch:
+                continue
+            inst.busy = True
+            try:
+                await self._recover(inst)
+                for inp, out, fut in batch:
+                    if not fut.done():
+                        await self._convert_one(inst, inp, out, fut)
+            finally:
+                inst.busy = False
+
+    async def _convert_one(self, inst, inp, out, fut):
+        """Convert one document of a batch under its own timeout, so a hung
+        document fails alone and the rest of the batch carries on."""
+        try:
+            await inst.convert([(inp, out)], self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"LibreOffice #{inst.index} timed out on {Path(inp).name}")
+            if not fut.done():
+                fut.set_exception(Exception(f"Conversion timed out ({self.timeout}s limit)"))
+            # The instance is still busy with the stuck document.
+            try:
+                await inst.restart()
+            except Exception as e:
+                logger.error(f"LibreOffice #{inst.index} restart failed: {e}")
+            return
+        except Exception as e:
+            logger.error(f"LibreOffice #{inst.index} failed on {Path(inp).name}: {e}")
+            if not fut.done():
+                fut.set_exception(e)
+            await self._recover(inst)
+            return
+        if not fut.done():
+            fut.set_result(None)
+
+    async def _recover(self, inst):
+        if await inst.healthy():
+            return
+        try:
+            await inst.restart()
+        except Exception as e:
+            logger.error(f"LibreOffice #{inst.index} restart failed: {e}")
+
+    async def _health_loop(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            for inst in self._instances:
+                # Busy instances are checked by _serve before their next batch.
+                if not inst.busy:
+                    await self._recover(inst)
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*(inst.stop() for inst in self._instances), return_exceptions=True)
+        logger.info("Office pool stopped")
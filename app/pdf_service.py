@@ -1,17 +1,71 @@
+import io
+import os
+import math
 from pathlib import Path
 from typing import List
 
 from pypdf import PdfReader, PdfWriter
 import pdfplumber
 import fitz
+from PIL import Image
 
 from app.config import logger
 
 
+# Embedded raster images are brought down to `dpi` and re-encoded as JPEG
+# at `quality`, or as JPEG 2000 at compression ratio `rate`.
+COMPRESS_PROFILES = {
+    "fast": {"dpi": 150, "format": "jpeg", "quality": 80, "garbage": 3, "clean": False},
+    "balanced": {"dpi": 150, "format": "jpeg", "quality": 65, "garbage": 4, "clean": True},
+    "max": {"dpi": 100, "format": "jpx", "rate": 50, "garbage": 4, "clean": True},
+}
+
+def _recodable(doc, xref):
+    get = lambda key: doc.xref_get_key(xref, key)
+    if get("Subtype")[1] != "/Image" or get("ImageMask")[1] == "true":
+        return False
+    if get("BitsPerComponent")[1] == "1":
+        return False
+    if any(get(key)[0] != "null" for key in ("SMask", "Mask", "Decode")):
+        return False
+    return int(get("Width")[1] or 0) * int(get("Height")[1] or 0) >= 64 * 64
+
+
+def _load_image(doc, xref, size):
+    """Decode an image xref as an L or RGB Pillow image. JPEG streams go
+    through Pillow's draft mode, which decodes at a reduced scale that is
+    still at least `size`."""
+    if doc.xref_get_key(xref, "Filter")[1] == "/DCTDecode":
+        img = Image.open(io.BytesIO(doc.xref_stream_raw(xref)))
+        img.draft("L" if img.mode == "L" else "RGB", size)
+        return img.convert("L" if img.mode == "L" else "RGB")
+    pix = fitz.Pixmap(doc, xref)
+    if pix.alpha or pix.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix, 0)
+    return Image.frombytes("L" if pix.n == 1 else "RGB", (pix.width, pix.height), pix.samples)
+
+
+def _text_fitz(input_path, first, last):
+    with fitz.open(str(input_path)) as doc:
+        for i in range(first, min(last, len(doc))):
+            yield i, doc[i].get_text()
+
+
+def _text_plumber(input_path, first, last):
+    with pdfplumber.open(input_path) as pdf:
+        for i in range(first, min(last, len(pdf.pages))):
+            page = pdf.pages[i]
+            yield i, page.extract_text()
+            page.close()
+
+
+TEXT_ENGINES = {"fast": _text_fitz, "layout": _text_plumber}
+
+
 class PDFService:
 
     @staticmethod
-    async def remove_metadata(input_path, output_path):
+    def remove_metadata(input_path, output_path):
         reader = PdfReader(input_path)
         writer = PdfWriter()
 
@@ -27,26 +81,26 @@ class PDFService:
         return output_path
 
     @staticmethod
-    async def extract_text(input_path):
-        parts = []
-        with pdfplumber.open(input_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text()
-                if text:
-                    parts.append(f"--- Page {i + 1} ---\n{text}")
-        result = "\n\n".join(parts)
-        if not result.strip():
-            result = "No extractable text found."
-        logger.info(f"PDF text extracted: {len(result)} chars")
-        return result
+    def extract_text_range(input_path, first, last, engine="fast"):
+        """Text of pages [first, last) as "--- Page N ---" blocks.
+
+        `fast` reads the text layer with PyMuPDF; `layout` uses pdfplumber,
+        which is far slower but keeps columns and spacing closer to the page.
+        """
+        blocks = []
+        for i, text in TEXT_ENGINES[engine](input_path, first, last):
+            if text and text.strip():
+                blocks.append(f"--- Page {i + 1} ---\n{text.strip()}")
+        return "\n\n".join(blocks)
 
     @staticmethod
-    async def extract_images(input_path, output_dir):
+    def extract_images_range(input_path, output_dir, first, last):
+        """Extract embedded images from pages [first, last)."""
         output_dir.mkdir(parents=True, exist_ok=True)
         paths = []
         doc = fitz.open(str(input_path))
         try:
-            for page_num in range(len(doc)):
+            for page_num in range(first, min(last, len(doc))):
                 page = doc[page_num]
                 images = page.get_images(full=True)
                 for idx, img in enumerate(images):
@@ -60,39 +114,68 @@ class PDFService:
                         logger.warning(f"Image extract failed: {e}")
         finally:
             doc.close()
-        logger.info(f"PDF images extracted: {len(paths)}")
         return paths
 
     @staticmethod
-    async def split_pages(input_path, output_dir):
+    def split_range(input_path, output_dir, first, last):
+        """Write pages [first, last) as one single-page PDF each."""
         output_dir.mkdir(parents=True, exist_ok=True)
         paths = []
         reader = PdfReader(input_path)
-        for i, page in enumerate(reader.pages):
+        for i in range(first, min(last, len(reader.pages))):
             writer = PdfWriter()
-            writer.add_page(page)
-            page_path = output_dir / f"page_{i + 1}.pdf"
+            writer.add_page(reader.pages[i])
+            page_path = output_dir / f"page_{i + 1:04d}.pdf"
             with open(page_path, "wb") as f:
                 writer.write(f)
             paths.append(page_path)
-        logger.info(f"PDF split: {len(paths)} pages")
         return paths
 
     @staticmethod
-    async def merge(input_paths, output_path):
-        writer = PdfWriter()
-        for path in input_paths:
-            reader = PdfReader(path)
-            for page in reader.pages:
-                writer.add_page(page)
+    def prepare_merge(input_path):
+        """Validate a PDF queued for merging and return its page count.
+
+        A file PyMuPDF had to repair is rewritten clean now, so the final
+        merge does not repeat the repair.
+        """
+        with fitz.open(str(input_path)) as doc:
+            if doc.needs_pass:
+                raise Exception("it is password-protected")
+            if not len(doc):
+                raise Exception("it has no pages")
+            pages = len(doc)
+            repaired = doc.is_repaired
+            if repaired:
+                doc.save(f"{input_path}.clean", garbage=1)
+        if repaired:
+            os.replace(f"{input_path}.clean", input_path)
+        return pages
 
-        with open(output_path, "wb") as f:
-            writer.write(f)
+    @staticmethod
+    def merge(input_paths, output_path, selections=None):
+        """Concatenate PDFs; `selections[i]` limits file i to a list of
+        0-based inclusive (first, last) page ranges. A path may repeat."""
+        out = fitz.open()
+        docs = {}
+        try:
+            for path, ranges in zip(input_paths, selections or [None] * len(input_paths)):
+                src = docs.get(path)
+                if src is None:
+                    src = docs[path] = fitz.open(str(path))
+                for first, last in ranges or [(0, len(src) - 1)]:
+                    out.insert_pdf(src, from_page=first, to_page=last)
+            # garbage=4 also merges identical streams, so a font or logo
+            # embedded in every source file is stored once.
+            out.save(str(output_path), garbage=4, deflate=True)
+        finally:
+            for src in docs.values():
+                src.close()
+            out.close()
         logger.info(f"PDF merged: {len(input_paths)} files")
         return output_path
 
     @staticmethod
-    async def protect(input_path, output_path, password):
+    def protect(input_path, output_path, password):
         reader = PdfReader(input_path)
         writer = PdfWriter()
 
@@ -108,7 +191,7 @@ class PDFService:
         return output_path
 
     @staticmethod
-    async def remove_password(input_path, output_path, password):
+    def remove_password(input_path, output_path, password):
         reader = PdfReader(input_path)
         if reader.is_encrypted:
             try:
@@ -130,78 +213,171 @@ class PDFService:
         return output_path, True
 
     @staticmethod
-    async def to_images(input_path, output_dir, dpi=150):
+    def page_count(input_path):
+        with fitz.open(str(input_path)) as doc:
+            return len(doc)
+
+    @staticmethod
+    def render_pages(input_path, output_dir, first, last, fmt="png", dpi=150, gray=False):
+        """Render pages [first, last) to images; safe to run as one shard of many.
+
+        JPEG and WebP are encoded by Pillow straight from the pixmap, so they
+        never pay for a PNG encode (Pillow's JPEG encoder is also several
+        times faster than MuPDF's).
+        """
         output_dir.mkdir(parents=True, exist_ok=True)
+        fmt = fmt.lower()
+        mat = fitz.Matrix(dpi / 72, dpi / 72)
+        colorspace = fitz.csGRAY if gray else fitz.csRGB
         paths = []
         doc = fitz.open(str(input_path))
         try:
-            for i in range(len(doc)):
-                page = doc[i]
-                mat = fitz.Matrix(dpi / 72, dpi / 72)
-                pix = page.get_pixmap(matrix=mat)
-                img_path = output_dir / f"page_{i + 1}.png"
-                pix.save(str(img_path))
+            for i in range(first, min(last, len(doc))):
+                pix = doc[i].get_pixmap(matrix=mat, colorspace=colorspace, alpha=False)
+                img_path = output_dir / f"page_{i + 1:04d}.{'jpg' if fmt == 'jpeg' else fmt}"
+                if fmt == "webp":
+                    pix.pil_save(str(img_path), format="WEBP", quality=80, method=2)
+                elif fmt == "jpeg":
+                    pix.pil_save(str(img_path), format="JPEG", quality=85)
+                else:
+                    pix.save(str(img_path))
                 paths.append(img_path)
         finally:
             doc.close()
-        logger.info(f"PDF to images: {len(paths)} pages")
         return paths
 
     @staticmethod
-    async def get_info(input_path):
-        info = {
-            "size_bytes": input_path.stat().st_size,
-        }
-        with pdfplumber.open(input_path) as pdf:
-            info["pages"] = len(pdf.pages)
-            info["metadata"] = {}
-            if pdf.metadata:
-                for k, v in pdf.metadata.items():
-                    if v:
-                        info["metadata"][k] = str(v)[:100]
-
-        # Check if encrypted
-        reader = PdfReader(input_path)
-        info["encrypted"] = reader.is_encrypted
+    def probe(input_path):
+        """Everything the handlers ask about a PDF, gathered in one open.
+
+        Reads only the xref and page resources, never page content, so it
+        stays cheap on large files. A PDF is `scanned` when it has images
+        but no page uses a font, i.e. there is no text layer to extract.
+        """
+        info = {"size_bytes": Path(input_path).stat().st_size}
+        with fitz.open(str(input_path)) as doc:
+            meta = doc.metadata or {}
+            info["pages"] = len(doc)
+            info["encrypted"] = bool(doc.needs_pass or meta.get("encryption"))
+            info["format"] = meta.get("format", "")
+            info["metadata"] = {
+                k: str(v)[:100] for k, v in meta.items() if v and k not in ("format", "encryption")
+            }
+            sizes, fonts = [], set()
+            images = text_pages = 0
+            if not doc.needs_pass:
+                for page in doc:
+                    sizes.append((round(page.rect.width, 1), round(page.rect.height, 1)))
+                    page_fonts = page.get_fonts(full=True)
+                    fonts.update(f[0] for f in page_fonts)
+                    images += len(page.get_images(full=True))
+                    text_pages += bool(page_fonts)
+        info["page_sizes"] = sizes
+        info["images"] = images
+        info["fonts"] = len(fonts)
+        info["text_pages"] = text_pages
+        info["scanned"] = bool(sizes) and images > 0 and text_pages == 0
+        return info
 
-        # Get page dimensions
-        try:
-            doc = fitz.open(str(input_path))
-            if len(doc) > 0:
-                page = doc[0]
-                rect = page.rect
-                info["width"] = round(rect.width * 25.4 / 72, 1)
-                info["height"] = round(rect.height * 25.4 / 72, 1)
-            doc.close()
-        except Exception:
-            info["width"] = 0
-            info["height"] = 0
+    @staticmethod
+    def compress_plan(input_path, profile="balanced"):
+        """Raster images worth re-encoding under `profile`, as
+        [(xref, scale, stream_bytes), ...], largest first.
+
+        `scale` brings the image down to the profile DPI at the largest
+        size it is drawn on its pages. Placements are matched to xrefs by
+        pixel size, which avoids hashing every image; a mismatch can only
+        make the estimate more conservative. Bilevel images, masks and
+        images with transparency or decode arrays are left alone.
+        """
+        opts = COMPRESS_PROFILES[profile]
+        with fitz.open(str(input_path)) as doc:
+            shown = {}
+            for page in doc:
+                drawn = {}
+                for info in page.get_image_info():
+                    a, b, c, d = info["transform"][:4]
+                    w_in, h_in = math.hypot(a, b) / 72, math.hypot(c, d) / 72
+                    if w_in > 0 and h_in > 0:
+                        key = (info["width"], info["height"])
+                        dpi = max(info["width"] / w_in, info["height"] / h_in)
+                        drawn[key] = min(drawn.get(key, dpi), dpi)
+                for img in page.get_images(full=True):
+                    xref, dpi = img[0], drawn.get((img[2], img[3]))
+                    if dpi:
+                        shown[xref] = min(shown.get(xref, dpi), dpi)
+            plan = []
+            for xref, dpi in shown.items():
+                if not _recodable(doc, xref):
+                    continue
+                scale = min(1.0, opts["dpi"] / dpi) if opts["dpi"] else 1.0
+                plan.append((xref, scale, len(doc.xref_stream_raw(xref) or b"")))
+        plan.sort(key=lambda job: job[2], reverse=True)
+        return plan
 
-        logger.info("PDF info retrieved")
-        return info
+    @staticmethod
+    def recompress_images(input_path, jobs, profile="balanced"):
+        """Re-encode [(xref, scale, size), ...]; safe to run as one shard of
+        many. Returns [(xref, data, width, height, mode), ...] for images
+        that came out smaller."""
+        opts = COMPRESS_PROFILES[profile]
+        results = []
+        with fitz.open(str(input_path)) as doc:
+            for xref, scale, size in jobs:
+                try:
+                    width = int(doc.xref_get_key(xref, "Width")[1])
+                    height = int(doc.xref_get_key(xref, "Height")[1])
+                    size_out = (max(1, round(width * scale)), max(1, round(height * scale)))
+                    img = _load_image(doc, xref, size_out)
+                    if img.size != size_out:
+                        img = img.resize(size_out, Image.BICUBIC, reducing_gap=2.0)
+                    buf = io.BytesIO()
+                    if opts["format"] == "jpx":
+                        img.save(buf, "JPEG2000", quality_mode="rates", quality_layers=[opts["rate"]])
+                    else:
+                        img.save(buf, "JPEG", quality=opts["quality"])
+                    data = buf.getvalue()
+                    if len(data) < size * 0.9:
+                        results.append((xref, data, img.width, img.height, img.mode))
+                except Exception as e:
+                    logger.warning(f"Image {xref} not re-encoded: {e}")
+        return results
 
     @staticmethod
-    async def compress(input_path, output_path):
+    def compress(input_path, output_path, profile="balanced", images=None, linear=False):
+        """Write `input_path` with re-encoded `images` (from
+        recompress_images) swapped in and unused objects dropped."""
+        opts = COMPRESS_PROFILES[profile]
         doc = fitz.open(str(input_path))
         try:
-            doc.save(
-                str(output_path),
-                garbage=4,
-                deflate=True,
-                clean=True,
-                linear=True,
-            )
+            fmt = "/JPXDecode" if opts["format"] == "jpx" else "/DCTDecode"
+            for xref, data, width, height, mode in images or []:
+                doc.update_stream(xref, data, compress=0)
+                doc.xref_set_key(xref, "Filter", fmt)
+                doc.xref_set_key(xref, "DecodeParms", "null")
+                doc.xref_set_key(xref, "Width", str(width))
+                doc.xref_set_key(xref, "Height", str(height))
+                doc.xref_set_key(xref, "BitsPerComponent", "8")
+                doc.xref_set_key(xref, "ColorSpace", "/DeviceGray" if mode == "L" else "/DeviceRGB")
+            save = dict(garbage=opts["garbage"], deflate=True, clean=opts["clean"])
+            try:
+                doc.save(str(output_path), linear=linear, **save)
+            except Exception as e:
+                if not linear:
+                    raise
+                logger.warning(f"Linearized save failed ({e}), saving without it")
+                doc.save(str(output_path), **save)
         finally:
             doc.close()
 
         original_size = input_path.stat().st_size
         new_size = output_path.stat().st_size
         saved = round((1 - new_size / original_size) * 100, 1) if original_size > 0 else 0
-        logger.info(f"PDF compressed: saved {saved}%")
+        logger.info(f"PDF compressed ({profile}, {len(images or [])} images): saved {saved}%")
         return output_path, original_size, new_size, saved
 
     @staticmethod
-    async def rotate_pages(input_path, output_path, angle=90):
+    def rotate_pages(input_path, output_path, angle=90):
         reader = PdfReader(input_path)
         writer = PdfWriter()
 
@@ -216,7 +392,7 @@ class PDFService:
         return output_path
 
     @staticmethod
-    async def extract_page_range(input_path, output_path, start, end):
+    def extract_page_range(input_path, output_path, start, end):
         reader = PdfReader(input_path)
         total = len(reader.pages)
         if start < 1:
@@ -237,7 +413,7 @@ class PDFService:
         return output_path, start, end
 
     @staticmethod
-    async def images_to_pdf(image_paths, output_path):
+    def images_to_pdf(image_paths, output_path):
         from PIL import Image
 
         images = []
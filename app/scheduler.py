@@ -0,0 +1,101 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Share of one core a job keeps busy. Tools are matched by name, then by
+# prefix ("resize_50" -> "resize"); anything not listed counts as a full core.
+JOB_WEIGHTS = {
+    "image": {
+        "info": 0.25, "remove_metadata": 0.5, "grayscale": 0.5, "resize": 0.5,
+        "to": 0.5, "compress": 0.5, "clean_screenshot": 0.5, "id": 0.5,
+    },
+    "pdf": {
+        "info": 0.25, "remove_metadata": 0.5, "rotate": 0.5, "protect": 0.5,
+        "unlock": 0.5, "extract_pages": 0.5, "merge_prepare": 0.25,
+    },
+    "docx": {
+        "info": 0.25, "word_count": 0.25, "extract_text": 0.25, "remove_metadata": 0.25,
+        "remove_comments": 0.25, "extract_images": 0.25, "extract_tables": 0.25,
+    },
+}
+
+# Inputs this large double the weight of a light job.
+SIZE_UNIT = 10 * 1024 * 1024
+
+
+class JobScheduler:
+    """Weighted admission control for CPU-bound jobs.
+
+    Capacity is measured in cores. A job holds its weight only while it is
+    running in the worker pool, so downloads and uploads never block other
+    users. No single category may take more than `category_share` of the
+    capacity, which keeps a burst of PDF renders from locking out a quick
+    image job.
+    """
+
+    def __init__(self, capacity=2, category_share=0.75):
+        self.capacity = float(max(1, capacity))
+        self.category_limit = max(1.0, self.capacity * category_share)
+        self._used = 0.0
+        self._by_category = {}
+        self._waiters = deque()
+
+    def estimate(self, category, tool, file_size=0):
+        table = JOB_WEIGHTS.get(category, {})
+        key = tool
+        while key and key not in table:
+            key = key.rpartition("_")[0]
+        weight = table.get(key, 1.0)
+        return min(1.0, weight * (1 + (file_size or 0) / SIZE_UNIT))
+
+    @asynccontextmanager
+    async def slot(self, category, tool, file_size=0, weight=None):
+        if weight is None:
+            weight = self.estimate(category, tool, file_size)
+        weight = min(max(weight, 0.05), self.capacity, self.category_limit)
+        fut = asyncio.get_running_loop().create_future()
+        entry = (fut, category, weight)
+        self._waiters.append(entry)
+        self._wake()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release(category, weight)
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                self._wake()
+            raise
+        try:
+            yield
+        finally:
+            self._release(category, weight)
+
+    def _release(self, category, weight):
+        self._used = max(0.0, self._used - weight)
+        self._by_category[category] = max(0.0, self._by_category.get(category, 0.0) - weight)
+        self._wake()
+
+    def _wake(self):
+        for entry in list(self._waiters):
+            fut, category, weight = entry
+            if fut.done():
+                self._waiters.remove(entry)
+                continue
+            if self._by_category.get(category, 0.0) + weight > self.category_limit + 1e-9:
+                continue
+            if self._used + weight > self.capacity + 1e-9:
+                # Hold the remaining capacity for this job so that heavy
+                # jobs are not starved by a stream of light ones.
+                break
+            self._waiters.remove(entry)
+            self._used += weight
+            self._by_category[category] = self._by_category.get(category, 0.0) + weight
+            fut.set_result(None)
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "used": round(self._used, 2),
+            "queued": len(self._waiters),
+        }
@@ -0,0 +1,142 @@
+import asyncio
+import multiprocessing
+
+from app.config import logger
+
+
+class JobTimeoutError(Exception):
+    pass
+
+
+class WorkerCrashedError(Exception):
+    pass
+
+
+def _worker_main(conn):
+    # Pay the heavy imports (Pillow, PyMuPDF, pypdf, pdfplumber, python-docx)
+    # once per worker instead of once per job.
+    import app.image_service  # noqa: F401
+    import app.pdf_service  # noqa: F401
+    import app.docx_service  # noqa: F401
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if msg is None:
+            break
+        fn, args, kwargs = msg
+        try:
+            conn.send(("ok", fn(*args, **kwargs)))
+        except Exception as e:
+            try:
+                conn.send(("err", e))
+            except Exception:
+                conn.send(("err", RuntimeError(f"{type(e).__name__}: {e}")))
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        self.proc.start()
+        child.close()
+        self.jobs = 0
+
+    def call(self, fn, args, kwargs, timeout):
+        self.jobs += 1
+        try:
+            self.conn.send((fn, args, kwargs))
+        except (BrokenPipeError, ConnectionError):
+            raise WorkerCrashedError(f"Worker died (exit code {self.proc.exitcode})")
+        if not self.conn.poll(timeout):
+            raise JobTimeoutError(f"Job timed out ({timeout}s limit)")
+        try:
+            status, value = self.conn.recv()
+        except (EOFError, ConnectionError):
+            self.proc.join(1)
+            raise WorkerCrashedError(f"Worker crashed (exit code {self.proc.exitcode})")
+        if status == "err":
+            raise value
+        return value
+
+    def stop(self, timeout=5):
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.proc.join(timeout)
+        self.kill()
+
+    def kill(self):
+        if self.proc.is_alive():
+            self.proc.kill()
+            self.proc.join(1)
+        self.conn.close()
+
+
+class WorkerPool:
+    """Runs blocking service calls in separate processes.
+
+    Each job gets a whole worker, so a crash or a hung job only takes down
+    that worker, which is replaced before the next job is handed out.
+    """
+
+    def __init__(self, size=2, timeout=300, max_jobs=50):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = asyncio.Queue()
+        self._workers = set()
+        self._pending = set()
+        self._closed = False
+
+    async def start(self):
+        for _ in range(self.size):
+            self._idle.put_nowait(await self._spawn())
+        logger.info(f"Worker pool ready ({self.size} workers)")
+
+    async def _spawn(self):
+        worker = await asyncio.to_thread(_Worker, self._ctx)
+        self._workers.add(worker)
+        return worker
+
+    async def _retire(self, worker, graceful=True):
+        self._workers.discard(worker)
+        await asyncio.to_thread(worker.stop if graceful else worker.kill)
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        if self._closed:
+            raise RuntimeError("Worker pool is shut down")
+        worker = await self._idle.get()
+        healthy = False
+        try:
+            result = await asyncio.to_thread(worker.call, fn, args, kwargs, timeout or self.timeout)
+            healthy = True
+            return result
+        except (JobTimeoutError, WorkerCrashedError) as e:
+            logger.warning(f"Worker {worker.proc.pid} lost on {fn.__qualname__}: {e}")
+            raise
+        except Exception:
+            healthy = True
+            raise
+        finally:
+            if healthy and not self._closed and worker.jobs < self.max_jobs:
+                self._idle.put_nowait(worker)
+            else:
+                task = asyncio.create_task(self._replace(worker, healthy))
+                self._pending.add(task)
+                task.add_done_callback(self._pending.discard)
+
+    async def _replace(self, worker, graceful):
+        await self._retire(worker, graceful)
+        if not self._closed:
+            self._idle.put_nowait(await self._spawn())
+
+    async def shutdown(self):
+        self._closed = True
+        await asyncio.gather(*(self._retire(w) for w in list(self._workers)), return_exceptions=True)
+        logger.info("Worker pool stopped")
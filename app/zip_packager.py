@@ -0,0 +1,110 @@
+import time
+import shutil
+import asyncio
+import zipfile
+from pathlib import Path
+
+from app.config import logger
+
+# Bots may upload at most 50 MB through the cloud Bot API.
+UPLOAD_LIMIT = 50 * 1024 * 1024
+
+# Members that deflate would only burn CPU on.
+STORED_EXTS = {
+    ".png", ".jpg", ".jpeg", ".webp", ".gif", ".pdf", ".zip",
+    ".docx", ".xlsx", ".pptx", ".mp3", ".mp4",
+}
+DEFLATED_EXTS = {".txt", ".csv", ".json", ".xml", ".html", ".md", ".svg", ".bmp", ".tif", ".tiff"}
+
+# Local header + central directory entry, with room for extra fields.
+_ENTRY_OVERHEAD = 2 * 64
+
+
+def compression_for(name):
+    suffix = Path(name).suffix.lower()
+    if suffix in DEFLATED_EXTS:
+        return zipfile.ZIP_DEFLATED
+    return zipfile.ZIP_STORED
+
+
+class ZipPackager:
+    """Streams members into ZIP archives off the event loop.
+
+    Members are file paths or `(name, bytes)` data, copied into the archive
+    in chunks without an intermediate file. Already-compressed formats are
+    stored as-is and only text-like members are deflated. When the next
+    member could push the archive past `limit`, the archive is closed and
+    a new part is started; `add` and `close` hand back finished parts as
+    `(path, member_count)`.
+    """
+
+    CHUNK_SIZE = 256 * 1024
+
+    def __init__(self, fm, limit=UPLOAD_LIMIT - 1024 * 1024):
+        self.fm = fm
+        self.limit = limit
+        self.parts = 0
+        self._fh = None
+        self._zf = None
+        self._path = None
+        self._directory = 0
+        self.count = 0
+
+    async def add(self, name, src):
+        return await asyncio.to_thread(self._add, name, src)
+
+    async def close(self):
+        return await asyncio.to_thread(self._finish)
+
+    def discard(self):
+        """Drop the part being written, if any."""
+        if self._zf:
+            try:
+                self._zf.close()
+                self._fh.close()
+            except Exception:
+                pass
+            self.fm.cleanup(self._path)
+        self._fh = self._zf = self._path = None
+        self.count = self._directory = 0
+
+    def _add(self, name, src):
+        data = src if isinstance(src, (bytes, bytearray)) else None
+        size = len(data) if data is not None else Path(src).stat().st_size
+        method = compression_for(name)
+        entry = len(name.encode()) * 2 + _ENTRY_OVERHEAD
+        bound = size + entry
+        if method == zipfile.ZIP_DEFLATED:
+            # Deflate's worst case on incompressible input.
+            bound += size // 1000 + 64
+        done = None
+        if self._zf and self.count and self._fh.tell() + self._directory + bound > self.limit:
+            done = self._finish()
+        if not self._zf:
+            self._path = self.fm.temp_path(".zip")
+            self._fh = open(self._path, "wb")
+            self._zf = zipfile.ZipFile(self._fh, "w")
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = method
+        info.file_size = size
+        with self._zf.open(info, "w") as dst:
+            if data is not None:
+                dst.write(data)
+            else:
+                with open(src, "rb") as f:
+                    shutil.copyfileobj(f, dst, self.CHUNK_SIZE)
+        self._directory += len(name.encode()) + _ENTRY_OVERHEAD // 2
+        self.count += 1
+        return done
+
+    def _finish(self):
+        if not self._zf:
+            return None
+        self._zf.close()
+        self._fh.close()
+        done = (self._path, self.count)
+        self.parts += 1
+        logger.info(f"ZIP part {self.parts}: {self.count} files, {self._path.stat().st_size} bytes")
+        self._fh = self._zf = self._path = None
+        self.count = self._directory = 0
+        return done
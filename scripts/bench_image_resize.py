@@ -0,0 +1,111 @@
+"""Compare full-decode downscaling with the JPEG draft()/reduce() fast path.
+
+Usage:
+    python scripts/bench_image_resize.py photos/*.jpg [--repeat N]
+
+For each photo and target (the 50%/25%/10% resize buttons and a 400 px
+wide thumbnail) prints decode + resample time and peak RSS growth of the
+full decode + LANCZOS path and of the draft path ImageService uses, plus
+the PSNR between the two results. Every case runs in a fresh process so
+peak memory is not shared between cases.
+"""
+import sys
+import json
+import math
+import time
+import argparse
+import resource
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageChops, ImageStat  # noqa: E402
+
+from app.image_service import _draft  # noqa: E402
+
+TARGETS = ("50%", "25%", "10%", "400px")
+
+
+def _size(img, target):
+    if target.endswith("px"):
+        w = int(target[:-2])
+        return w, max(1, img.height * w // img.width)
+    pct = int(target[:-1])
+    return img.width * pct // 100, img.height * pct // 100
+
+
+def _downscale(path, target, mode):
+    with Image.open(path) as img:
+        size = _size(img, target)
+        if mode == "full":
+            img.load()
+            return img.resize(size, Image.LANCZOS)
+        box = _draft(img, size)
+        return img.resize(size, Image.LANCZOS, box=box, reducing_gap=3.0)
+
+
+def _peak_kb():
+    # ru_maxrss survives exec on Linux, so a child would report the
+    # parent's peak; VmHWM belongs to the new address space.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _case(path, target, mode, repeat):
+    """Run one case in this process and print its timing and peak RSS."""
+    base = _peak_kb()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = _downscale(path, target, mode)
+        ms = (time.perf_counter() - start) * 1000
+        best = ms if best is None else min(best, ms)
+    peak = _peak_kb() - base
+    dst = Path(f"/tmp/bench_resize_{mode}.png")
+    out.save(dst, compress_level=1)
+    print(json.dumps({"ms": best, "peak_mb": peak / 1024, "out": str(dst)}))
+
+
+def _run(path, target, mode, repeat):
+    proc = subprocess.run(
+        [sys.executable, __file__, str(path), "--case", target, mode, "--repeat", str(repeat)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _psnr(a, b):
+    with Image.open(a) as x, Image.open(b) as y:
+        sq = ImageChops.difference(x.convert("RGB"), y.convert("RGB")).point(lambda v: v * v)
+        mse = sum(ImageStat.Stat(sq).mean) / 3
+    return 99.0 if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--case", nargs=2, metavar=("TARGET", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.case:
+        _case(args.files[0], *args.case, args.repeat)
+        return
+
+    print(f"{'file':24} {'target':>7} {'full ms':>8} {'draft ms':>8} {'full MB':>8} {'draft MB':>8} {'psnr dB':>8}")
+    for path in args.files:
+        for target in TARGETS:
+            full = _run(path, target, "full", args.repeat)
+            fast = _run(path, target, "draft", args.repeat)
+            print(f"{path.name[:24]:24} {target:>7} {full['ms']:>8.0f} {fast['ms']:>8.0f} "
+                  f"{full['peak_mb']:>8.0f} {fast['peak_mb']:>8.0f} {_psnr(full['out'], fast['out']):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Compare full-frame upscale/blur with the tiled engine ImageService uses.
+
+Usage:
+    python scripts/bench_image_tiles.py photos/* [--repeat N] [--budget MB]
+
+For each image and operation (the 2x/4x upscale and light/heavy blur
+buttons) prints wall time and peak RSS growth of the old full-frame path
+and of the tiled path, and whether their pixels are identical. Output is
+written in the input's format, so PNG inputs show the streaming encoder.
+Every case runs in a fresh process so peak memory is not shared.
+"""
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageChops, ImageFilter  # noqa: E402
+
+from app.image_service import ImageService  # noqa: E402
+
+OPS = ("up2", "up4", "blur5", "blur30")
+LEVELS = {5: "light", 30: "heavy"}
+
+
+def _full(path, dst, op):
+    with Image.open(path) as img:
+        fmt = img.format or "PNG"
+        if op.startswith("up"):
+            f = int(op[2:])
+            out = img.resize((img.width * f, img.height * f), Image.LANCZOS)
+        else:
+            out = img.filter(ImageFilter.GaussianBlur(radius=int(op[4:])))
+        if fmt.upper() == "JPEG" and out.mode in ("RGBA", "LA", "P"): out = out.convert("RGB")
+        out.save(dst, format=fmt, optimize=True)
+
+
+def _tiled(path, dst, op, budget):
+    if op.startswith("up"):
+        ImageService.upscale(str(path), dst, int(op[2:]), budget)
+    else:
+        ImageService.blur(str(path), dst, LEVELS[int(op[4:])], budget)
+
+
+def _peak_kb():
+    # ru_maxrss survives exec on Linux; VmHWM belongs to this process.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _case(path, op, mode, repeat, budget):
+    """Run one case in this process and print its timing and peak RSS."""
+    base = _peak_kb()
+    dst = f"/tmp/bench_tiles_{mode}{path.suffix}"
+    best = None
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _full(path, dst, op) if mode == "full" else _tiled(path, dst, op, budget)
+            ms = (time.perf_counter() - start) * 1000
+            best = ms if best is None else min(best, ms)
+    except (ValueError, MemoryError) as e:
+        print(json.dumps({"error": str(e)}))
+        return
+    print(json.dumps({"ms": best, "peak_mb": (_peak_kb() - base) / 1024, "out": dst}))
+
+
+def _run(path, op, mode, repeat, budget):
+    proc = subprocess.run(
+        [sys.executable, __file__, str(path), "--case", op, mode, "--repeat", str(repeat), "--budget", str(budget)],
+        capture_output=True, text=True,
+    )
+    lines = proc.stdout.strip().splitlines()
+    return json.loads(lines[-1]) if lines else {"error": proc.stderr.strip().splitlines()[-1][:60]}
+
+
+def _same(a, b):
+    with Image.open(a) as x, Image.open(b) as y:
+        if x.format != "PNG":
+            return "-"
+        return "yes" if ImageChops.difference(x, y.convert(x.mode)).getbbox() is None else "NO"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--budget", type=int, default=512, help="tiled job budget in MB")
+    parser.add_argument("--case", nargs=2, metavar=("OP", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.case:
+        _case(args.files[0], *args.case, args.repeat, args.budget)
+        return
+
+    print(f"{'file':24} {'op':>6} {'full ms':>8} {'tiled ms':>8} {'full MB':>8} {'tiled MB':>8} {'same':>5}")
+    for path in args.files:
+        for op in OPS:
+            full = _run(path, op, "full", args.repeat, args.budget)
+            tiled = _run(path, op, "tiled", args.repeat, args.budget)
+            if "error" in full or "error" in tiled:
+                print(f"{path.name[:24]:24} {op:>6}  full: {full.get('error', 'ok')}  tiled: {tiled.get('error', 'ok')}")
+                continue
+            print(f"{path.name[:24]:24} {op:>6} {full['ms']:>8.0f} {tiled['ms']:>8.0f} "
+                  f"{full['peak_mb']:>8.0f} {tiled['peak_mb']:>8.0f} {_same(full['out'], tiled['out']):>5}")
+
+
+if __name__ == "__main__":
+    main()
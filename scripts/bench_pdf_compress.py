@@ -0,0 +1,82 @@
+"""Compare the PDF compression profiles on a corpus of PDFs.
+
+Usage:
+    python scripts/bench_pdf_compress.py corpus/*.pdf [--workers N]
+
+Prints output size, savings and wall time per file and profile. `save` is
+the old behaviour (garbage collection and deflate only, no image
+re-encoding). With --workers the image re-encoding is also sharded over a
+worker pool like the bot does.
+"""
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.pdf_service import PDFService, COMPRESS_PROFILES  # noqa: E402
+from app.worker_pool import WorkerPool  # noqa: E402
+
+PROFILES = tuple(COMPRESS_PROFILES)
+
+
+def _serial(path, out, profile):
+    start = time.perf_counter()
+    if profile == "save":
+        _, orig, new, saved = PDFService.compress(path, out, "balanced", images=[])
+        return (time.perf_counter() - start) * 1000, new, saved
+    plan = PDFService.compress_plan(path, profile)
+    images = PDFService.recompress_images(path, plan, profile)
+    _, orig, new, saved = PDFService.compress(path, out, profile, images)
+    return (time.perf_counter() - start) * 1000, new, saved
+
+
+async def _sharded(pool, path, out, profile):
+    start = time.perf_counter()
+    plan = await pool.run(PDFService.compress_plan, path, profile)
+    shards = [plan[i::pool.size] for i in range(min(len(plan), pool.size))]
+    parts = await asyncio.gather(*(
+        pool.run(PDFService.recompress_images, path, jobs, profile) for jobs in shards
+    ))
+    images = [img for part in parts for img in part]
+    await pool.run(PDFService.compress, path, out, profile, images)
+    return (time.perf_counter() - start) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--workers", type=int, default=0, help="also time sharded runs on N workers")
+    args = parser.parse_args()
+
+    pool = None
+    if args.workers:
+        pool = WorkerPool(args.workers)
+        await pool.start()
+        # Warm every worker so start-up imports are not timed.
+        await asyncio.gather(*(pool.run(PDFService.page_count, args.files[0]) for _ in range(args.workers)))
+
+    out = Path(tempfile.mkdtemp()) / "out.pdf"
+    header = f"{'file':30} {'profile':>9} {'in KB':>8} {'out KB':>8} {'saved':>6} {'ms':>7}"
+    if pool:
+        header += f" {'ms x' + str(args.workers):>8}"
+    print(header)
+    for path in args.files:
+        size = path.stat().st_size // 1024
+        for profile in ("save",) + PROFILES:
+            ms, new, saved = _serial(path, out, profile)
+            line = f"{path.name[:30]:30} {profile:>9} {size:>8} {new // 1024:>8} {saved:>5}% {ms:>7.0f}"
+            if pool and profile != "save":
+                line += f" {await _sharded(pool, path, out, profile):>8.0f}"
+            print(line)
+    out.unlink(missing_ok=True)
+
+    if pool:
+        await pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
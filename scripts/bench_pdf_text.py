@@ -0,0 +1,81 @@
+"""Compare the PDF text extraction engines on a corpus of PDFs.
+
+Usage:
+    python scripts/bench_pdf_text.py corpus/*.pdf [--workers N] [--repeat N]
+
+Prints per-file timings for the `fast` (PyMuPDF) and `layout` (pdfplumber)
+engines, single-process and sharded over a worker pool like the bot does.
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.pdf_service import PDFService  # noqa: E402
+from app.worker_pool import WorkerPool  # noqa: E402
+from app.file_router import TEXT_SHARD_PAGES  # noqa: E402
+
+ENGINES = ("fast", "layout")
+
+
+def _serial(path, pages, engine, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = PDFService.extract_text_range(path, 0, pages, engine)
+        ms = (time.perf_counter() - start) * 1000
+        best = ms if best is None else min(best, ms)
+    return best, len(text)
+
+
+async def _sharded(pool, path, pages, engine):
+    step = max(TEXT_SHARD_PAGES[engine], -(-pages // (pool.size * 4)))
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        pool.run(PDFService.extract_text_range, path, a, min(a + step, pages), engine)
+        for a in range(0, pages, step)
+    ))
+    return (time.perf_counter() - start) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--workers", type=int, default=0, help="also time sharded runs on N workers")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pool = None
+    if args.workers:
+        pool = WorkerPool(args.workers)
+        await pool.start()
+        # Warm every worker so start-up imports are not timed.
+        await asyncio.gather(*(pool.run(PDFService.page_count, args.files[0]) for _ in range(args.workers)))
+
+    header = f"{'file':30} {'pages':>5} " + " ".join(f"{e + ' ms':>10}" for e in ENGINES)
+    if pool:
+        header += " " + " ".join(f"{e + ' x' + str(args.workers):>12}" for e in ENGINES)
+    print(header + f" {'speedup':>8}")
+    totals = dict.fromkeys(ENGINES, 0.0)
+    for path in args.files:
+        pages = PDFService.page_count(path)
+        row = {e: _serial(path, pages, e, args.repeat) for e in ENGINES}
+        for e in ENGINES:
+            totals[e] += row[e][0]
+        line = f"{path.name[:30]:30} {pages:>5} " + " ".join(f"{row[e][0]:>10.0f}" for e in ENGINES)
+        if pool:
+            sharded = [await _sharded(pool, path, pages, e) for e in ENGINES]
+            line += " " + " ".join(f"{ms:>12.0f}" for ms in sharded)
+        print(line + f" {row['layout'][0] / max(row['fast'][0], 0.01):>7.1f}x")
+    print(f"{'total':30} {'':>5} " + " ".join(f"{totals[e]:>10.0f}" for e in ENGINES)
+          + f"  layout/fast = {totals['layout'] / max(totals['fast'], 0.01):.1f}x")
+
+    if pool:
+        await pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+"""Schema migrations apply one version at a time, all or nothing."""
+import sqlite3
+
+import pytest
+
+from app import database
+from app.database import Database, MIGRATIONS
+
+
+def _db():
+    db = Database(":memory:", "")
+    db.conn = sqlite3.connect(":memory:")
+    return db
+
+
+def _version(db):
+    return db.conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+
+
+def test_migrations_apply_once():
+    db = _db()
+    db._migrate()
+    db._migrate()
+    assert _version(db) == len(MIGRATIONS)
+    assert db.conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(MIGRATIONS)
+
+
+def test_failed_version_rolls_back(monkeypatch):
+    db = _db()
+    db._migrate()
+    broken = [
+        "ALTER TABLE usage_logs ADD COLUMN extra INTEGER",
+        "CREATE INDEX idx_broken ON no_such_table (x)",
+    ]
+    monkeypatch.setattr(database, "MIGRATIONS", MIGRATIONS + [broken])
+    with pytest.raises(sqlite3.OperationalError):
+        db._migrate()
+    columns = [row[1] for row in db.conn.execute("PRAGMA table_info(usage_logs)")]
+    assert "extra" not in columns
+    assert _version(db) == len(MIGRATIONS)
+
+    # Fixed, the same version applies cleanly on the next start.
+    monkeypatch.setattr(database, "MIGRATIONS", MIGRATIONS + [broken[:1]])
+    db._migrate()
+    assert _version(db) == len(MIGRATIONS) + 1
@@ -0,0 +1,119 @@
+"""Every repository query must be answered by an index search.
+
+The repos run against a recorder that captures each statement and its
+parameters; every statement is then explained against the migrated schema
+in `:memory:`. Whole-table reports are the exception: they are allowed the
+one index scan listed for them in SCANS.
+"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.database import Database, WhitelistRepo, UsageRepo, SystemRepo, ResultCacheRepo
+
+# Reports that aggregate every row, with the only scan they may do.
+SCANS = {
+    "SELECT SUM(count) as c FROM usage_daily":
+        "SCAN usage_daily USING COVERING INDEX idx_usage_daily_status",
+    "SELECT status, SUM(count) as c FROM usage_daily GROUP BY status":
+        "SCAN usage_daily USING COVERING INDEX idx_usage_daily_status",
+    "SELECT SUM(count) as c FROM usage_daily WHERE status!='success'":
+        "SCAN usage_daily USING COVERING INDEX idx_usage_daily_status",
+    "SELECT file_type, SUM(count) as c FROM usage_daily GROUP BY file_type ORDER BY c DESC":
+        "SCAN usage_daily USING COVERING INDEX idx_usage_daily_user",
+    "SELECT user_id, SUM(count) as c FROM usage_daily GROUP BY user_id ORDER BY c DESC LIMIT ?":
+        "SCAN usage_daily USING COVERING INDEX idx_usage_daily_user",
+    # The admin user list pages through everyone in signup order.
+    "SELECT * FROM whitelist ORDER BY created_at DESC":
+        "SCAN whitelist USING INDEX idx_whitelist_created",
+}
+
+USER = {"user_id": 1, "username": "", "is_active": 1, "is_suspended": 0, "daily_limit": 50}
+
+
+class _Recorder:
+    def __init__(self):
+        self.queries = []
+
+    async def fetch_one(self, query, params=()):
+        self.queries.append((query, params))
+        return dict(USER) if query.startswith("SELECT * FROM whitelist") else None
+
+    async def fetch_all(self, query, params=()):
+        self.queries.append((query, params))
+        return []
+
+    async def execute(self, query, params=()):
+        self.queries.append((query, params))
+        return 1
+
+    async def execute_many(self, query, rows):
+        self.queries.append((query, rows[0]))
+
+    async def execute_batch(self, batches):
+        for query, rows in batches:
+            self.queries.append((query, rows[0]))
+
+
+async def _exercise(db):
+    whitelist = WhitelistRepo(db)
+    for call in (whitelist.add_user(1), whitelist.remove_user(1), whitelist.is_whitelisted(1),
+                 whitelist.is_suspended(1), whitelist.suspend_user(1), whitelist.unsuspend_user(1),
+                 whitelist.set_daily_limit(1, 10), whitelist.list_users(),
+                 whitelist.get_active_user_ids(), whitelist.check_daily_limit(1)):
+        await call
+
+    usage = UsageRepo(db)
+    await usage.log(1, "pdf", "split", 100, "success", "", 5)
+    await usage.flush()
+    for call in (usage.reserve(1), usage.release(1, "2026-01-01"), usage.total_processed(),
+                 usage.today_processed(), usage.success_failure(), usage.file_type_dist(),
+                 usage.top_users(), usage.avg_time(), usage.error_count(), usage.active_today(),
+                 usage.user_total(1), usage.user_today(1), usage.user_fail_rate(1),
+                 usage.user_fav_type(1)):
+        await call
+
+    system = SystemRepo(db)
+    await system.set_stat("maintenance_mode", "1")
+    await system.get_stat("maintenance_mode")
+
+    cache = ResultCacheRepo(db)
+    await cache.get("abc", "split")
+    await cache.put("abc", "split", "", [{"file_id": "x"}])
+    await cache.purge()
+
+
+def _queries():
+    recorder = _Recorder()
+    asyncio.run(_exercise(recorder))
+    return [(" ".join(query.split()), params) for query, params in recorder.queries]
+
+
+QUERIES = _queries()
+
+
+@pytest.fixture(scope="module")
+def conn():
+    db = Database(":memory:", "")
+    db.conn = sqlite3.connect(":memory:")
+    db._migrate()
+    yield db.conn
+    db.conn.close()
+
+
+@pytest.mark.parametrize("query,params", QUERIES, ids=lambda v: str(v)[:60])
+def test_query_uses_index(conn, query, params):
+    steps = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+    if not steps:
+        assert query.startswith("INSERT")
+        return
+    for step in steps:
+        if step.startswith("SCAN"):
+            assert step == SCANS.get(query), f"{step!r} in plan for: {query}"
+        elif not step.startswith(("SEARCH", "USE TEMP B-TREE", "CORRELATED")):
+            raise AssertionError(f"unexpected {step!r} in plan for: {query}")
+
+
+def test_scan_allowlist_is_current():
+    assert set(SCANS) <= {query for query, _ in QUERIES}